@@ -1,9 +1,13 @@
 import sys
+from contextlib import nullcontext
+from typing import ContextManager, TextIO
 
-from src.compiler.ir_generator import generate_ir
+from src.compiler.bytecode import compile_bytecode, run
+from src.compiler.constant_folder import fold_typechecked
+from src.compiler.ir_generator import generate_module_ir
+from src.compiler.parallel import generate_module_ir_parallel
 from src.compiler.parser import parse
-from src.compiler.tokenizer import tokenize
-from src.compiler.type_checker import typecheck
+from src.compiler.tokenizer import tokenize, tokenize_stream
 
 # TODO(student): add more commands as needed
 usage = f"""
@@ -12,18 +16,40 @@ Usage: {sys.argv[0]} <command> [source_code_file]
 Command 'interpret':
     Runs the interpreter on source code.
 
+Command 'vm':
+    Compiles source code to bytecode, runs it and prints the result.
+    Unlike 'interpret', functions cannot use the variables of their caller.
+
+Command 'ir':
+    Prints the IR of each function and of the top-level expression.
+
 Common arguments:
     source_code_file        Optional. Defaults to standard input if missing.
+    --jobs N                Optional. Parses, typechecks and lowers the functions
+                            in N worker processes.
+    --no-fold               Optional. Lowers constant expressions as they are
+                            written instead of computing them first (which is
+                            only done for programs that typecheck).
  """.strip() + "\n"
 
 
 def main() -> int:
     command: str | None = None
     input_file: str | None = None
-    for arg in sys.argv[1:]:
+    jobs = 1
+    fold = True
+    args = iter(sys.argv[1:])
+    for arg in args:
         if arg in ['-h', '--help']:
             print(usage)
             return 0
+        elif arg == '--jobs' or arg.startswith('--jobs='):
+            value = arg.removeprefix('--jobs=') if arg != '--jobs' else next(args, '')
+            if not value.isdigit() or int(value) < 1:
+                raise Exception(f"Invalid number of jobs: '{value}'")
+            jobs = int(value)
+        elif arg == '--no-fold':
+            fold = False
         elif arg.startswith('-'):
             raise Exception(f"Unknown argument: {arg}")
         elif command is None:
@@ -40,6 +66,12 @@ def main() -> int:
         else:
             return sys.stdin.read()
 
+    def open_source_code() -> ContextManager[TextIO]:
+        if input_file is not None:
+            return open(input_file)
+        else:
+            return nullcontext(sys.stdin)
+
     if command is None:
         print(f"Error: command argument missing\n\n{usage}", file=sys.stderr)
         return 1
@@ -47,13 +79,26 @@ def main() -> int:
     if command == 'interpret':
         source_code = read_source_code()
         # in unit test
+    elif command == 'vm':
+        ast_node = parse(tokenize(read_source_code()))
+        if fold:
+            ast_node = fold_typechecked(ast_node)
+        result = run(compile_bytecode(ast_node))
+        if result is not None:
+            print(result)
     elif command == 'ir':
-        source_code = read_source_code()
-        tokens = tokenize(source_code)
-        ast_node = parse(tokens)
-        typecheck(ast_node)
-        ir_instructions = generate_ir(ast_node)
-        print("\n".join([str(ins) for ins in ir_instructions]))
+        if jobs > 1:
+            _, ir_map = generate_module_ir_parallel(tokenize(read_source_code()), jobs, fold)
+        else:
+            with open_source_code() as f:
+                # Tokens are produced lazily and parsed as they arrive
+                ast_node = parse(tokenize_stream(f))
+            if fold:
+                ast_node = fold_typechecked(ast_node)
+            ir_map = generate_module_ir(ast_node)
+        for name, ir_instructions in ir_map.items():
+            print(f"{name}:")
+            print("\n".join([f"    {ins}" for ins in ir_instructions]))
     else:
         print(f"Error: unknown command: {command}\n\n{usage}", file=sys.stderr)
         return 1
@@ -1,4 +1,6 @@
-from src.model.ir import Label, Jump, CondJump
+from heapq import heappop, heappush
+
+from src.model.ir import IRvar, Label, Jump, CondJump, Call, Copy, LoadIntConst, LoadBoolConst
 
 
 class BasicBlock:
@@ -17,7 +19,8 @@ def split_into_basic_blocks(instructions):
     for instruction in instructions:
         # If the instruction is a label, start a new block unless it's the first
         if isinstance(instruction, Label):
-            if current_block.instructions:
+            if current_block.instructions or current_block.label is not None:
+                # A label right after another one gets an empty block that falls through to it
                 basic_blocks.append(current_block)
                 current_block = BasicBlock(instruction)
             else:
@@ -30,116 +33,336 @@ def split_into_basic_blocks(instructions):
             basic_blocks.append(current_block)
             current_block = BasicBlock()
 
-    if current_block.instructions:
+    if current_block.instructions or current_block.label is not None:
         basic_blocks.append(current_block)
 
     return basic_blocks
 
 
 class FlowGraph:
+    """
+    Basic blocks and the edges between them.
+
+    Blocks are numbered densely in the order they are added, and the
+    edges are kept both ways: `successors[i]` and `predecessors[i]` list
+    the ids of the blocks that block `i` can continue to and come from.
+    The first block is the entry. The reverse postorder and the dominators
+    are computed when first asked for, and again after the graph changes.
+    """
+
     def __init__(self):
-        self.blocks = []  # List of basic blocks
-        self.edges = {}  # Dictionary to store edges, key is block's label, value is a list of labels
+        self.blocks = []  # List of basic blocks, by id
+        self.successors = []
+        self.predecessors = []
+        self.block_ids = {}  # The id of each labelled block, by label name
+        self.entry = 0
+        self._reverse_postorder = None
+        self._reachable = 0  # How many blocks at the start of the reverse postorder the entry reaches
+        self._immediate_dominators = None
 
     def add_block(self, block):
+        block_id = len(self.blocks)
         self.blocks.append(block)
-        if block.label not in self.edges:
-            self.edges[block.label] = []
+        self.successors.append([])
+        self.predecessors.append([])
+        if block.label is not None:
+            self.block_ids[block.label.name] = block_id
+        self._reverse_postorder = self._immediate_dominators = None
+        return block_id
+
+    def add_edge(self, from_id, to_id):
+        if to_id not in self.successors[from_id]:
+            self.successors[from_id].append(to_id)
+            self.predecessors[to_id].append(from_id)
+            self._reverse_postorder = self._immediate_dominators = None
+
+    def reverse_postorder(self):
+        """
+        The block ids in reverse postorder from the entry, followed by the blocks it cannot reach.
+
+        Successors are visited last to first, so that the `then` target of a
+        conditional jump, such as the body of a loop, comes right after it.
+        """
+        if self._reverse_postorder is None:
+            successors = self.successors
+            visited = [False] * len(successors)
+            order = []
+            for root in [self.entry, *range(len(successors))] if successors else []:
+                if visited[root]:
+                    continue
+                visited[root] = True
+                postorder = []
+                stack = [(root, reversed(successors[root]))]
+                while stack:
+                    block_id, targets = stack[-1]
+                    for target in targets:
+                        if not visited[target]:
+                            visited[target] = True
+                            stack.append((target, reversed(successors[target])))
+                            break
+                    else:
+                        stack.pop()
+                        postorder.append(block_id)
+                if root == self.entry:
+                    self._reachable = len(postorder)
+                order.extend(reversed(postorder))
+            self._reverse_postorder = order
+        return self._reverse_postorder
+
+    def immediate_dominators(self):
+        """
+        The immediate dominator of each block, by id: the entry for itself, -1 for unreachable blocks.
+
+        Uses the iterative algorithm of Cooper, Harvey and Kennedy over the
+        reverse postorder.
+        """
+        if self._immediate_dominators is None:
+            order = self.reverse_postorder()
+            reachable = order[:self._reachable]
+            position = [len(order)] * len(order)
+            for index, block_id in enumerate(reachable):
+                position[block_id] = index
+            idom = [-1] * len(order)
+            if reachable:
+                idom[self.entry] = self.entry
+            changed = True
+            while changed:
+                changed = False
+                for block_id in reachable[1:]:
+                    new_idom = -1
+                    for predecessor in self.predecessors[block_id]:
+                        if idom[predecessor] == -1:
+                            continue
+                        if new_idom == -1:
+                            new_idom = predecessor
+                            continue
+                        # The closest block that dominates both
+                        a, b = predecessor, new_idom
+                        while a != b:
+                            while position[a] > position[b]:
+                                a = idom[a]
+                            while position[b] > position[a]:
+                                b = idom[b]
+                        new_idom = a
+                    if idom[block_id] != new_idom:
+                        idom[block_id] = new_idom
+                        changed = True
+            self._immediate_dominators = idom
+        return self._immediate_dominators
+
+    def dominator_tree(self):
+        """The ids of the blocks each block immediately dominates."""
+        children = [[] for _ in self.blocks]
+        for block_id, idom in enumerate(self.immediate_dominators()):
+            if idom != -1 and block_id != self.entry:
+                children[idom].append(block_id)
+        return children
+
+    def dominates(self, a, b):
+        """Whether every path from the entry to block `b` goes through block `a`."""
+        idom = self.immediate_dominators()
+        if idom[b] == -1:
+            return False
+        while b != a and b != self.entry:
+            b = idom[b]
+        return b == a
 
-    def add_edge(self, from_label, to_label):
-        if from_label in self.edges:
-            self.edges[from_label].append(to_label)
-        else:
-            self.edges[from_label] = [to_label]
 
 def build_flowgraph(basic_blocks):
     flowgraph = FlowGraph()
     for block in basic_blocks:
         flowgraph.add_block(block)
+    for block_id, block in enumerate(basic_blocks):
         # Find the last instruction of the block to determine control flow
-        last_instruction = block.instructions[-1]
+        last_instruction = block.instructions[-1] if block.instructions else None
         if isinstance(last_instruction, Jump):
-            flowgraph.add_edge(block.label, last_instruction.label.name)
+            targets = [last_instruction.label.name]
         elif isinstance(last_instruction, CondJump):
-            flowgraph.add_edge(block.label, last_instruction.then_label.name)
-            flowgraph.add_edge(block.label, last_instruction.else_label.name)
+            targets = [last_instruction.then_label.name, last_instruction.else_label.name]
         # Handle sequential flow
         else:
-            current_index = basic_blocks.index(block)
-            if current_index < len(basic_blocks) - 1:  # Not the last block
-                next_block = basic_blocks[current_index + 1]
-                flowgraph.add_edge(block.label, next_block.label)
+            if block_id < len(basic_blocks) - 1:  # Not the last block
+                flowgraph.add_edge(block_id, block_id + 1)
+            continue
+        for name in targets:
+            # A jump past the last instruction leaves the flow graph
+            if name in flowgraph.block_ids:
+                flowgraph.add_edge(block_id, flowgraph.block_ids[name])
 
     return flowgraph
 
-class ProgramState:
-    def __init__(self):
-        # Maps variable names to a set of instruction indices where it might have been defined
-        self.definitions = {}
-
-    def add_definition(self, var, instruction_index):
-        if var not in self.definitions:
-            self.definitions[var] = set()
-        self.definitions[var].add(instruction_index)
-
-    def merge(self, other_state):
-        # Merge definitions from another state into this one
-        for var, defs in other_state.definitions.items():
-            if var not in self.definitions:
-                self.definitions[var] = defs.copy()
-            else:
-                self.definitions[var].update(defs)
 
-def perform_reaching_definitions_analysis(flowgraph):
-    # Initialize program states for each basic block
-    block_states = {block.label: ProgramState() for block in flowgraph.blocks}
+def _bits(mask):
+    """The indices of the bits set in `mask`, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def defined_var(instruction):
+    """The variable `instruction` assigns to, if any."""
+    if isinstance(instruction, (Call, Copy, LoadIntConst, LoadBoolConst)):
+        return instruction.dest
+    return None
+
+
+def used_vars(instruction):
+    """The variables whose values `instruction` reads."""
+    if isinstance(instruction, Call):
+        return [arg for arg in instruction.args if isinstance(arg, IRvar)]
+    if isinstance(instruction, Copy):
+        # The IR generator copies the initial values of variables as they are
+        return [instruction.source] if isinstance(instruction.source, IRvar) else []
+    if isinstance(instruction, CondJump):
+        return [instruction.cond]
+    return []
 
-    # Iterate over the flowgraph until the states stabilize
-    changed = True
-    while changed:
-        changed = False
-        for block in flowgraph.blocks:
-            state = ProgramState()
-            # Merge states from all predecessors
-            for pred_label in flowgraph.edges.get(block.label, []):
-                state.merge(block_states[pred_label])
-            # Process instructions in the block
-            for index, instruction in enumerate(block.instructions):
-                if isinstance(instruction):
-                    state.add_definition(instruction.var, index)
-            # Check if the state has changed
-            if block_states[block.label].definitions != state.definitions:
-                block_states[block.label] = state
-                changed = True
-    return block_states
 
 class DataFlowAnalysisFramework:
-    def __init__(self, flowgraph, initial_state, transfer_function, merge_function):
+    """
+    Solves a gen/kill data flow problem over the blocks of a flow graph.
+
+    The sets are ints used as bit vectors, one per block, and are merged
+    by union. A forward analysis computes `out = gen | (in & ~kill)` from
+    the `in` merged from the predecessors of a block; a backward one
+    computes `in` the same way from the `out` merged from its successors.
+    Blocks wait in a worklist ordered by reverse postorder (postorder when
+    going backward), so a block is only visited again when one of the
+    blocks it depends on changed.
+    """
+
+    def __init__(self, flowgraph, gen, kill, forward=True):
         self.flowgraph = flowgraph
-        self.initial_state = initial_state
-        self.transfer_function = transfer_function
-        self.merge_function = merge_function
-        self.entry_states = {block.label: initial_state.copy() for block in flowgraph.blocks}
-        self.exit_states = {block.label: initial_state.copy() for block in flowgraph.blocks}
+        self.gen = gen
+        self.kill = kill
+        self.forward = forward
+        self.in_sets = [0] * len(flowgraph.blocks)
+        self.out_sets = [0] * len(flowgraph.blocks)
+        self.visits = 0  # How many times a block was visited
 
     def analyze(self):
-        changed = True
-        while changed:
-            changed = False
-            for block in self.flowgraph.blocks:
-                entry_state = self.initial_state.copy()
-                for pred_label in self.flowgraph.edges.get(block.label, []):
-                    entry_state = self.merge_function(entry_state, self.exit_states[pred_label])
-
-                self.entry_states[block.label] = entry_state
-                new_exit_state = self.transfer_function(entry_state, block)
-
-                if new_exit_state != self.exit_states[block.label]:
-                    self.exit_states[block.label] = new_exit_state
-                    changed = True
-
-    def reaching_definitions_transfer(entry_state, block):
-        exit_state = entry_state.copy()
-        # 根据 block 的指令更新 exit_state
-        return exit_state
+        successors = self.flowgraph.successors
+        predecessors = self.flowgraph.predecessors
+        order = list(self.flowgraph.reverse_postorder())
+        if self.forward:
+            sources, dependents = predecessors, successors
+            inputs, outputs = self.in_sets, self.out_sets
+        else:
+            order.reverse()
+            sources, dependents = successors, predecessors
+            inputs, outputs = self.out_sets, self.in_sets
+        position = [0] * len(order)
+        for index, block in enumerate(order):
+            position[block] = index
+
+        gen, kill = self.gen, self.kill
+        # Positions in `order` of the blocks to visit; in increasing order, it is already a heap
+        worklist = list(range(len(order)))
+        queued = [True] * len(order)
+        while worklist:
+            block = order[heappop(worklist)]
+            queued[block] = False
+            self.visits += 1
+            merged = 0
+            for source in sources[block]:
+                merged |= outputs[source]
+            inputs[block] = merged
+            output = gen[block] | (merged & ~kill[block])
+            if output != outputs[block]:
+                outputs[block] = output
+                for dependent in dependents[block]:
+                    if not queued[dependent]:
+                        queued[dependent] = True
+                        heappush(worklist, position[dependent])
+        return self
+
+
+class ReachingDefinitions(DataFlowAnalysisFramework):
+    """
+    Which definitions can reach the start and the end of each block.
+
+    Definition number `i`, bit `i` of the sets, is the instruction
+    `definitions[i]`, given as (block index, instruction index).
+    """
+
+    def __init__(self, flowgraph):
+        self.definitions = []
+        # The definitions of each variable, and the variables defined in each block
+        var_definitions = {}
+        block_vars = []
+        gen = []
+        for block_index, block in enumerate(flowgraph.blocks):
+            last_definitions = {}
+            for instruction_index, instruction in enumerate(block.instructions):
+                var = defined_var(instruction)
+                if var is not None:
+                    bit = 1 << len(self.definitions)
+                    self.definitions.append((block_index, instruction_index))
+                    var_definitions[var] = var_definitions.get(var, 0) | bit
+                    last_definitions[var] = bit
+            block_vars.append(last_definitions)
+            gen.append(sum(last_definitions.values()))
+        kill = []
+        for last_definitions in block_vars:
+            mask = 0
+            for var in last_definitions:
+                mask |= var_definitions[var]
+            kill.append(mask)
+        super().__init__(flowgraph, gen, kill, forward=True)
+
+    def reaching_in(self, block_index):
+        return {self.definitions[bit] for bit in _bits(self.in_sets[block_index])}
+
+    def reaching_out(self, block_index):
+        return {self.definitions[bit] for bit in _bits(self.out_sets[block_index])}
+
+
+class Liveness(DataFlowAnalysisFramework):
+    """
+    Which variables are live at the start and the end of each block.
+
+    Variable `variables[i]` is bit `i` of the sets.
+    """
+
+    def __init__(self, flowgraph):
+        self.variables = []
+        var_bits = {}
+
+        def bit(var):
+            var_bit = var_bits.get(var)
+            if var_bit is None:
+                var_bit = var_bits[var] = 1 << len(self.variables)
+                self.variables.append(var)
+            return var_bit
+
+        gen = []
+        kill = []
+        for block in flowgraph.blocks:
+            used = 0
+            defined = 0
+            for instruction in block.instructions:
+                for var in used_vars(instruction):
+                    var_bit = bit(var)
+                    if not defined & var_bit:
+                        used |= var_bit
+                var = defined_var(instruction)
+                if var is not None:
+                    defined |= bit(var)
+            gen.append(used)
+            kill.append(defined)
+        super().__init__(flowgraph, gen, kill, forward=False)
+
+    def live_in(self, block_index):
+        return {self.variables[bit] for bit in _bits(self.in_sets[block_index])}
+
+    def live_out(self, block_index):
+        return {self.variables[bit] for bit in _bits(self.out_sets[block_index])}
+
+
+def perform_reaching_definitions_analysis(flowgraph):
+    return ReachingDefinitions(flowgraph).analyze()
+
 
+def perform_liveness_analysis(flowgraph):
+    return Liveness(flowgraph).analyze()
@@ -0,0 +1,414 @@
+from array import array
+from dataclasses import dataclass, field
+from typing import Any
+
+from src.model import ast
+from src.model.SymTab import builtin_symbols
+from src.compiler.interpreter import Value
+
+# Opcodes. Each instruction is two ints in the code buffer: the opcode and its argument.
+CONST = 0          # push constants[arg]
+LOAD = 1           # push local slot arg
+STORE = 2          # pop into local slot arg
+LOAD_GLOBAL = 3    # push the global named constants[arg]
+STORE_GLOBAL = 4   # pop into the existing global named constants[arg]
+BINARY = 5         # pop b, pop a, push constants[arg](a, b)
+UNARY = 6          # pop a, push constants[arg](a)
+JUMP = 7           # continue at arg
+JUMP_IF_FALSE = 8  # pop, continue at arg if it is false
+POP = 9            # pop and discard
+DUP = 10           # push the top of the stack again
+CALL = 11          # call functions[arg], with its argument count of values popped as its first slots
+RETURN = 12        # pop the result, return to the caller
+RAISE = 13         # raise constants[arg]
+TAIL_CALL = 14     # like CALL, but the callee replaces the current frame and returns to its caller
+
+opcode_names = ['CONST', 'LOAD', 'STORE', 'LOAD_GLOBAL', 'STORE_GLOBAL', 'BINARY', 'UNARY', 'JUMP',
+                'JUMP_IF_FALSE', 'POP', 'DUP', 'CALL', 'RETURN', 'RAISE', 'TAIL_CALL']
+
+# How many values each opcode pushes minus how many it pops. CALL and TAIL_CALL also pop their arguments.
+_stack_effects = {CONST: 1, LOAD: 1, STORE: -1, LOAD_GLOBAL: 1, STORE_GLOBAL: -1, BINARY: -1, UNARY: 0,
+                  JUMP: 0, JUMP_IF_FALSE: -1, POP: -1, DUP: 1, CALL: 1, RETURN: -1, RAISE: 0, TAIL_CALL: 1}
+
+
+@dataclass
+class CodeObject:
+    """The bytecode of a function, or of the top-level expression."""
+    name: str
+    param_count: int
+    code: array = field(default_factory=lambda: array('i'))
+    local_count: int = 0
+
+
+@dataclass
+class Program:
+    functions: list[CodeObject]
+    constants: list[Any]
+    main: int
+
+    def disassemble(self) -> str:
+        lines = []
+        for function in self.functions:
+            lines.append(f"{function.name}:")
+            code = function.code
+            for pc in range(0, len(code), 2):
+                op, arg = code[pc], code[pc + 1]
+                if op in (CONST, LOAD_GLOBAL, STORE_GLOBAL, BINARY, UNARY, RAISE):
+                    detail = f"{arg} ({self.constants[arg]!r})"
+                elif op in (CALL, TAIL_CALL):
+                    detail = f"{arg} ({self.functions[arg].name})"
+                elif op in (POP, DUP, RETURN):
+                    detail = ""
+                else:
+                    detail = str(arg)
+                lines.append(f"    {pc:5} {opcode_names[op]:<14}{detail}".rstrip())
+        return "\n".join(lines)
+
+
+def compile_bytecode(node: ast.Module | ast.Expression) -> Program:
+    """
+    Compiles a module (or a lone expression) to bytecode for `run`.
+
+    Variables declared in blocks become local slots of their function, and
+    the parameters of a function are its first slots. Names that are not
+    declared in an enclosing block of the same function are looked up in
+    the builtins. Unlike `interpret`, a function cannot see the variables
+    of its caller: a function that uses a name that is neither its own
+    variable nor a builtin is rejected with an exception here.
+
+    A call whose value is the value of the function it is in (the result
+    of its body, through blocks and if branches) is a TAIL_CALL: it reuses
+    the frame of the function, so tail recursion runs in constant space.
+    """
+    return _BytecodeCompiler(node).program
+
+
+class _FunctionCompiler:
+    def __init__(self, code_object: CodeObject, is_function: bool = False) -> None:
+        self.code_object = code_object
+        # Whether this is a function, rather than the top-level expression
+        self.is_function = is_function
+        self.code = code_object.code
+        # Names to local slots, innermost block last
+        self.scopes: list[dict[str, int]] = [{}]
+        self.depth = 0
+        # For each enclosing loop: stack depth at its start, its start, and the positions of breaks to patch
+        self.loops: list[tuple[int, int, list[int]]] = []
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        self.code.append(op)
+        self.code.append(arg)
+        self.depth += _stack_effects[op]
+        return len(self.code) - 2
+
+    def patch(self, position: int, target: int | None = None) -> None:
+        self.code[position + 1] = len(self.code) if target is None else target
+
+    def new_local(self, name: str) -> int:
+        scope = self.scopes[-1]
+        slot = scope.get(name)
+        if slot is None:
+            slot = self.code_object.local_count
+            self.code_object.local_count += 1
+            scope[name] = slot
+        return slot
+
+    def local(self, name: str) -> int | None:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+
+class _BytecodeCompiler:
+    def __init__(self, node: ast.Module | ast.Expression) -> None:
+        self.constants: list[Any] = []
+        self.constant_ids: dict[tuple[type, Any], int] = {}
+        self.functions: list[CodeObject] = []
+        self.function_ids: dict[str, int] = {}
+
+        if isinstance(node, ast.Module):
+            functions, expression = node.functions, node.expression
+        else:
+            functions, expression = [], node
+        for func in functions:
+            self.function_ids[func.name] = len(self.functions)
+            self.functions.append(CodeObject(func.name, len(func.params)))
+        for func in functions:
+            compiler = _FunctionCompiler(self.functions[self.function_ids[func.name]], is_function=True)
+            for param in func.params:
+                compiler.new_local(param[0])
+            self.compile_function(compiler, func.body)
+
+        main = CodeObject('<main>', 0)
+        self.functions.append(main)
+        self.program = Program(self.functions, self.constants, len(self.functions) - 1)
+        self.compile_function(_FunctionCompiler(main), expression)
+
+    def constant(self, value: Any) -> int:
+        key = (type(value), value) if isinstance(value, (int, str)) else (type(value), id(value))
+        index = self.constant_ids.get(key)
+        if index is None:
+            index = len(self.constants)
+            self.constants.append(value)
+            self.constant_ids[key] = index
+        return index
+
+    def compile_function(self, f: _FunctionCompiler, body: ast.Expression | None) -> None:
+        if body is None:
+            f.emit(CONST, self.constant(None))
+        else:
+            self.compile(f, body, tail=True)
+        f.emit(RETURN)
+
+    def global_name(self, f: _FunctionCompiler, name: str) -> int:
+        """The constant of `name`, which is not a variable of `f`, for LOAD_GLOBAL and STORE_GLOBAL."""
+        if f.is_function and name not in builtin_symbols:
+            # `interpret` would look it up in the scopes of the caller
+            raise Exception(f"Function '{f.code_object.name}' uses '{name}', which is not its own variable. "
+                            f"The vm does not support reading or assigning the variables of the caller.")
+        return self.constant(name)
+
+    def compile_error(self, f: _FunctionCompiler, error: Exception) -> None:
+        """Code that raises `error` when run, where `interpret` would raise it."""
+        f.emit(RAISE, self.constant(error))
+        f.depth += 1  # As if it had produced a value
+
+    def compile(self, f: _FunctionCompiler, node: ast.Expression, tail: bool = False) -> None:
+        """Compiles `node`; `tail` is whether its value is what the function returns."""
+        match node:
+            case ast.Literal(value):
+                f.emit(CONST, self.constant(value))
+
+            case ast.Identifier(name):
+                slot = f.local(name)
+                if slot is not None:
+                    f.emit(LOAD, slot)
+                else:
+                    f.emit(LOAD_GLOBAL, self.global_name(f, name))
+
+            case ast.BinaryOp(ast.Identifier(name), '=', right):
+                self.compile(f, right)
+                f.emit(DUP)
+                slot = f.local(name)
+                if slot is not None:
+                    f.emit(STORE, slot)
+                else:
+                    f.emit(STORE_GLOBAL, self.global_name(f, name))
+
+            case ast.BinaryOp(_, '=', _):
+                self.compile_error(f, TypeError("Left side of assignment must be an identifier."))
+
+            case ast.BinaryOp(left, 'and' | 'or' as op, right):
+                self.compile(f, left)
+                to_other = f.emit(JUMP_IF_FALSE)
+                if op == 'and':
+                    self.compile(f, right)
+                    to_end = f.emit(JUMP)
+                    f.patch(to_other)
+                    f.depth -= 1
+                    f.emit(CONST, self.constant(False))
+                else:
+                    f.emit(CONST, self.constant(True))
+                    to_end = f.emit(JUMP)
+                    f.patch(to_other)
+                    f.depth -= 1
+                    self.compile(f, right)
+                f.patch(to_end)
+
+            case ast.BinaryOp(left, op, right):
+                self.compile(f, left)
+                self.compile(f, right)
+                if op in builtin_symbols:
+                    f.emit(BINARY, self.constant(builtin_symbols[op][0]))
+                else:
+                    f.depth -= 2
+                    self.compile_error(f, KeyError(f"Variable '{op}' not found."))
+
+            case ast.UnaryOp(operator, operand):
+                self.compile(f, operand)
+                f.emit(UNARY, self.constant(builtin_symbols[f"unary_{operator}"][0]))
+
+            case ast.IfExpression(cond, then_clause, else_clause):
+                self.compile(f, cond)
+                to_else = f.emit(JUMP_IF_FALSE)
+                self.compile(f, then_clause, tail)
+                to_end = f.emit(JUMP)
+                f.patch(to_else)
+                f.depth -= 1
+                if else_clause is not None:
+                    self.compile(f, else_clause, tail)
+                else:
+                    f.emit(CONST, self.constant(None))
+                f.patch(to_end)
+
+            case ast.VarDecl(name, value):
+                if isinstance(value, ast.Expression):
+                    # Before the new local exists, so the initializer sees the variables it shadows
+                    self.compile(f, value)
+                else:
+                    f.emit(CONST, self.constant(value))
+                f.emit(DUP)
+                f.emit(STORE, f.new_local(name))
+
+            case ast.Block(expressions, result_expression):
+                f.scopes.append({})
+                for expr in expressions:
+                    self.compile(f, expr)
+                    f.emit(POP)
+                if result_expression is not None:
+                    self.compile(f, result_expression, tail)
+                else:
+                    f.emit(CONST, self.constant(None))
+                f.scopes.pop()
+
+            case ast.WhileExpr(condition, body):
+                start = len(f.code)
+                breaks: list[int] = []
+                f.loops.append((f.depth, start, breaks))
+                self.compile(f, condition)
+                to_end = f.emit(JUMP_IF_FALSE)
+                self.compile(f, body)
+                f.emit(POP)
+                f.emit(JUMP, start)
+                f.patch(to_end)
+                f.emit(CONST, self.constant(None))
+                f.loops.pop()
+                for position in breaks:
+                    f.patch(position)
+
+            case ast.Break(value):
+                if not f.loops:
+                    self.compile_error(f, RuntimeError("'break' outside of a loop"))
+                    return
+                depth, _, breaks = f.loops[-1]
+                saved_depth = f.depth
+                for _ in range(f.depth - depth):
+                    f.emit(POP)
+                if value is not None:
+                    self.compile(f, value)
+                else:
+                    f.emit(CONST, self.constant(None))
+                breaks.append(f.emit(JUMP))
+                # Code after the break is never run, but it is compiled as if a value was produced here
+                f.depth = saved_depth + 1
+
+            case ast.Continue():
+                if not f.loops:
+                    self.compile_error(f, RuntimeError("'continue' outside of a loop"))
+                    return
+                depth, start, _ = f.loops[-1]
+                saved_depth = f.depth
+                for _ in range(f.depth - depth):
+                    f.emit(POP)
+                f.emit(JUMP, start)
+                f.depth = saved_depth + 1
+
+            case ast.FunctionCall(name, arguments):
+                function_id = self.function_ids.get(name)
+                if function_id is None:
+                    self.compile_error(f, KeyError(f"Variable '{name}' not found."))
+                    return
+                for arg in arguments:
+                    self.compile(f, arg)
+                # Like `interpret`, extra arguments are evaluated and dropped; missing parameters are None
+                param_count = self.functions[function_id].param_count
+                for _ in range(len(arguments) - param_count):
+                    f.emit(POP)
+                for _ in range(param_count - len(arguments)):
+                    f.emit(CONST, self.constant(None))
+                f.emit(TAIL_CALL if tail else CALL, function_id)
+                f.depth -= param_count
+
+            case ast.FunctionDef(name):
+                self.compile_error(f, RuntimeError(f"Unexpected FunctionDef node in interpret: {name}"))
+
+            case _:
+                self.compile_error(f, Exception(f'Unsupported AST node: "{node}"'))
+
+
+def run(program: Program) -> Value:
+    """Runs the top-level expression of a compiled program and returns its value."""
+    functions = program.functions
+    constants = program.constants
+    globals_ = {name: value for name, (value, _) in builtin_symbols.items()}
+
+    main = functions[program.main]
+    code = main.code
+    slots: list[Value] = [None] * main.local_count
+    stack: list[Value] = []
+    pc = 0
+    # The code, slots, stack and pc of each caller
+    frames: list[tuple[array, list[Value], list[Value], int]] = []
+    push = stack.append
+    pop = stack.pop
+
+    while True:
+        op = code[pc]
+        arg = code[pc + 1]
+        pc += 2
+        if op == LOAD:
+            push(slots[arg])
+        elif op == CONST:
+            push(constants[arg])
+        elif op == BINARY:
+            b = pop()
+            stack[-1] = constants[arg](stack[-1], b)
+        elif op == STORE:
+            slots[arg] = pop()
+        elif op == JUMP_IF_FALSE:
+            if not pop():
+                pc = arg
+        elif op == JUMP:
+            pc = arg
+        elif op == POP:
+            pop()
+        elif op == DUP:
+            push(stack[-1])
+        elif op == UNARY:
+            stack[-1] = constants[arg](stack[-1])
+        elif op == CALL:
+            function = functions[arg]
+            count = function.param_count
+            args = stack[len(stack) - count:] if count else []
+            del stack[len(stack) - count:]
+            frames.append((code, slots, stack, pc))
+            code = function.code
+            slots = args + [None] * (function.local_count - len(args))
+            stack = []
+            push = stack.append
+            pop = stack.pop
+            pc = 0
+        elif op == TAIL_CALL:
+            # The caller's own stack holds nothing but the arguments here
+            function = functions[arg]
+            count = function.param_count
+            args = stack[len(stack) - count:] if count else []
+            code = function.code
+            slots = args + [None] * (function.local_count - len(args))
+            stack = []
+            push = stack.append
+            pop = stack.pop
+            pc = 0
+        elif op == RETURN:
+            result = pop()
+            if not frames:
+                return result
+            code, slots, stack, pc = frames.pop()
+            push = stack.append
+            pop = stack.pop
+            push(result)
+        elif op == LOAD_GLOBAL:
+            name = constants[arg]
+            if name not in globals_:
+                raise KeyError(f"Variable '{name}' not found.")
+            push(globals_[name])
+        elif op == STORE_GLOBAL:
+            name = constants[arg]
+            if name not in globals_:
+                raise KeyError(f"Variable '{name}' not defined.")
+            globals_[name] = pop()
+        elif op == RAISE:
+            raise constants[arg]
+        else:
+            raise RuntimeError(f"Bad opcode {op} at {pc - 2}")
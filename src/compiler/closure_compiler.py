@@ -0,0 +1,209 @@
+from typing import Callable
+
+from src.model import ast
+from src.model.SymTab import SymTab, builtin_symbols
+from src.compiler.interpreter import BreakException, ContinueException, Value, literal_types
+from src.compiler.resolver import resolve
+from src.compiler.type_checker import typecheck
+
+# A compiled expression: evaluates it in the given symbol table
+Code = Callable[[SymTab], Value]
+
+
+def compile_closures(node: ast.Expression | ast.Module) -> Code:
+    """
+    Compiles `node` into nested Python closures that do what `interpret` does.
+
+    The tree is walked once: each node becomes a closure that calls the
+    closures of its children, builtin operators are looked up while
+    compiling, and variables placed by the resolver read and write their
+    frame slot directly. Running the program is calling the result with a
+    `SymTab`. A module is resolved first, like `interpret` does.
+    """
+    if isinstance(node, ast.Module):
+        resolve(node)
+    return _ClosureCompiler().compile(node)
+
+
+class _ClosureCompiler:
+    def __init__(self) -> None:
+        # The compiled bodies of the functions met so far, by id() of their FunctionDef
+        self.bodies: dict[int, Code] = {}
+        self.functions: list[ast.FunctionDef] = []
+
+    def body_of(self, func: ast.FunctionDef) -> Code:
+        body = self.bodies.get(id(func))
+        if body is None:
+            body = self.compile(func.body)
+            self.bodies[id(func)] = body
+            self.functions.append(func)  # Keeps the id() valid
+        return body
+
+    def compile(self, node: ast.Expression | ast.Module) -> Code:
+        match node:
+            case ast.Literal(value):
+                return lambda symtab: value
+
+            case ast.Identifier(name):
+                if node.depth >= 0:
+                    level, slot = -1 - node.depth, node.slot
+                    return lambda symtab: symtab.frames[level][slot]
+                return lambda symtab: symtab.lookup_variable(name)
+
+            case ast.BinaryOp(left_node, '=', right_node):
+                return self.compile_assignment(left_node, self.compile(right_node))
+
+            case ast.BinaryOp(left_node, 'and', right_node):
+                left, right = self.compile(left_node), self.compile(right_node)
+                return lambda symtab: right(symtab) if left(symtab) else False
+
+            case ast.BinaryOp(left_node, 'or', right_node):
+                left, right = self.compile(left_node), self.compile(right_node)
+                return lambda symtab: True if left(symtab) else right(symtab)
+
+            case ast.BinaryOp(left_node, op, right_node):
+                left, right = self.compile(left_node), self.compile(right_node)
+                if op in builtin_symbols:
+                    op_func = builtin_symbols[op][0]
+                    return lambda symtab: op_func(left(symtab), right(symtab))
+
+                def binary_op(symtab: SymTab) -> Value:
+                    a = left(symtab)
+                    b = right(symtab)
+                    return symtab.lookup_variable(op)(a, b)
+                return binary_op
+
+            case ast.UnaryOp(operator, operand_node):
+                operand = self.compile(operand_node)
+                op_func = builtin_symbols[f"unary_{operator}"][0]
+                return lambda symtab: op_func(operand(symtab))
+
+            case ast.IfExpression(cond_node, then_node, else_node):
+                cond, then_clause = self.compile(cond_node), self.compile(then_node)
+                if else_node is None:
+                    return lambda symtab: then_clause(symtab) if cond(symtab) else None
+                else_clause = self.compile(else_node)
+                return lambda symtab: then_clause(symtab) if cond(symtab) else else_clause(symtab)
+
+            case ast.VarDecl(name, value):
+                return self.compile_var_decl(node, name, value)
+
+            case ast.Block(expression_nodes, result_node):
+                expressions = [self.compile(expr) for expr in expression_nodes]
+                result = self.compile(result_node) if result_node is not None else None
+
+                def block(symtab: SymTab) -> Value:
+                    symtab.enter_scope()
+                    try:
+                        for expr in expressions:
+                            expr(symtab)
+                        return result(symtab) if result is not None else None
+                    finally:
+                        # Also when a break or continue leaves the block
+                        symtab.leave_scope()
+                return block
+
+            case ast.WhileExpr(cond_node, body_node):
+                cond, body = self.compile(cond_node), self.compile(body_node)
+
+                def while_loop(symtab: SymTab) -> Value:
+                    while True:
+                        try:
+                            if not cond(symtab):
+                                break
+                            try:
+                                body(symtab)
+                            except ContinueException:
+                                continue
+                        except BreakException as e:
+                            # If break carries a return value, the return value is processed
+                            if e.value is not None:
+                                return e.value
+                            break
+                    return None
+                return while_loop
+
+            case ast.Module(functions, expression_node):
+                for func in functions:
+                    self.body_of(func)
+                expression = self.compile(expression_node) if expression_node is not None else None
+
+                def module(symtab: SymTab) -> Value:
+                    for func in functions:
+                        symtab.define_variable(func.name, (func, "function"), func.return_type)
+                    return expression(symtab) if expression is not None else None
+                return module
+
+            case ast.FunctionDef(name):
+                def function_def(symtab: SymTab) -> Value:
+                    raise RuntimeError(f"Unexpected FunctionDef node in interpret: {name}")
+                return function_def
+
+            case ast.FunctionCall(name, argument_nodes):
+                return self.compile_call(name, [self.compile(arg) for arg in argument_nodes], argument_nodes)
+
+            case ast.Break(value_node):
+                value = self.compile(value_node) if value_node else None
+
+                def break_loop(symtab: SymTab) -> Value:
+                    raise BreakException(value(symtab) if value is not None else None)
+                return break_loop
+
+            case ast.Continue():
+                def continue_loop(symtab: SymTab) -> Value:
+                    raise ContinueException()
+                return continue_loop
+
+            case _:
+                def unsupported(symtab: SymTab) -> Value:
+                    raise Exception(f'Unsupported AST node: "{node}"')
+                return unsupported
+
+    def compile_assignment(self, target: ast.Expression, value: Code) -> Code:
+        if not isinstance(target, ast.Identifier):
+            def bad_assignment(symtab: SymTab) -> Value:
+                raise TypeError("Left side of assignment must be an identifier.")
+            return bad_assignment
+        if target.depth >= 0:
+            level, slot = -1 - target.depth, target.slot
+
+            def assign_slot(symtab: SymTab) -> Value:
+                result = symtab.frames[level][slot] = value(symtab)
+                return result
+            return assign_slot
+        name = target.name
+
+        def assign(symtab: SymTab) -> Value:
+            result = value(symtab)
+            symtab.update_variable(name, result)
+            return result
+        return assign
+
+    def compile_var_decl(self, node: ast.VarDecl, name: str, value: Value) -> Code:
+        value_type = literal_types.get(type(value))
+        slot = node.slot
+
+        def var_decl(symtab: SymTab) -> Value:
+            var_type = value_type if value_type is not None else typecheck(value, symtab)
+            if slot >= 0:
+                symtab.define_slot(name, slot, value, var_type)
+            else:
+                symtab.define_variable(name, value, var_type)
+            return value
+        return var_decl
+
+    def compile_call(self, name: str, arguments: list[Code], argument_nodes: list[ast.Expression]) -> Code:
+        def call(symtab: SymTab) -> Value:
+            func, func_type = symtab.lookup_variable(name)
+            if func_type != "function":
+                raise TypeError(f"{name} is not a function")
+            body = self.body_of(func)
+            # The arguments are evaluated in the caller's scope
+            arg_values = [arg(symtab) for arg in arguments]
+            symtab.enter_scope()
+            for slot, (param, arg_node, arg_value) in enumerate(zip(func.params, argument_nodes, arg_values)):
+                symtab.define_slot(param[0], slot, arg_value, arg_node)
+            result = body(symtab)
+            symtab.leave_scope()
+            return result
+        return call
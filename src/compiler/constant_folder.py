@@ -0,0 +1,177 @@
+import operator
+from dataclasses import replace
+from typing import Any, Callable
+
+from src.model import ast
+from src.model.SymTab import SymTab
+from src.compiler.type_checker import typecheck_module
+
+# Results outside of this range wrap around in the generated code, so they are left to it
+_int_min, _int_max = -2 ** 63, 2 ** 63 - 1
+
+# Operators folded when both operands are Int literals. `/` is not: the
+# interpreter divides exactly, while the generated code truncates.
+_int_operators: dict[str, Callable[[int, int], Any]] = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+def fold_constants(node: Any) -> Any:
+    """
+    Returns `node` with its constant subexpressions computed.
+
+    Operators over literals become literals, `x + 0`, `x - 0`, `x * 1`,
+    `not not b` and `- -x` become their operand, `and` and `or` with a
+    literal left side are reduced, and `if` and `while` with a literal
+    condition lose the branch that is never taken. Subtrees that do not
+    change are kept, so an unfoldable tree is returned as is; the others
+    are rebuilt, not modified. The tree is expected to typecheck: an
+    identity is applied without looking at the type of its other operand.
+    Use `fold_typechecked` on a module that has not been checked yet.
+    """
+    return _ConstantFolder().fold(node)
+
+
+def fold_typechecked(module: ast.Module) -> ast.Module:
+    """
+    Returns `module` folded if it typechecks, and as is if it does not.
+
+    Folding can hide a type error (`b + 0` becomes `b`), so a module with
+    one is left for the later passes to reject as they would without folding.
+    """
+    try:
+        typecheck_module(module, SymTab())
+    except (TypeError, KeyError):
+        return module
+    return fold_constants(module)
+
+
+def _is_int(node: Any, value: int | None = None) -> bool:
+    return (type(node) is ast.Literal and type(node.value) is int
+            and (value is None or node.value == value))
+
+
+def _is_bool(node: Any) -> bool:
+    return type(node) is ast.Literal and type(node.value) is bool
+
+
+def _unit(node: ast.Expression) -> ast.Block:
+    """An expression that does nothing, where `node` was."""
+    return ast.Block([], None, offset=node.offset)
+
+
+class _ConstantFolder:
+    def __init__(self) -> None:
+        # Folded subtrees by id() of the original, for trees that share subtrees
+        self.folded: dict[int, Any] = {}
+        self.originals: list[Any] = []  # Keeps the id()s valid
+
+    def fold(self, node: Any) -> Any:
+        folded = self.folded.get(id(node))
+        if folded is None:
+            folded = self.fold_node(node)
+            self.folded[id(node)] = folded
+            self.originals.append(node)
+        return folded
+
+    def fold_node(self, node: Any) -> Any:
+        match node:
+            case ast.BinaryOp(left, op, right):
+                return self.fold_binary_op(node, self.fold(left), op, self.fold(right))
+
+            case ast.UnaryOp(op, operand):
+                operand = self.fold(operand)
+                if op == '-' and _is_int(operand) and _int_min <= -operand.value <= _int_max:
+                    return ast.Literal(-operand.value, offset=node.offset)
+                if op == 'not' and _is_bool(operand):
+                    return ast.Literal(not operand.value, offset=node.offset)
+                if type(operand) is ast.UnaryOp and operand.operator == op and op in ('-', 'not'):
+                    return operand.operand
+                return node if operand is node.operand else replace(node, operand=operand)
+
+            case ast.IfExpression(cond, then_clause, else_clause):
+                cond = self.fold(cond)
+                if _is_bool(cond):
+                    if cond.value:
+                        return self.fold(then_clause)
+                    return self.fold(else_clause) if else_clause is not None else _unit(node)
+                then_clause = self.fold(then_clause)
+                else_clause = self.fold(else_clause) if else_clause is not None else None
+                if cond is node.cond and then_clause is node.then_clause and else_clause is node.else_clause:
+                    return node
+                return replace(node, cond=cond, then_clause=then_clause, else_clause=else_clause)
+
+            case ast.WhileExpr(condition, body):
+                condition = self.fold(condition)
+                if _is_bool(condition) and not condition.value:
+                    return _unit(node)
+                body = self.fold(body)
+                if condition is node.condition and body is node.body:
+                    return node
+                return replace(node, condition=condition, body=body)
+
+            case ast.Block(expressions, result_expression):
+                folded = [self.fold(expr) for expr in expressions]
+                result = self.fold(result_expression) if result_expression is not None else None
+                if result is result_expression and all(map(operator.is_, folded, expressions)):
+                    return node
+                return replace(node, expressions=folded, result_expression=result)
+
+            case ast.VarDecl(_, value) if isinstance(value, ast.Expression):
+                value = self.fold(value)
+                return node if value is node.value else replace(node, value=value)
+
+            case ast.FunctionCall(_, arguments):
+                folded = [self.fold(arg) for arg in arguments]
+                if all(map(operator.is_, folded, arguments)):
+                    return node
+                return replace(node, arguments=folded)
+
+            case ast.Break(value) if value is not None:
+                value = self.fold(value)
+                return node if value is node.value else replace(node, value=value)
+
+            case ast.AddressOf(expr) | ast.Dereference(expr):
+                expr = self.fold(expr)
+                return node if expr is node.expr else replace(node, expr=expr)
+
+            case ast.FunctionDef(body=body):
+                body = self.fold(body)
+                return node if body is node.body else replace(node, body=body)
+
+            case ast.Module(functions, expression):
+                folded = [self.fold(func) for func in functions]
+                folded_expression = self.fold(expression) if expression is not None else None
+                if folded_expression is expression and all(map(operator.is_, folded, functions)):
+                    return node
+                return replace(node, functions=folded, expression=folded_expression)
+
+            case _:
+                return node
+
+    def fold_binary_op(self, node: ast.BinaryOp, left: Any, op: str, right: Any) -> Any:
+        if op in ('and', 'or') and _is_bool(left):
+            # `true and b` is b, `false and b` is false; and the other way round for `or`
+            return right if left.value == (op == 'and') else left
+        if _is_int(left) and _is_int(right):
+            value = None
+            if op in _int_operators:
+                value = _int_operators[op](left.value, right.value)
+            elif op == '%' and left.value >= 0 and right.value > 0:
+                value = left.value % right.value
+            if value is not None and (type(value) is bool or _int_min <= value <= _int_max):
+                return ast.Literal(value, offset=node.offset)
+        elif (op in ('+', '-') and _is_int(right, 0)) or (op == '*' and _is_int(right, 1)):
+            return left
+        elif (op == '+' and _is_int(left, 0)) or (op == '*' and _is_int(left, 1)):
+            return right
+        if left is node.left and right is node.right:
+            return node
+        return replace(node, left=left, right=right)
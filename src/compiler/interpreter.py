@@ -2,10 +2,15 @@ from typing import Any
 
 from src.model import ast
 from src.model.SymTab import SymTab
+from src.compiler.resolver import resolve
 from src.compiler.type_checker import typecheck
+from src.model.types import Int, Bool
 
 Value = int | bool | None
 
+# The types of the literal values a VarDecl holds, so that they need not be typechecked each time
+literal_types = {int: Int(), bool: Bool()}
+
 class BreakException(Exception):
     def __init__(self, value=None):
         self.value = value
@@ -13,7 +18,60 @@ class BreakException(Exception):
 class ContinueException(Exception):
     pass
 
-def interpret(node: ast.Expression, symtab: SymTab) -> Value:
+class LoopSignal:
+    """
+    What a `break` or `continue` evaluates to.
+
+    It is returned instead of a value, and every node that gets one from a
+    child returns it as is, up to the innermost loop. This avoids raising
+    an exception per `break` or `continue`.
+    """
+    __slots__ = ('is_break', 'value')
+
+    def __init__(self, is_break: bool, value: Value = None) -> None:
+        self.is_break = is_break
+        self.value = value
+
+_break = LoopSignal(True)
+_continue = LoopSignal(False)
+
+class TailCall:
+    """
+    A call in tail position, returned to the caller's caller to make.
+
+    `_call` makes it in a loop, so that tail recursion does not grow the
+    Python stack. `scopes` counts the blocks of the caller left open, as
+    the callee can see their variables.
+    """
+    __slots__ = ('func', 'arguments', 'arg_values', 'scopes')
+
+    def __init__(self, func: ast.FunctionDef, arguments: list[ast.Expression], arg_values: list[Value]) -> None:
+        self.func = func
+        self.arguments = arguments
+        self.arg_values = arg_values
+        self.scopes = 0
+
+# What a result cache gives for arguments it has no result for
+_uncached = object()
+
+def interpret(node: ast.Expression, symtab: SymTab, caches: dict[str, Any] | None = None) -> Value:
+    """
+    Evaluates `node` in `symtab`.
+
+    The calls of the functions that have a result cache in `caches`, by
+    name, are memoized in it (see `purity.memoize_pure_functions`).
+    """
+    result = evaluate(node, symtab, caches=caches)
+    if type(result) is LoopSignal:
+        # A break or continue outside of a loop
+        if result.is_break:
+            raise BreakException(result.value)
+        raise ContinueException()
+    return result
+
+def evaluate(node: ast.Expression, symtab: SymTab, tail: bool = False,
+             caches: dict[str, Any] | None = None) -> Value | LoopSignal | TailCall:
+    """With `tail`, the value of `node` is that of the function it is in, and a call that gives it is a `TailCall`."""
     match node:
         case ast.Literal():
             return node.value
@@ -23,65 +81,100 @@ def interpret(node: ast.Expression, symtab: SymTab) -> Value:
                 # 确保左侧是标识符
                 if isinstance(node.left, ast.Identifier):
                     # 计算右侧表达式的值
-                    value = interpret(node.right, symtab)
+                    value = evaluate(node.right, symtab, caches=caches)
+                    if type(value) is LoopSignal:
+                        return value
                     # 更新现有变量的值
-                    symtab.update_variable(node.left.name, value)
+                    target = node.left
+                    if target.depth >= 0:
+                        symtab.frames[-1 - target.depth][target.slot] = value
+                    else:
+                        symtab.update_variable(target.name, value)
                     return value
                 else:
                     raise TypeError("Left side of assignment must be an identifier.")
             if node.op == 'and':
-                left_value = interpret(node.left, symtab)
+                left_value = evaluate(node.left, symtab, caches=caches)
+                if type(left_value) is LoopSignal:
+                    return left_value
                 if not left_value:  # 如果左侧为假，则不需要评估右侧
                     return False
-                return interpret(node.right, symtab)
+                return evaluate(node.right, symtab, tail, caches)
             elif node.op == 'or':
-                left_value = interpret(node.left, symtab)
+                left_value = evaluate(node.left, symtab, caches=caches)
+                if type(left_value) is LoopSignal:
+                    return left_value
                 if left_value:  # 如果左侧为真，则不需要评估右侧
                     return True
-                return interpret(node.right, symtab)
+                return evaluate(node.right, symtab, tail, caches)
             else:
-                a: Value = interpret(node.left, symtab)
-                b: Value = interpret(node.right, symtab)
+                a: Value = evaluate(node.left, symtab, caches=caches)
+                if type(a) is LoopSignal:
+                    return a
+                b: Value = evaluate(node.right, symtab, caches=caches)
+                if type(b) is LoopSignal:
+                    return b
                 op_func = symtab.lookup_variable(node.op)
                 return op_func(a, b)
 
         case ast.IfExpression():
-            if interpret(node.cond,symtab):
-                return interpret(node.then_clause,symtab)
+            cond_value = evaluate(node.cond, symtab, caches=caches)
+            if type(cond_value) is LoopSignal:
+                return cond_value
+            if cond_value:
+                return evaluate(node.then_clause, symtab, tail, caches)
             else:
                 if node.else_clause is not None:
-                    return interpret(node.else_clause,symtab)
+                    return evaluate(node.else_clause, symtab, tail, caches)
                 else:
                     return None
 
         case ast.UnaryOp():
-            a: Value = interpret(node.operand, symtab)
+            a: Value = evaluate(node.operand, symtab, caches=caches)
+            if type(a) is LoopSignal:
+                return a
             op_func = symtab.lookup_variable(f"unary_{node.operator}")
             return op_func(a)
 
         case ast.IfExpression():
-            if interpret(node.condition,symtab):
-                return interpret(node.then_branch,symtab)
+            if evaluate(node.condition, symtab, caches=caches):
+                return evaluate(node.then_branch, symtab, caches=caches)
             else:
-                return interpret(node.else_branch,symtab)
+                return evaluate(node.else_branch, symtab, caches=caches)
         # Handle Literal, BinaryOp, and IfExpression as before
         # Add new cases for variable declaration and block expression
 
 
         case ast.VarDecl():
             # Variable declarations should only define new variables in the current scope
-            symtab.define_variable(node.name, node.value,typecheck(node.value,symtab))
+            value_type = literal_types.get(type(node.value))
+            if value_type is None:
+                value_type = typecheck(node.value, symtab)
+            if node.slot >= 0:
+                symtab.define_slot(node.name, node.slot, node.value, value_type)
+            else:
+                symtab.define_variable(node.name, node.value, value_type)
             return node.value
 
         case ast.Identifier():
+            if node.depth >= 0:
+                # Placed by the resolver
+                return symtab.frames[-1 - node.depth][node.slot]
             return symtab.lookup_variable(node.name)
 
         case ast.Block():
             symtab.enter_scope()
             for expr in node.expressions:
-                interpret(expr, symtab)
+                signal = evaluate(expr, symtab, caches=caches)
+                if type(signal) is LoopSignal:
+                    symtab.leave_scope()
+                    return signal
             if node.result_expression is not None:
-                result = interpret(node.result_expression, symtab)
+                result = evaluate(node.result_expression, symtab, tail, caches)
+                if type(result) is TailCall:
+                    # Left after the call instead
+                    result.scopes += 1
+                    return result
             else:
                 result = None
             symtab.leave_scope()
@@ -89,22 +182,21 @@ def interpret(node: ast.Expression, symtab: SymTab) -> Value:
 
         case ast.WhileExpr(condition, body):
             while True:
-                try:
-                    cond_value = interpret(condition, symtab)
-                    if not cond_value:
-                        break
-                    try:
-                        interpret(body, symtab)
-                    except ContinueException:
+                signal = evaluate(condition, symtab, caches=caches)
+                if type(signal) is not LoopSignal:
+                    if not signal:
+                        return None
+                    signal = evaluate(body, symtab, caches=caches)
+                    if type(signal) is not LoopSignal or not signal.is_break:
                         continue
-                except BreakException as e:
-                    # If break carries a return value, the return value is processed
-                    if e.value is not None:
-                        return e.value
-                    break
-            return None
+                elif not signal.is_break:
+                    # A continue in the condition belongs to an enclosing loop
+                    return signal
+                # If break carries a return value, the return value is processed
+                return signal.value
 
         case ast.Module(functions, expression):
+            resolve(node)
             # First process all function definitions, adding them to the symbol table
             for func in functions:
                 # The function is bound to a special handler function for subsequent calls
@@ -112,7 +204,7 @@ def interpret(node: ast.Expression, symtab: SymTab) -> Value:
                 print(symtab.lookup_variable(func.name))
             # Process top-level expressions
             if expression is not None:
-                return interpret(expression, symtab)
+                return evaluate(expression, symtab, caches=caches)
             return None
 
         case ast.FunctionDef(name, params, return_type, body):
@@ -123,22 +215,63 @@ def interpret(node: ast.Expression, symtab: SymTab) -> Value:
             func, func_type = symtab.lookup_variable(name)
             if func_type != "function":
                 raise TypeError(f"{name} is not a function")
-            # Create a new scope for function calls
-            symtab.enter_scope()
-            # Bind the parameter value to the new scope
-            for param, arg in zip(func.params, arguments):
-                arg_value = interpret(arg, symtab)
-                symtab.define_variable(param[0], arg_value, arg)
-            # Execute function body
-            result = interpret(func.body, symtab)
-            symtab.leave_scope()
-            return result
+            # The arguments are evaluated in the caller's scope
+            arg_values = []
+            for arg in arguments:
+                arg_value = evaluate(arg, symtab, caches=caches)
+                if type(arg_value) is LoopSignal:
+                    return arg_value
+                arg_values.append(arg_value)
+            if tail:
+                return TailCall(func, arguments, arg_values)
+            return _call(func, arguments, arg_values, symtab, caches)
 
         case ast.Break(value):
             # if break has value, return optional value
-            raise BreakException(interpret(value, symtab) if value else None)
+            if not value:
+                return _break
+            value = evaluate(value, symtab, caches=caches)
+            if type(value) is LoopSignal:
+                return value
+            return LoopSignal(True, value) if value is not None else _break
         case ast.Continue():
-            raise ContinueException()
+            return _continue
 
         case _:
             raise Exception(f'Unsupported AST node: "{node}"')
+
+def _call(func: ast.FunctionDef, arguments: list[ast.Expression], arg_values: list[Value],
+          symtab: SymTab, caches: dict[str, Any] | None = None) -> Value | LoopSignal:
+    """Calls `func`, then the functions it calls in tail position, one after the other."""
+    # The scopes entered for the call
+    scopes = 0
+    # The caches of the calls made so far, which all give the result of the last one
+    pending: list[tuple[Any, tuple]] = []
+    while True:
+        cache = caches.get(func.name) if caches else None
+        if cache is not None:
+            key = tuple(arg_values)
+            result = cache.get(key, _uncached)
+            if result is not _uncached:
+                break
+            pending.append((cache, key))
+        # Create a new scope for function calls
+        symtab.enter_scope()
+        scopes += 1
+        # Bind the parameter value to the new scope, in the slots the resolver gave the parameters
+        for slot, (param, arg, arg_value) in enumerate(zip(func.params, arguments, arg_values)):
+            symtab.define_slot(param[0], slot, arg_value, arg)
+        # Execute function body
+        result = evaluate(func.body, symtab, True, caches)
+        if type(result) is not TailCall:
+            break
+        # The caller does not resume, so its scopes become one that only keeps its variables visible
+        symtab.merge_scopes(scopes + result.scopes)
+        scopes = 1
+        func, arguments, arg_values = result.func, result.arguments, result.arg_values
+    for _ in range(scopes):
+        symtab.leave_scope()
+    if type(result) is not LoopSignal:
+        for cache, key in pending:
+            cache.put(key, result)
+    return result
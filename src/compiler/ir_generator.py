@@ -1,18 +1,38 @@
 from src.model import ast
 from src.model import ir
-from src.model.SymTab import SymTab, add_builtin_symbols
+from src.model.env import Env, PersistentSymTab
 from src.model.ir import IRvar
-from src.compiler.type_checker import typecheck
-from src.model.types import Type, Unit, Int
+from src.compiler.type_checker import typecheck, recheck
+from src.model.types import Type, Unit, Int, Bool
 
 
-def generate_ir(root_node: ast.Expression) -> list[ir.Instruction]:
+# Name of the top-level expression in the listing from generate_module_ir.
+# It is not a valid identifier, so it cannot clash with a function name.
+top_level_name = '<main>'
+
+
+def module_env(functions: list[ast.FunctionDef]) -> Env:
+    """The builtins and the given functions of a module, to lower its functions from."""
+    symtab = PersistentSymTab()
+    for func in functions:
+        symtab.define_variable(func.name, func.body, typecheck(func, symtab))
+    return symtab.snapshot()
+
+
+def generate_ir(root_node: ast.Expression | ast.FunctionDef | ast.Module,
+                functions: list[ast.FunctionDef] | None = None, env: Env | None = None) -> list[ir.Instruction]:
+    """
+    Lowers `root_node` into IR instructions.
+
+    The `functions` of the module are defined before that, so that a single
+    `ast.FunctionDef` can be lowered on its own. To lower several functions
+    of the same module, build their `env` once with `module_env` instead.
+    """
 
     next_var_number = 1
     next_label_number = 1
 
-    symtab = SymTab()
-    add_builtin_symbols(symtab)
+    symtab = PersistentSymTab(env if env is not None else module_env(functions or []))
 
     var_types: dict[IRvar, Type] = {}
     var_types = {}
@@ -35,9 +55,13 @@ def generate_ir(root_node: ast.Expression) -> list[ir.Instruction]:
 
 
     instructions: list[ir.Instruction] = []
+    node_types: dict[int, Type] = {}
     def visit(node: ast.Expression, loop_start : ir.Label= None, loop_end: ir.Label = None) -> IRvar:
         nonlocal symtab
-        var_type = typecheck(node, symtab)
+        # Checking a node also records the types of the nodes below it, which are visited next
+        var_type = node_types.get(id(node), recheck)
+        if var_type is recheck:
+            var_type = typecheck(node, symtab, node_types)
 
         match node:
             case ast.Literal():
@@ -129,23 +153,18 @@ def generate_ir(root_node: ast.Expression) -> list[ir.Instruction]:
                 return None
 
             case ast.FunctionDef(name, params, return_type, body):
-                func_symtab = SymTab(parent=symtab)  # Create a new symbol table for the function scope
+                symtab.enter_scope()  # The parameters are only visible in the function body
                 for param_name, param_type in params:
-                    param_var = ir.IRvar(param_name)
-                    func_symtab.define_variable(param_name, param_var, param_type)
-                # Process function body in the function scope
-                for expr in body:
-                    visit(expr)
-                # Note: Add the function to the parent symbol table if needed
+                    symtab.define_variable(param_name, ir.IRvar(param_name), param_type)
+                result_var = visit(body)
+                symtab.leave_scope()
+                return result_var
 
             case ast.FunctionCall(name, arguments):
-                # Look up the function and its type
-                func_var, func_type = symtab.lookup_variable(name,True)
-                visit(func_var)
-                print('fuva',func_var,func_type)
+                # The function is called by name: its body is lowered on its own
                 arg_vars = [visit(arg) for arg in arguments]
-                result_var = new_var(func_type.return_type)
-                instructions.append(ir.Call(fun=func_var, args=arg_vars, dest=result_var))
+                result_var = new_var(var_type)
+                instructions.append(ir.Call(fun=IRvar(name), args=arg_vars, dest=result_var))
                 return result_var
 
             case ast.WhileExpr(condition, body):
@@ -183,11 +202,21 @@ def generate_ir(root_node: ast.Expression) -> list[ir.Instruction]:
 
     var_result = visit(root_node)
     print(var_result,var_types)
-    if var_result != None:
-        if str(var_types[var_result]) == 'Int':
+    if var_result != None and not isinstance(root_node, ast.FunctionDef):
+        if var_types[var_result] is Int():
             instructions.append(ir.Call(IRvar('print_int'), [var_result], new_var(Int())))
-        if str(var_types[var_result]) == 'Bool':
+        if var_types[var_result] is Bool():
             instructions.append(ir.Call(IRvar('print_bool'), [var_result], new_var(Int())))
 
 
-    return instructions
\ No newline at end of file
+    return instructions
+
+def generate_module_ir(module: ast.Module) -> dict[str, list[ir.Instruction]]:
+    """
+    Lowers each function of `module` separately, followed by the top-level
+    expression under `top_level_name`.
+    """
+    env = module_env(module.functions)
+    ir_map = {func.name: generate_ir(func, env=env) for func in module.functions}
+    ir_map[top_level_name] = generate_ir(module)
+    return ir_map
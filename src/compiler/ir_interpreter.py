@@ -0,0 +1,171 @@
+import operator
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from src.model import ir
+from src.model.ir import IRvar
+
+# Opcodes of a prepared instruction, a tuple whose first element is the opcode
+LOAD_CONST = 0  # (LOAD_CONST, dest, value)
+COPY = 1        # (COPY, dest, source)
+CALL = 2        # (CALL, dest, function, args): dest = function(*args)
+PRINT = 3       # (PRINT, dest, to_text, arg): prints to_text(arg)
+JUMP = 4        # (JUMP, target)
+COND_JUMP = 5   # (COND_JUMP, cond, then_target, else_target)
+
+
+def _int64(value: int) -> int:
+    # The low 64 bits, read as a signed number like the machine does
+    return ((value + 2 ** 63) & (2 ** 64 - 1)) - 2 ** 63
+
+
+def _negate(a: int) -> int:
+    return _int64(-a)
+
+
+def _add(a: int, b: int) -> int:
+    return _int64(a + b)
+
+
+def _subtract(a: int, b: int) -> int:
+    return _int64(a - b)
+
+
+def _multiply(a: int, b: int) -> int:
+    return _int64(a * b)
+
+
+def _quotient(a: int, b: int) -> int:
+    # idivq rounds towards zero
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def _divide(a: int, b: int) -> int:
+    return _int64(_quotient(a, b))
+
+
+def _remainder(a: int, b: int) -> int:
+    return a - b * _quotient(a, b)
+
+
+# What each intrinsic of `intrinsics.all_intrinsics` computes, with the same names.
+# Int results wrap around at 64 bits, as in the generated code.
+ir_intrinsics: dict[str, Callable[..., Any]] = {
+    'unary_-': _negate,
+    'unary_not': operator.not_,
+    '+': _add,
+    '-': _subtract,
+    '*': _multiply,
+    '/': _divide,
+    '%': _remainder,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# Functions of the runtime library, and how they print their argument
+print_functions: dict[str, Callable[[Any], str]] = {
+    'print_int': lambda value: str(int(value)),
+    'print_bool': lambda value: 'true' if value else 'false',
+}
+
+
+@dataclass
+class PreparedIr:
+    """IR instructions with labels resolved to indices and variables to slots."""
+    code: list[tuple]
+    variables: list[IRvar]
+
+
+def prepare_ir(instructions: list[ir.Instruction]) -> PreparedIr:
+    """
+    Resolves the labels of `instructions` to instruction indices and numbers their variables.
+
+    Labels themselves are dropped: a jump goes to the index of the
+    instruction after its label. A `Copy` whose source is a constant (as
+    the IR generator emits for `var` declarations) becomes a LOAD_CONST.
+    """
+    slots: dict[IRvar, int] = {}
+
+    def slot(var: IRvar) -> int:
+        index = slots.get(var)
+        if index is None:
+            index = len(slots)
+            slots[var] = index
+        return index
+
+    targets: dict[str, int] = {}
+    count = 0
+    for insn in instructions:
+        if isinstance(insn, ir.Label):
+            targets[insn.name] = count
+        else:
+            count += 1
+
+    code: list[tuple] = []
+    for insn in instructions:
+        match insn:
+            case ir.Label():
+                pass
+            case ir.LoadIntConst(value, dest) | ir.LoadBoolConst(value, dest):
+                code.append((LOAD_CONST, slot(dest), value))
+            case ir.Copy(source, dest):
+                if isinstance(source, IRvar):
+                    code.append((COPY, slot(dest), slot(source)))
+                else:
+                    code.append((LOAD_CONST, slot(dest), source))
+            case ir.Call(fun, args, dest):
+                if fun.name in ir_intrinsics:
+                    code.append((CALL, slot(dest), ir_intrinsics[fun.name], tuple(map(slot, args))))
+                elif fun.name in print_functions and len(args) == 1:
+                    code.append((PRINT, slot(dest), print_functions[fun.name], slot(args[0])))
+                else:
+                    raise Exception(f"Unsupported function in IR: {fun.name}")
+            case ir.Jump(label):
+                code.append((JUMP, targets[label.name]))
+            case ir.CondJump(cond, then_label, else_label):
+                code.append((COND_JUMP, slot(cond), targets[then_label.name], targets[else_label.name]))
+            case _:
+                raise Exception(f'Unknown instruction: {type(insn)}')
+    return PreparedIr(code, list(slots))
+
+
+def run_ir(instructions: list[ir.Instruction] | PreparedIr,
+           print_line: Callable[[str], None] = print) -> dict[IRvar, Any]:
+    """
+    Runs IR instructions directly, without assembling them.
+
+    `print_int` and `print_bool` output goes to `print_line`. Returns the
+    final value of each variable; variables never assigned are None.
+    """
+    prepared = instructions if isinstance(instructions, PreparedIr) else prepare_ir(instructions)
+    code = prepared.code
+    values: list[Any] = [None] * len(prepared.variables)
+    end = len(code)
+    pc = 0
+    while pc < end:
+        insn = code[pc]
+        op = insn[0]
+        pc += 1
+        if op == CALL:
+            args = insn[3]
+            if len(args) == 2:
+                values[insn[1]] = insn[2](values[args[0]], values[args[1]])
+            else:
+                values[insn[1]] = insn[2](*[values[arg] for arg in args])
+        elif op == LOAD_CONST:
+            values[insn[1]] = insn[2]
+        elif op == COPY:
+            values[insn[1]] = values[insn[2]]
+        elif op == COND_JUMP:
+            pc = insn[2] if values[insn[1]] else insn[3]
+        elif op == JUMP:
+            pc = insn[1]
+        else:
+            print_line(insn[2](values[insn[3]]))
+            values[insn[1]] = None
+    return dict(zip(prepared.variables, values))
@@ -0,0 +1,90 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from src.model import ast, ir
+from src.compiler.constant_folder import fold_typechecked
+from src.compiler.ir_generator import generate_ir, module_env, top_level_name
+from src.compiler.parser import parse
+from src.compiler.tokenizer import Token
+
+
+def split_functions(tokens: list[Token]) -> list[list[Token]]:
+    """
+    Splits the tokens of a module before each top-level `fun`.
+
+    A `fun` only starts a function definition outside of braces. Function
+    bodies do not depend on each other, so each piece can be parsed on its
+    own. The top-level expression stays in the last piece.
+    """
+    pieces: list[list[Token]] = []
+    start = 0
+    depth = 0
+    for index, token in enumerate(tokens):
+        text = token.text
+        if text == '{':
+            depth += 1
+        elif text == '}':
+            depth -= 1
+        elif text == 'fun' and depth == 0 and index > start:
+            pieces.append(tokens[start:index])
+            start = index
+    pieces.append(tokens[start:])
+    return pieces
+
+
+def _parse_module(tokens: list[Token]) -> ast.Module:
+    module = parse(tokens)
+    assert isinstance(module, ast.Module)
+    return module
+
+
+def parse_parallel(tokens: list[Token], executor: ProcessPoolExecutor) -> ast.Module:
+    """Parses the pieces from `split_functions` in `executor` and merges them into one module."""
+    pieces = split_functions(tokens)
+    if pieces[0] and pieces[0][0].text != 'fun' and len(pieces) > 1:
+        # An expression before a function is an error, which `parse` reports
+        return _parse_module(tokens)
+    functions: list[ast.FunctionDef] = []
+    expression = None
+    unit_offsets: list[int] = []
+    for index, piece_module in enumerate(executor.map(_parse_module, pieces)):
+        if piece_module.expression is not None and index < len(pieces) - 1:
+            # Same as what `parse` does with the rest of the module
+            return _parse_module(tokens)
+        functions.extend(piece_module.functions)
+        expression = piece_module.expression
+        unit_offsets.extend(piece_module.unit_offsets)
+    return ast.Module(functions=functions, expression=expression, unit_offsets=unit_offsets)
+
+
+def _lower_functions(functions: list[ast.FunctionDef], indices: range) -> list[list[ir.Instruction]]:
+    env = module_env(functions)
+    return [generate_ir(functions[index], env=env) for index in indices]
+
+
+def generate_module_ir_parallel(tokens: list[Token], jobs: int,
+                                fold: bool = False) -> tuple[ast.Module, dict[str, list[ir.Instruction]]]:
+    """
+    Parses, typechecks and lowers each function of a module in `jobs` worker processes.
+
+    Returns the module and the same listing as `generate_module_ir`, in the
+    same order: the functions as they appear in the source code, followed by
+    the top-level expression. With `fold`, the module is passed through
+    `fold_typechecked` before it is lowered.
+    """
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        module = parse_parallel(tokens, executor)
+        if fold:
+            module = fold_typechecked(module)
+        functions = module.functions
+        # One batch of functions per worker, so the function list is sent to each worker only once
+        batch_size = max(1, -(-len(functions) // jobs))
+        batches = [range(start, min(start + batch_size, len(functions)))
+                   for start in range(0, len(functions), batch_size)]
+        lowered = [executor.submit(_lower_functions, functions, batch) for batch in batches]
+        top_level = executor.submit(generate_ir, module)
+        ir_map: dict[str, list[ir.Instruction]] = {}
+        for batch, future in zip(batches, lowered):
+            for index, instructions in zip(batch, future.result()):
+                ir_map[functions[index].name] = instructions
+        ir_map[top_level_name] = top_level.result()
+    return module, ir_map
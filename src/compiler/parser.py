@@ -1,5 +1,12 @@
+from bisect import bisect_left, bisect_right
+from collections import deque
+from operator import attrgetter
+from typing import Iterable, Iterator
+
 from src.model import ast
-from src.compiler.tokenizer import Token
+from src.model.ast_arena import AstArena
+from src.model.hash_cons import HashConsFactory
+from src.compiler.tokenizer import LineIndex, TextEdit, Token, rescan_start, retokenize, shift_tokens, tokenize
 from src.model.types import Int, Bool, Type, PointerType
 
 precedence_levels = [
@@ -13,60 +20,144 @@ precedence_levels = [
     ['not'],
 ]
 
-def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
+# Precomputed lookup tables so the hot paths test membership in O(1)
+precedence_sets = [frozenset(ops) for ops in precedence_levels]
+# Binding power of each binary operator for the Pratt parser: its index in precedence_levels
+binding_powers: dict[str, int] = {op: level for level, ops in enumerate(precedence_levels) for op in ops}
+right_associative_operators = frozenset(['='])
+term_operators = frozenset(['*', '/'])
+additive_operators = frozenset(['+', '-'])
+# Expressions that may follow each other in a block without a ';' in between
+block_like_starts = frozenset(['if', 'while', '{'])
+dereference_operand_types = frozenset(['identifier', '('])
+
+# Shared sentinel returned when peeking past the last token
+END = Token(type="end", text="")
+
+class TokenBuffer:
+    """
+    A small lookahead window over a token iterator.
+
+    Lets the parser consume a lazily produced token stream (e.g. from
+    `tokenize_stream`) while only holding the few tokens it peeks at.
+    """
+
+    def __init__(self, tokens: Iterable[Token]) -> None:
+        self._tokens: Iterator[Token] = iter(tokens)
+        self._window: deque[Token] = deque()
+
+    def peek(self, offset: int = 0) -> Token:
+        while len(self._window) <= offset:
+            token = next(self._tokens, None)
+            if token is None:
+                return END
+            self._window.append(token)
+        return self._window[offset]
+
+    def advance(self) -> None:
+        self.peek()
+        if self._window:
+            self._window.popleft()
+
+
+def parse(tokens: list[Token] | Iterable[Token], right_associative=False,
+          line_index: LineIndex | None = None, pratt: bool = False,
+          arena: AstArena | None = None, factory: HashConsFactory | None = None) -> ast.Expression:
+    """
+    Parses tokens into an `ast.Module`.
+
+    Pass the `LineIndex` of the source code to get line and column numbers
+    in error messages instead of raw tokens.
+
+    With `pratt=True`, binary expressions are parsed by an iterative
+    operator-precedence loop instead of recursing once per precedence level.
+    Both produce the same trees.
+
+    With an `arena`, the nodes are added to it instead of being built as
+    `ast` dataclasses, and the handle of the module node is returned.
+    With a hash-consing `factory`, equal subtrees share one node.
+
+    The offset of a node is relative to the start of the function
+    definition or top-level expression it is in, whose offsets in the
+    source code are the module's `unit_offsets`. This way an edit before
+    a unit does not change it (see `reparse`). `Module.source_offset`
+    gives the offset of a node in the source code.
+    """
+
+    # Where nodes are built: the ast classes, or factories with the same names
+    nodes = arena if arena is not None else factory if factory is not None else ast
+    offset_of = attrgetter('offset') if arena is None else arena.offsets.__getitem__
 
     # This keeps track of which token we're looking at.
 
     pos = 0
-
-    def peek() -> Token:
-        if pos < len(tokens):
-            return tokens[pos]
-        else:
-            return Token(type="end", text="")
+    # Where the current unit starts, and where each unit started
+    unit_start = 0
+    unit_offsets: list[int] = []
+    buffer = None if isinstance(tokens, list) else TokenBuffer(tokens)
+    token_count = len(tokens) if buffer is None else 0
+
+    if buffer is None:
+        def peek(offset: int = 0) -> Token:
+            if pos + offset < token_count:
+                return tokens[pos + offset]
+            return END
+    else:
+        peek = buffer.peek
+
+    def where(token: Token) -> str:
+        # Line and column are only computed here, when an error is reported
+        if token.type == 'end':
+            return 'end of input'
+        if line_index is not None and token.offset >= 0:
+            return f'{line_index.location(token.offset)}: "{token.text}"'
+        return str(token)
 
     def consume(expected:  str | list[str] | None = None) -> Token:
         nonlocal pos
         token = peek()
-        if isinstance(expected, str) and token.text != expected:
-            raise Exception(f'{token}: expected "{expected}"')
-        if isinstance(expected, list) and token.text not in expected:
-            comma_separated = ", ".join([f'"{e}"' for e in expected])
-            raise Exception(f'{token}: expected one of: {comma_separated}')
+        if expected is not None:
+            if isinstance(expected, str) and token.text != expected:
+                raise Exception(f'{where(token)}: expected "{expected}"')
+            if isinstance(expected, list) and token.text not in expected:
+                comma_separated = ", ".join([f'"{e}"' for e in expected])
+                raise Exception(f'{where(token)}: expected one of: {comma_separated}')
         pos += 1
+        if buffer is not None:
+            buffer.advance()
         return token
 
 
     def parse_int_literal() -> ast.Literal:
         if peek().type != 'int_literal' :
-            raise Exception(f'{peek()}: expected an integer literal')
+            raise Exception(f'{where(peek())}: expected an integer literal')
         token = consume()
-        return ast.Literal(value=int(token.text))
+        return nodes.Literal(value=int(token.text), offset=token.offset - unit_start)
 
     def parse_bool_literal() -> ast.Literal:
         if peek().type != 'bool_literal':
-            raise Exception(f'{peek().loc}: expected an integer literal')
+            raise Exception(f'{where(peek())}: expected a boolean literal')
         token = consume()
         if 'rue' in token.text:
             value = True
         else:
             value = False
-        return ast.Literal(value=value)
+        return nodes.Literal(value=value, offset=token.offset - unit_start)
 
     def parse_identifier() -> ast.Identifier:
         if peek().type != 'identifier':
-            raise Exception(f'{peek().loc}: expected an identifier')
+            raise Exception(f'{where(peek())}: expected an identifier')
         token = consume()
-        return ast.Identifier(name=token.text)
+        return nodes.Identifier(name=token.text, offset=token.offset - unit_start)
 
     def parse_term() -> ast.Expression:
         # 处理乘法和除法
         left = parse_factor()
-        while peek().text in ['*', '/']:
+        while peek().text in term_operators:
             operator_token = consume()
             operator = operator_token.text
             right = parse_factor()
-            left = ast.BinaryOp(left=left, op=operator, right=right)
+            left = nodes.BinaryOp(left=left, op=operator, right=right, offset=offset_of(left))
         return left
 
     def parse_binary_expression(level=0) -> ast.Expression:
@@ -74,57 +165,91 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
             return parse_unary_expression()
 
         left_expr = parse_binary_expression(level + 1)
-        while peek().text in precedence_levels[level]:
+        while peek().text in precedence_sets[level]:
             op_token = consume()
             if op_token.text == '=':
                 # Special handling for right associativity of assignment
                 right_expr = parse_binary_expression(level)  # Use the same level for right associativity
             else:
                 right_expr = parse_binary_expression(level + 1)
-            left_expr = ast.BinaryOp(left=left_expr,op=op_token.text, right=right_expr)
+            left_expr = nodes.BinaryOp(left=left_expr,op=op_token.text, right=right_expr, offset=offset_of(left_expr))
 
         return left_expr
 
+    def parse_binary_expression_pratt() -> ast.Expression:
+        # Explicit operand and operator stacks instead of one recursive call per precedence level
+        operands = [parse_unary_expression_iterative()]
+        operators: list[str] = []
+        powers: list[int] = []
+
+        def reduce() -> None:
+            powers.pop()
+            right_expr = operands.pop()
+            left_expr = operands[-1]
+            operands[-1] = nodes.BinaryOp(left=left_expr, op=operators.pop(), right=right_expr, offset=offset_of(left_expr))
+
+        while (power := binding_powers.get(peek().text)) is not None:
+            op = consume().text
+            if op in right_associative_operators:
+                while powers and powers[-1] > power:
+                    reduce()
+            else:
+                while powers and powers[-1] >= power:
+                    reduce()
+            operators.append(op)
+            powers.append(power)
+            operands.append(parse_unary_expression_iterative())
+
+        while operators:
+            reduce()
+        return operands[0]
+
+    def parse_unary_expression_iterative() -> ast.Expression:
+        not_tokens = []
+        while peek().text == 'not':
+            not_tokens.append(consume('not'))
+        expr = parse_factor()
+        for op_token in reversed(not_tokens):
+            expr = nodes.UnaryOp(operator=op_token.text, operand=expr, offset=op_token.offset - unit_start)
+        return expr
+
     def parse_unary_expression() -> ast.Expression:
         if peek().text == 'not':
             op_token = consume('not')
             expr = parse_unary_expression()  # 递归以支持链式一元操作符
-            return ast.UnaryOp(operator=op_token.text, operand=expr)
+            return nodes.UnaryOp(operator=op_token.text, operand=expr, offset=op_token.offset - unit_start)
         else:
             return parse_factor()
 
     def parse_factor() -> ast.Expression:
-        if peek().text == '&':
-            consume('&')
+        token = peek()
+        text = token.text
+        if text == '&':
+            op_token = consume('&')
             expr = parse_factor()  # recursive call to support successive address fetching operations
-            return ast.AddressOf(expr=expr)
-        elif peek().text == '*':
-            next_pos = pos + 1
+            return nodes.AddressOf(expr=expr, offset=op_token.offset - unit_start)
+        elif text == '*':
             # Check if the next token is an identifier or parenthesis to disambiguate references and multiplications
-            if tokens[next_pos].type in ['identifier', '(']:
-                consume('*')
+            if peek(1).type in dereference_operand_types:
+                op_token = consume('*')
                 expr = parse_factor()  # recursive call to support successive dereferencing operations
-                return ast.Dereference(expr=expr)
-        if peek().text == '(':
-            return parse_parenthesized()
-        elif peek().text == '{':
-            return parse_block()
-        elif peek().text == 'if':
-            return parse_if_expr()
-        elif peek().text == 'while':
-            return parse_while_expr()
-        elif peek().type == 'identifier':
-            next_pos = pos + 1
-            if next_pos < len(tokens) and tokens[next_pos].text == '(':
+                return nodes.Dereference(expr=expr, offset=op_token.offset - unit_start)
+        factor_parser = factor_parsers_by_text.get(text)
+        if factor_parser is not None:
+            return factor_parser()
+        token_type = token.type
+        if token_type == 'identifier':
+            if peek(1).text == '(':
                 return parse_function_call()
-            else:
-                return parse_identifier()
-        elif peek().type == 'bool_literal':
+            consume()
+            return nodes.Identifier(name=text, offset=token.offset - unit_start)
+        elif token_type == 'int_literal':
+            consume()
+            return nodes.Literal(value=int(text), offset=token.offset - unit_start)
+        elif token_type == 'bool_literal':
             return parse_bool_literal()
-        elif peek().type == 'int_literal':
-            return parse_int_literal()
         else:
-            raise Exception(f'{peek()}: unexpected token "{peek().text}"')
+            raise Exception(f'{where(token)}: unexpected token "{text}"')
 
 
     def parse_block() -> ast.Block:
@@ -141,7 +266,7 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
                 # expressions.append(result_expression)
                 if peek().text == ';':
                     consume(';')
-            elif peek().text in ['if', 'while', '{']:  # Starting a new block or control structure
+            elif peek().text in block_like_starts:  # Starting a new block or control structure
                 expr = parse_expression()
                 expressions.append(expr)
                 # Check if next token is '}', in which case, this block/expression might be the result_expression
@@ -159,15 +284,16 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
                     expressions.append(expr)
                 elif peek().text == '}':
                     result_expression = expr  # Last expression is result_expression
-                elif peek().text in ['if', 'while', '{']:  # No semicolon required before these
+                elif peek().text in block_like_starts:  # No semicolon required before these
                     expressions.append(expr)
 
                 else:
-                    raise Exception(f"{peek()}: Expected ';' or '}}' but found '{peek().text}'")
+                    raise Exception(f"{where(peek())}: Expected ';' or '}}' but found '{peek().text}'")
 
         consume('}')
         # return BlockExpr(expressions, result_expression)
-        return ast.Block(expressions=expressions, result_expression=result_expression)
+        return nodes.Block(expressions=expressions, result_expression=result_expression,
+                           offset=opening_brace_token.offset - unit_start)
 
     def parse_function_call() -> ast.Expression:
         # name = parse_identifier()
@@ -183,7 +309,7 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
                 else:
                     break
         consume(')')
-        return ast.FunctionCall(name=name_token.text, arguments=arguments)
+        return nodes.FunctionCall(name=name_token.text, arguments=arguments, offset=name_token.offset - unit_start)
 
     def parse_if_expr() -> ast.Expression:
         name_token = consume('if')  # Consume the function name token, capturing the function name
@@ -195,7 +321,7 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
         if peek().text == 'else':
             consume('else')
             else_branch = parse_expression()
-        return ast.IfExpression(condition, then_branch, else_branch)
+        return nodes.IfExpression(condition, then_branch, else_branch, offset=name_token.offset - unit_start)
 
     def parse_while_expr() -> ast.Expression:
         name_token = consume('while')  # Consume the 'while' keyword
@@ -203,7 +329,7 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
         condition = parse_expression()
         consume('do')  # Consume the 'do' keyword
         body = parse_expression()
-        return ast.WhileExpr(condition=condition, body=body)
+        return nodes.WhileExpr(condition=condition, body=body, offset=name_token.offset - unit_start)
 
 
     def parse_parenthesized() -> ast.Expression:
@@ -217,7 +343,7 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
     def parse_expression_right() -> ast.Expression:
         left = parse_term()
 
-        if peek().text in ['+', '-']:
+        if peek().text in additive_operators:
             operator_token = consume()
             operator = operator_token.text
 
@@ -226,7 +352,7 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
             right = parse_expression()
 
             # Construct and return an AST node for the binary operation, with `left` on the left and `right` on the right as a result
-            return ast.BinaryOp(left=left,op=operator,right=right)
+            return nodes.BinaryOp(left=left,op=operator,right=right, offset=offset_of(left))
         else:
             return left
 
@@ -235,6 +361,8 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
     def parse_expression() -> ast.Expression:
         if right_associative:
             return parse_expression_right()
+        elif pratt:
+            return parse_binary_expression_pratt()
         else:
             return parse_binary_expression(0)
 
@@ -243,11 +371,11 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
     def parse_expression_right() -> ast.Expression:
         # 之前的 parse_expression_right() 代码
         left = parse_term()
-        if peek().text in ['+', '-']:
+        if peek().text in additive_operators:
             operator_token = consume()
             operator = operator_token.text
             right = parse_expression()  # 注意这里递归调用 parse_expression()
-            return ast.BinaryOp(left=left, op=operator, right=right)
+            return nodes.BinaryOp(left=left, op=operator, right=right, offset=offset_of(left))
         else:
             return left
 
@@ -284,12 +412,17 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
             type_annotation = None
         consume("=")
         val_ast = parse_expression()
+        if arena is not None:
+            is_address_of = arena.kind(val_ast) is ast.AddressOf
+            value = arena.field(val_ast, 'expr' if is_address_of else 'value')
+            return arena.VarDecl(name=name, value=value, type_annotation=type_annotation, offset=name_token.offset - unit_start,
+                                 raw_value=not is_address_of)
         if (isinstance(val_ast, ast.AddressOf)):
             value = val_ast.expr
         else:
             value = val_ast.value
         # bool or int
-        return ast.VarDecl(name=name,  value=value,type_annotation=type_annotation)
+        return ast.VarDecl(name=name,  value=value,type_annotation=type_annotation, offset=name_token.offset - unit_start)
 
     def parse_function_definition() -> ast.FunctionDef:
         """
@@ -297,7 +430,7 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
         A function definition consists of the 'fun' keyword, followed by the function name,
         a parameter list, a return type, and a block of code as the function body.
         """
-        consume('fun')  # Consume the 'fun' keyword
+        fun_token = consume('fun')  # Consume the 'fun' keyword
         name = consume().text  # Function name
         consume('(')
         params = []
@@ -315,7 +448,15 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
         else:
             return_type = None
         body = parse_block()  # Function body
-        return ast.FunctionDef(name=name, params=params, return_type=return_type, body=body)
+        return nodes.FunctionDef(name=name, params=params, return_type=return_type, body=body,
+                                 offset=fun_token.offset - unit_start)
+
+    def start_unit() -> None:
+        # Node offsets are relative to the first token of their function definition or top-level expression
+        nonlocal unit_start
+        unit_offset = peek().offset
+        unit_offsets.append(unit_offset)
+        unit_start = max(unit_offset, 0)
 
     def parse_module() -> ast.Module:
         """
@@ -324,18 +465,118 @@ def parse(tokens: list[Token], right_associative=False) -> ast.Expression:
         """
         functions = []
         while peek().text == 'fun':
+            start_unit()
             function_def = parse_function_definition()  # Parse each function definition
             functions.append(function_def)
         expression = None
         if peek().type != 'end':  # If there are tokens left, parse the top-level expression
+            start_unit()
             expression = parse_expression()
-        return ast.Module(functions=functions, expression=expression)
+        return nodes.Module(functions=functions, expression=expression, unit_offsets=unit_offsets)
+
+    # Dispatch table for parse_factor on the current token's text
+    factor_parsers_by_text = {
+        '(': parse_parenthesized,
+        '{': parse_block,
+        'if': parse_if_expr,
+        'while': parse_while_expr,
+    }
 
     res = parse_module()
     if peek().text == ';':
         consume(';')
     if peek().type != 'end':
-        raise Exception(f"Unexpected token at {peek()}: '{peek().text}'")
+        raise Exception(f"Unexpected token at {where(peek())}: '{peek().text}'")
 
     return res
 
+
+
+def split_units(tokens: list[Token], module: ast.Module) -> list[list[Token]]:
+    """
+    Splits `tokens` into those of each unit of `module`, as `reparse` keeps them.
+
+    `module` is the result of `parse` on `tokens`. The offsets of the tokens
+    of a unit are relative to its start, like those of its nodes.
+    """
+    starts = module.unit_offsets
+    bounds = [bisect_left(tokens, offset, key=attrgetter('offset')) for offset in starts[1:]] + [len(tokens)]
+    return [[Token(type=token.type, text=token.text, offset=token.offset - start) for token in tokens[low:high]]
+            for start, low, high in zip(starts, [0] + bounds, bounds)]
+
+
+def join_units(units: list[list[Token]], module: ast.Module) -> list[Token]:
+    """The tokens of all `units` of `module`, with their offsets in the source code."""
+    return _join_units(units, module.unit_offsets)
+
+
+def _join_units(units: list[list[Token]], starts: list[int]) -> list[Token]:
+    return [Token(type=token.type, text=token.text, offset=token.offset + start)
+            for start, unit in zip(starts, units) for token in unit]
+
+
+def reparse(source_code: str, units: list[list[Token]], module: ast.Module, edit: TextEdit,
+            line_index: LineIndex | None = None, pratt: bool = False) -> tuple[list[list[Token]], ast.Module]:
+    """
+    Incrementally updates `module` and the tokens of its units for `edit`.
+
+    `module` is the result of `parse` on the old source code, `units` are its
+    tokens from `split_units`, and `source_code` is the new text. Each function
+    definition and the top-level expression are a unit. Only the tokens of the
+    units the edit touches are scanned again (see `retokenize`), and only those
+    units are parsed again. The others are reused as they are: their tokens and
+    nodes have offsets relative to the start of the unit, so only the new
+    module's `unit_offsets` are moved by the edit. The old module is not changed.
+
+    Returns the new units and module, the same as `split_units` and `parse` on
+    the new source code would give.
+    """
+    starts = module.unit_offsets
+    count = len(starts)
+    if not count:
+        tokens = tokenize(source_code)
+        new_module = parse(tokens, line_index=line_index, pratt=pratt)
+        return split_units(tokens, new_module), new_module
+
+    # The first unit the edit may change: the one scanning restarts in, or
+    # the one before if that is right at the end of its last token
+    restart = rescan_start(source_code, edit)
+    first = max(bisect_right(starts, restart) - 1, 0)
+    if first > 0 and starts[first - 1] + units[first - 1][-1].offset + len(units[first - 1][-1].text) >= restart:
+        first -= 1
+    # The units scanned again, up to the first one that starts after the edit
+    stop = bisect_right(starts, edit.end)
+    reuse = True
+    while True:
+        old_tokens = _join_units(units[first:stop], starts[first:stop])
+        scanned = retokenize(old_tokens, source_code, edit, start=starts[first] if first else 0,
+                             end=starts[stop] if stop < count else None)
+        if scanned is None:
+            # The new tokens run into the next unit, e.g. when the edit opens a comment
+            stop = count
+            continue
+        changed, changed_from, changed_to = scanned
+        # The scanned units whose tokens are all carried over are reused, as are the units after them
+        reused, carried = stop, 0
+        while reuse and reused > first and carried + len(units[reused - 1]) <= len(old_tokens) - changed_to:
+            reused -= 1
+            carried += len(units[reused])
+        middle_tokens = (old_tokens[:changed_from] + changed
+                         + shift_tokens(old_tokens[changed_to:len(old_tokens) - carried], edit.delta))
+        try:
+            middle = parse(middle_tokens, line_index=line_index, pratt=pratt)
+            if reused < count and middle.expression is not None:
+                raise ValueError('the top-level expression must come last')
+            break
+        except Exception:
+            # The edit changed where the units after it start, e.g. by removing a '}'
+            if reused == count:
+                raise
+            stop, reuse = count, False
+
+    has_expression = module.expression is not None
+    functions = module.functions[:first] + middle.functions + module.functions[reused:]
+    expression = module.expression if has_expression and reused < count else middle.expression
+    unit_offsets = starts[:first] + middle.unit_offsets + [start + edit.delta for start in starts[reused:]]
+    new_units = units[:first] + split_units(middle_tokens, middle) + units[reused:]
+    return new_units, ast.Module(functions=functions, expression=expression, unit_offsets=unit_offsets)
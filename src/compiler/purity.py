@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from typing import Any
+
+from src.model import ast
+
+
+def pure_functions(functions: list[ast.FunctionDef]) -> set[str]:
+    """
+    Returns the names of the functions among `functions` whose result only depends on their arguments.
+
+    Such a function reads only its parameters and the variables it
+    declares, assigns only to those, writes no pointers and calls only
+    functions that are pure themselves, so not `print_int`. Since a
+    function called by `interpret` can see the variables of its caller,
+    reading any other variable makes it impure too. Mutually recursive
+    functions are pure together unless one of them is not.
+    """
+    pure = {func.name for func in functions}
+    changed = True
+    while changed:
+        changed = False
+        for func in functions:
+            if func.name in pure and not _PurityChecker(pure).is_pure(func):
+                pure.discard(func.name)
+                changed = True
+    return pure
+
+
+class _PurityChecker:
+    def __init__(self, pure: set[str]) -> None:
+        self.pure = pure
+        # The names declared in the function, innermost block last
+        self.scopes: list[set[str]] = []
+
+    def is_pure(self, func: ast.FunctionDef) -> bool:
+        self.scopes = [{param[0] for param in func.params}]
+        return self.check(func.body)
+
+    def is_local(self, name: str) -> bool:
+        return any(name in scope for scope in self.scopes)
+
+    def check(self, node: Any) -> bool:
+        match node:
+            case ast.Literal():
+                return True
+            case ast.Identifier(name):
+                return self.is_local(name)
+            case ast.BinaryOp(ast.Identifier(name), '=', right):
+                return self.is_local(name) and self.check(right)
+            case ast.BinaryOp(_, '=', _):
+                # A pointer write, or an assignment the interpreter rejects
+                return False
+            case ast.BinaryOp(left, _, right):
+                return self.check(left) and self.check(right)
+            case ast.UnaryOp(_, operand):
+                return self.check(operand)
+            case ast.IfExpression(cond, then_clause, else_clause):
+                return (self.check(cond) and self.check(then_clause)
+                        and (else_clause is None or self.check(else_clause)))
+            case ast.WhileExpr(condition, body):
+                return self.check(condition) and self.check(body)
+            case ast.Block(expressions, result_expression):
+                self.scopes.append(set())
+                pure = (all(self.check(expr) for expr in expressions)
+                        and (result_expression is None or self.check(result_expression)))
+                self.scopes.pop()
+                return pure
+            case ast.VarDecl(name, value):
+                if isinstance(value, ast.Expression) and not self.check(value):
+                    return False
+                self.scopes[-1].add(name)
+                return True
+            case ast.FunctionCall(name, arguments):
+                return (name in self.pure and not self.is_local(name)
+                        and all(self.check(arg) for arg in arguments))
+            case ast.Break(value):
+                return value is None or self.check(value)
+            case ast.Continue():
+                return True
+            case ast.AddressOf(expr) | ast.Dereference(expr):
+                return self.check(expr)
+            case _:
+                return False
+
+
+class ResultCache:
+    """The results of one function by argument tuple, keeping only the `maxsize` most recently used."""
+    __slots__ = ('maxsize', 'hits', 'misses', '_results')
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results: OrderedDict[tuple, Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: tuple, default: Any = None) -> Any:
+        results = self._results
+        if key in results:
+            self.hits += 1
+            results.move_to_end(key)
+            return results[key]
+        self.misses += 1
+        return default
+
+    def put(self, key: tuple, result: Any) -> None:
+        results = self._results
+        results[key] = result
+        if len(results) > self.maxsize:
+            results.popitem(last=False)
+
+
+def memoize_pure_functions(module: ast.Module, maxsize: int = 1024) -> dict[str, ResultCache]:
+    """
+    Returns a result cache for each pure function of `module`, by name.
+
+    Passed to `interpret` with the module, they make it cache the results
+    of those functions, and their hit and miss counts can be read afterwards.
+    Other functions are called as usual.
+    """
+    pure = pure_functions(module.functions)
+    return {func.name: ResultCache(maxsize) for func in module.functions if func.name in pure}
@@ -0,0 +1,121 @@
+from typing import Any
+
+from src.model import ast
+
+# Marks the bottom of a resolver scope stack: names not found above it are left to the SymTab
+_unresolved = None
+
+
+def resolve(node: ast.Expression | ast.Module) -> None:
+    """
+    Gives each `ast.Identifier` and `ast.VarDecl` below `node` its place in a frame.
+
+    A variable declared in a block gets the next free slot of that block's
+    frame, and each identifier that refers to it gets `depth`, the number
+    of blocks between the two, and the same `slot`. The interpreter then
+    finds the value at `symtab.frames[-1 - depth][slot]`.
+
+    The parameters of a function are slots 0..n-1 of the frame of the call.
+    Variables that are not declared in an enclosing block of the same
+    function (builtins, functions, variables of the caller) keep
+    `depth == -1` and are looked up by name. So do nodes shared by a
+    hash-consed tree that would need different places in different uses.
+    """
+    _Resolver().visit_root(node)
+
+
+class _Resolver:
+    def __init__(self) -> None:
+        # Names to slots, innermost scope last
+        self.scopes: list[dict[str, int] | None] = [_unresolved]
+        # The place each node got in this pass, to notice shared nodes used in more than one place
+        self.places: dict[int, tuple[int, int]] = {}
+
+    def visit_root(self, node: Any) -> None:
+        if isinstance(node, ast.Module):
+            for func in node.functions:
+                self.visit_function(func)
+            if node.expression is not None:
+                self.visit(node.expression)
+        elif isinstance(node, ast.FunctionDef):
+            self.visit_function(node)
+        else:
+            self.visit(node)
+
+    def visit_function(self, func: ast.FunctionDef) -> None:
+        outer = self.scopes
+        self.scopes = [_unresolved, {param[0]: slot for slot, param in enumerate(func.params)}]
+        self.visit(func.body)
+        self.scopes = outer
+
+    def place(self, node: ast.Identifier | ast.VarDecl, depth: int, slot: int) -> None:
+        seen = self.places.setdefault(id(node), (depth, slot))
+        if seen != (depth, slot):
+            depth, slot = -1, -1
+            self.places[id(node)] = (depth, slot)
+        if isinstance(node, ast.Identifier):
+            node.depth = depth
+        node.slot = slot
+
+    def lookup(self, node: ast.Identifier) -> None:
+        scopes = self.scopes
+        for depth in range(len(scopes) - 1):
+            scope = scopes[-1 - depth]
+            if scope is _unresolved:
+                break
+            slot = scope.get(node.name)
+            if slot is not None:
+                self.place(node, depth, slot)
+                return
+        self.place(node, -1, -1)
+
+    def visit(self, node: Any) -> None:
+        match node:
+            case ast.Identifier():
+                self.lookup(node)
+
+            case ast.VarDecl():
+                if isinstance(node.value, ast.Expression):
+                    self.visit(node.value)
+                scope = self.scopes[-1]
+                if scope is _unresolved:
+                    # A declaration outside of any block lives in the SymTab's outermost scope
+                    self.place(node, -1, -1)
+                else:
+                    # A redeclaration in the same block reuses the slot
+                    self.place(node, 0, scope.setdefault(node.name, len(scope)))
+
+            case ast.BinaryOp():
+                self.visit(node.left)
+                self.visit(node.right)
+
+            case ast.Block():
+                self.scopes.append({})
+                for expr in node.expressions:
+                    self.visit(expr)
+                if node.result_expression is not None:
+                    self.visit(node.result_expression)
+                self.scopes.pop()
+
+            case ast.IfExpression():
+                self.visit(node.cond)
+                self.visit(node.then_clause)
+                if node.else_clause is not None:
+                    self.visit(node.else_clause)
+
+            case ast.WhileExpr():
+                self.visit(node.condition)
+                self.visit(node.body)
+
+            case ast.UnaryOp():
+                self.visit(node.operand)
+
+            case ast.FunctionCall():
+                for arg in node.arguments:
+                    self.visit(arg)
+
+            case ast.Break(value) if value is not None:
+                self.visit(value)
+
+            case ast.AddressOf(expr) | ast.Dereference(expr):
+                self.visit(expr)
@@ -1,6 +1,8 @@
 import re
-from dataclasses import dataclass
-from typing import List, Literal
+import sys
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import Iterator, List, Literal, TextIO
 
 TokenType = Literal["int_literal", "identifier", "operator", "parenthesis", "end"]
 
@@ -8,33 +10,333 @@ TokenType = Literal["int_literal", "identifier", "operator", "parenthesis", "end
 class Token:
     type: TokenType
     text: str
+    # Character offset of the token in the source, -1 if unknown.
+    # Use a LineIndex to turn it into a line and column.
+    offset: int = field(default=-1, compare=False)
 
-def tokenize(source_code: str) -> List[Token]:
-    token_specs = [
-        ("address_of", re.compile(r'&')),  # Add address fetch operator
-        ("multiline_comment", re.compile(r'/\*.*?\*/', re.DOTALL)),  # Skip multi-line comments
-        ("singleline_comment", re.compile(r'//.*?\n')),  # Skip single-line comments
-        ("singleline_comment_alt", re.compile(r'#.*?\n')),  # Skip single-line comments (alternate)
-        ("whitespace", re.compile(r'\s+')),  # Skip whitespace
-        ("bool_literal", re.compile(r'True|true|False|false')),
-        ("int_literal", re.compile(r'\b[0-9]+\b')),
-        ("identifier", re.compile(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b')),
-        # Longer operators must be before shorter ones that are their substrings
-        ("operator", re.compile(r':|==|!=|<=|>=|<<|>>|\+\+|--|\+=|-=|\*=|/=|&&|\|\||[%+\-*/=<>]')),
-        ("parenthesis", re.compile(r'[{}()\[\],;]')),
-    ]
 
+# Small integer ids for token types, used by CompactToken
+token_kinds: tuple[str, ...] = (
+    "end", "address_of", "bool_literal", "int_literal", "identifier", "operator", "parenthesis",
+)
+token_kind_ids: dict[str, int] = {name: kind for kind, name in enumerate(token_kinds)}
+
+
+class CompactToken:
+    """
+    A memory-compact alternative to Token for very large inputs.
+
+    Uses `__slots__` instead of a per-instance `__dict__`, stores the token
+    type as a small int (see `token_kinds`) and shares one interned string
+    between all tokens with the same text. Exposes the same `type`, `text`
+    and `offset` attributes as Token, so the parser accepts either.
+    """
+    __slots__ = ('kind', 'text', 'offset')
+
+    def __init__(self, kind: int, text: str, offset: int = -1) -> None:
+        self.kind = kind
+        self.text = text
+        self.offset = offset
+
+    @property
+    def type(self) -> str:
+        return token_kinds[self.kind]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CompactToken):
+            return self.kind == other.kind and self.text == other.text
+        if isinstance(other, Token):
+            return self.type == other.type and self.text == other.text
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.kind, self.text))
+
+    def __repr__(self) -> str:
+        return f"CompactToken(type={self.type!r}, text={self.text!r}, offset={self.offset})"
+
+
+@dataclass(frozen=True)
+class Location:
+    file: str
+    line: int
+    column: int
+
+    def __str__(self) -> str:
+        return f"{self.file}:{self.line}:{self.column}"
+
+
+class LineIndex:
+    """
+    Converts character offsets into line and column numbers.
+
+    Tokens only store an integer offset. The table of line start offsets
+    is built the first time a location is asked for, which normally only
+    happens when an error is reported. The offset of a node is relative
+    to its unit, so it goes through `Module.source_offset` first.
+    """
+
+    def __init__(self, source_code: str, file: str = "<input>") -> None:
+        self.source_code = source_code
+        self.file = file
+        self._line_starts: list[int] | None = None
+
+    def _build_line_starts(self) -> list[int]:
+        line_starts = [0]
+        find = self.source_code.find
+        newline = find("\n")
+        while newline >= 0:
+            line_starts.append(newline + 1)
+            newline = find("\n", newline + 1)
+        return line_starts
+
+    def location(self, offset: int) -> Location:
+        if self._line_starts is None:
+            self._line_starts = self._build_line_starts()
+        line = bisect_right(self._line_starts, offset)
+        return Location(self.file, line, offset - self._line_starts[line - 1] + 1)
+
+
+@dataclass(frozen=True)
+class TextEdit:
+    """Replaces the characters `start` to `end` of the old source code with `new_text`."""
+    start: int
+    end: int
+    new_text: str
+
+    @property
+    def delta(self) -> int:
+        """How much the offsets of everything after the edit move."""
+        return len(self.new_text) - (self.end - self.start)
+
+    def apply(self, source_code: str) -> str:
+        return source_code[:self.start] + self.new_text + source_code[self.end:]
+
+# Order matters: at each position the first spec that matches wins.
+token_specs = [
+    ("address_of", r'&'),  # Add address fetch operator
+    ("multiline_comment", r'(?s:/\*.*?\*/)'),  # Skip multi-line comments
+    ("singleline_comment", r'//.*?\n'),  # Skip single-line comments
+    ("singleline_comment_alt", r'#.*?\n'),  # Skip single-line comments (alternate)
+    ("whitespace", r'\s+'),  # Skip whitespace
+    ("bool_literal", r'True|true|False|false'),
+    ("int_literal", r'\b[0-9]+\b'),
+    ("identifier", r'\b[a-zA-Z_][a-zA-Z0-9_]*\b'),
+    # Longer operators must be before shorter ones that are their substrings
+    ("operator", r':|==|!=|<=|>=|<<|>>|\+\+|--|\+=|-=|\*=|/=|&&|\|\||[%+\-*/=<>]'),
+    ("parenthesis", r'[{}()\[\],;]'),
+]
+
+skipped_token_types = frozenset(["whitespace", "singleline_comment", "singleline_comment_alt", "multiline_comment"])
+
+# Precompiled once at import time and shared by every call.
+compiled_token_specs = [(token_type, re.compile(pattern)) for token_type, pattern in token_specs]
+
+# A single alternation with one named group per token type. Python tries the
+# alternatives left to right, so this picks the same token as the loop below.
+master_pattern = re.compile(
+    "|".join(f"(?P<{token_type}>{pattern})" for token_type, pattern in token_specs)
+)
+
+
+def tokenize(source_code: str, reference: bool = False) -> List[Token]:
+    """
+    Splits source code into tokens.
+
+    By default a single precompiled master regex scans the whole input.
+    Pass `reference=True` to use the original pattern-by-pattern loop, which
+    produces the same token stream and is kept for cross-checking.
+    """
+    if reference:
+        return tokenize_reference(source_code)
+
+    result: List[Token] = []
+    append = result.append
+    position = 0
+    for match in master_pattern.finditer(source_code):
+        if match.start() != position:
+            break
+        position = match.end()
+        token_type = match.lastgroup
+        if token_type not in skipped_token_types:
+            append(Token(type=token_type, text=match.group(), offset=match.start()))
+
+    if position != len(source_code):
+        raise Exception(f'Tokenization failed near "{source_code[position:position + 10]}"...')
+    return result
+
+
+def tokenize_compact(source_code: str) -> List[CompactToken]:
+    """Like `tokenize`, but returns CompactTokens with interned text."""
+    result: List[CompactToken] = []
+    append = result.append
+    intern = sys.intern
+    kind_ids = token_kind_ids
+    position = 0
+    for match in master_pattern.finditer(source_code):
+        if match.start() != position:
+            break
+        position = match.end()
+        token_type = match.lastgroup
+        if token_type not in skipped_token_types:
+            append(CompactToken(kind_ids[token_type], intern(match.group()), match.start()))
+
+    if position != len(source_code):
+        raise Exception(f'Tokenization failed near "{source_code[position:position + 10]}"...')
+    return result
+
+
+def tokenize_stream(fileobj: TextIO, chunk_size: int = 65536) -> Iterator[Token]:
+    """
+    Lazily tokenizes a text file object, reading it `chunk_size` characters at a time.
+
+    Yields the same tokens as `tokenize(fileobj.read())` while only keeping the
+    unconsumed tail of the input in memory. A token that touches the end of the
+    buffer, input that does not match yet, or a comment whose terminator has not
+    been read yet, is held back until the next chunk arrives.
+    """
+    buffer = ''
+    position = 0
+    # Offset of buffer[0] in the whole input
+    base_offset = 0
+    at_eof = False
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if chunk:
+            # Keep one consumed character so that `\b` still sees what came before.
+            keep_from = max(position - 1, 0)
+            buffer = buffer[keep_from:] + chunk
+            position -= keep_from
+            base_offset += keep_from
+        else:
+            at_eof = True
+
+        while position < len(buffer):
+            if not at_eof and _comment_continues(buffer, position):
+                break
+            match = master_pattern.match(buffer, position)
+            if match is None:
+                if not at_eof:
+                    break  # More input can still make a token match, e.g. 'tr' + 'ue' after 'false'
+                raise Exception(f'Tokenization failed near "{buffer[position:position + 10]}"...')
+            if not at_eof and match.end() == len(buffer):
+                break
+            position = match.end()
+            token_type = match.lastgroup
+            if token_type not in skipped_token_types:
+                yield Token(type=token_type, text=match.group(), offset=base_offset + match.start())
+
+        if at_eof:
+            return
+
+
+def _comment_continues(buffer: str, position: int) -> bool:
+    """Whether a comment starts at `position` but its end is not in the buffer yet."""
+    if buffer.startswith('/*', position):
+        return buffer.find('*/', position + 2) < 0
+    if buffer.startswith('//', position) or buffer.startswith('#', position):
+        return buffer.find('\n', position) < 0
+    return False
+
+
+def rescan_start(source_code: str, edit: TextEdit) -> int:
+    """
+    Where scanning must restart for `edit` at the latest, in the new `source_code`.
+
+    That is the start of the edit, unless the edit can end a comment that
+    had no end before: the characters after its `/*`, `//` or `#` were then
+    scanned as tokens, so scanning restarts from there.
+    """
+    restart = edit.start
+    # A comment ends at a `*/` or a newline, which the edit must have made
+    around_edit = source_code[max(edit.start - 1, 0):edit.start + len(edit.new_text) + 1]
+    if '*/' in around_edit:
+        # A `/*` with no `*/` after it, so none before the edit either
+        closed = source_code.rfind('*/', 0, edit.start)
+        opened = source_code.find('/*', closed + 2 if closed >= 0 else 0, edit.start)
+        if opened >= 0:
+            restart = opened
+    if '\n' in around_edit:
+        # A `//` or `#` with no newline after it, so on the line of the edit
+        line_start = source_code.rfind('\n', 0, edit.start) + 1
+        for opener in ('//', '#'):
+            opened = source_code.find(opener, line_start, edit.start)
+            if opened >= 0:
+                restart = min(restart, opened)
+    return restart
+
+
+def retokenize(tokens: List[Token], source_code: str, edit: TextEdit,
+               start: int = 0, end: int | None = None) -> tuple[List[Token], int, int] | None:
+    """
+    Scans the tokens of the old source code that `edit` changes again.
+
+    `tokens` must come from `tokenize` on the old source code and `source_code`
+    is the new text, with the edit applied. Only the region around the edit is
+    scanned again: scanning restarts after the last token that ends before
+    `rescan_start` and stops at the first old token after the edit that the
+    new scan lands on, from which point the rest of the input tokenizes the same.
+
+    `tokens` can also be those of the old source code from `start` to `end`
+    only, where a token starts at both and `start` is not after
+    `rescan_start`. Then the scan does not go past `end`, and None is
+    returned if the tokens from there on may have changed too.
+
+    Returns the new tokens that replace `tokens[first:last]`, then `first`
+    and `last`. The tokens before `first` are unchanged, and those from
+    `last` on only move by `edit.delta`. Neither are copied, so the cost
+    depends on the size of the edit, not on the size of the input.
+    """
+    delta = edit.delta
+    new_end = edit.start + len(edit.new_text)
+    first = bisect_left(tokens, rescan_start(source_code, edit), key=lambda token: token.offset + len(token.text))
+    position = tokens[first - 1].offset + len(tokens[first - 1].text) if first else start
+    limit = len(source_code) if end is None else end + delta
+
+    changed: List[Token] = []
+    old_index = first
+    old_count = len(tokens)
+    while position < limit:
+        if position > new_end:
+            # Past the edit, and the character before `position` is unchanged too
+            while old_index < old_count and tokens[old_index].offset + delta < position:
+                old_index += 1
+            if old_index < old_count and tokens[old_index].offset + delta == position:
+                break
+        match = master_pattern.match(source_code, position)
+        if match is None:
+            raise Exception(f'Tokenization failed near "{source_code[position:position + 10]}"...')
+        position = match.end()
+        token_type = match.lastgroup
+        if token_type not in skipped_token_types:
+            changed.append(Token(type=token_type, text=match.group(), offset=match.start()))
+    else:
+        if end is not None and (position > limit or position <= new_end):
+            # The scan ran into the token at `end`, or the edit reaches it
+            return None
+        old_index = old_count
+    return changed, first, old_index
+
+
+def shift_tokens(tokens: List[Token], delta: int) -> List[Token]:
+    """`tokens` with their offsets moved by `delta`."""
+    if not delta:
+        return tokens
+    return [Token(type=token.type, text=token.text, offset=token.offset + delta) for token in tokens]
+
+
+def tokenize_reference(source_code: str) -> List[Token]:
     position = 0
     result: List[Token] = []
 
     while position < len(source_code):
         match = None
-        for token_type, pattern in token_specs:
+        for token_type, pattern in compiled_token_specs:
             match = pattern.match(source_code, position)
             if match:
                 text = match.group(0)
-                if token_type not in ["whitespace", "singleline_comment", "singleline_comment_alt", "multiline_comment"]:  # Skip certain types
-                    result.append(Token(type=token_type, text=text))
+                if token_type not in skipped_token_types:  # Skip certain types
+                    result.append(Token(type=token_type, text=text, offset=position))
                 position = match.end()
                 break
         else:  # If no pattern matches
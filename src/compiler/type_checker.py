@@ -2,13 +2,13 @@ from src.model import ast, types
 from src.model.SymTab import SymTab
 from src.model.types import Type, Unit, FunctionType
 
-def typecheck_var_decl(node: ast.VarDecl, symtab: SymTab) -> types.Type:
-    value_type = typecheck(node.value, symtab)
+def typecheck_var_decl(node: ast.VarDecl, symtab: SymTab, node_types: dict[int, Type] | None = None) -> types.Type:
+    value_type = typecheck(node.value, symtab, node_types)
     annotated_type = 0
     if node.type_annotation:
         # Map AST type expression to type checker's type
         annotated_type = node.type_annotation
-        if type(value_type) != type(annotated_type):
+        if value_type is not annotated_type:
             raise TypeError(f"Type of initializer does not match variable type annotation in declaration of '{node.name}'")
     symtab.define_variable(node.name,node.value, annotated_type)
     return types.Unit()
@@ -21,7 +21,46 @@ def map_ast_type_expr_to_type(type_expr: ast.Expression) -> types.Type:
     else:
         raise Exception("Unknown type expression")
 
-def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
+# Recorded in node_types for a node that got different types in different places (a shared node)
+recheck = object()
+
+
+def typecheck(node: ast.Expression, symtab: SymTab, node_types: dict[int, Type] | None = None) -> Type:
+    """
+    Returns the type of `node`.
+
+    With `node_types`, also records the type of `node` and of every node
+    checked along the way, by id(node), so that later passes over the same
+    tree can look them up instead of checking each subtree again.
+    """
+    node_type = _typecheck(node, symtab, node_types)
+    if node_types is not None:
+        key = id(node)
+        if node_types.setdefault(key, node_type) is not node_type:
+            node_types[key] = recheck
+    return node_type
+
+
+def typecheck_module(module: ast.Module, symtab: SymTab) -> Type | None:
+    """
+    Typechecks the body of each function of `module` and its top-level expression.
+
+    Returns the type of the top-level expression, None if there is none.
+    """
+    for func in module.functions:
+        symtab.define_variable(func.name, func.body, typecheck(func, symtab))
+    for func in module.functions:
+        symtab.enter_scope()
+        for param_name, param_type in func.params:
+            symtab.define_variable(param_name, None, param_type)
+        typecheck(func.body, symtab)
+        symtab.leave_scope()
+    if module.expression is None:
+        return None
+    return typecheck(module.expression, symtab)
+
+
+def _typecheck(node: ast.Expression, symtab: SymTab, node_types: dict[int, Type] | None) -> Type:
     match node:
         # First bool, then True
         case bool():
@@ -40,10 +79,10 @@ def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
             return var_type
 
         case ast.UnaryOp():
-            operand_type = typecheck(node.operand, symtab)
+            operand_type = typecheck(node.operand, symtab, node_types)
             op_type = symtab.lookup_variable_type(f"unary_{node.operator}")
 
-            if isinstance(op_type, FunctionType) and str(operand_type) == str(op_type.param_types[0]):
+            if isinstance(op_type, FunctionType) and operand_type is op_type.param_types[0]:
                 return op_type.return_type
             else:
                 raise TypeError(f"Unsupported unary operation: {node.operator} for {operand_type}")
@@ -51,9 +90,9 @@ def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
         case ast.BinaryOp():
             if node.op == "=":
                 if isinstance(node.left, ast.Identifier):
-                    value = typecheck(node.right, symtab)
+                    value = typecheck(node.right, symtab, node_types)
                     # print('ini',symtab.lookup_variable_type(node.left.name),value)
-                    if str(symtab.lookup_variable_type(node.left.name)) != str(value):
+                    if symtab.lookup_variable_type(node.left.name) is not value:
                         # if not isinstance(symtab.lookup_variable_type(node.left.name),value):
                         raise TypeError("Left side of assignment must be isinstance with right side")
                     symtab.update_variable(node.left.name, value)
@@ -62,12 +101,12 @@ def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
                     raise TypeError("Left side of assignment must be an identifier.")
             op_func = symtab.lookup_variable(node.op)
             op_type = symtab.lookup_variable_type(node.op)
-            left_type = typecheck(node.left, symtab)
-            right_type = typecheck(node.right, symtab)
+            left_type = typecheck(node.left, symtab, node_types)
+            right_type = typecheck(node.right, symtab, node_types)
 
             if isinstance(op_type, FunctionType):
                 # Validate operand types
-                if [type(left_type), type(right_type)] != [type(t) for t in op_type.param_types]:
+                if left_type is not op_type.param_types[0] or right_type is not op_type.param_types[1]:
                     raise TypeError(f"Operand type mismatch for operator '{node.op}'")
                 return op_type.return_type
 
@@ -75,12 +114,12 @@ def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
                 raise TypeError(f"Operator '{node.op}' not defined")
         case ast.IfExpression():
 
-            cond_type = typecheck(node.cond, symtab)
+            cond_type = typecheck(node.cond, symtab, node_types)
 
             # print('in if', node.condition,cond_type)
             if not isinstance(cond_type, types.Bool):
                 raise TypeError("Condition in 'if' must be a Bool")
-            then_type = typecheck(node.then_clause, symtab)
+            then_type = typecheck(node.then_clause, symtab, node_types)
             if node.else_clause is None:
                 else_type = None
             #
@@ -88,8 +127,8 @@ def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
             #     #     raise TypeError("Then branch of 'if' without 'else' must not produce a value")
             #     return types.Unit()
             else:
-                else_type = typecheck(node.else_clause, symtab)
-                if type(then_type) != type(else_type):
+                else_type = typecheck(node.else_clause, symtab, node_types)
+                if then_type is not else_type:
                     raise TypeError("'then' and 'else' branches must have the same type")
             return then_type
 
@@ -102,8 +141,8 @@ def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
                 raise TypeError("Incorrect number of arguments")
 
             for arg, param_type in zip(node.arguments, func_type.param_types):
-                arg_type = typecheck(arg, symtab)
-                if type(arg_type) != type(param_type):
+                arg_type = typecheck(arg, symtab, node_types)
+                if arg_type is not param_type:
                     raise TypeError("Argument type mismatch")
 
             return func_type.return_type
@@ -112,20 +151,20 @@ def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
 
             # for expr in node.expressions[:-1]:
             for expr in node.expressions:
-                typecheck(expr, symtab)  # Discard types of non-final expressions
-            result_type = types.Unit() if not node.result_expression else typecheck(node.result_expression, symtab)
+                typecheck(expr, symtab, node_types)  # Discard types of non-final expressions
+            result_type = types.Unit() if not node.result_expression else typecheck(node.result_expression, symtab, node_types)
             symtab.leave_scope()
             return result_type
 
         case ast.VarDecl():
-            return typecheck_var_decl(node, symtab)
+            return typecheck_var_decl(node, symtab, node_types)
 
         case ast.WhileExpr():
-            cond_type = typecheck(node.condition, symtab)
+            cond_type = typecheck(node.condition, symtab, node_types)
             print('con', cond_type)
             if not isinstance(cond_type, types.Bool):
                 raise TypeError("Condition in 'while' must be a Bool")
-            body_type = typecheck(node.body, symtab)
+            body_type = typecheck(node.body, symtab, node_types)
             print('body', body_type)
             # if not isinstance(body_type, types.Unit):
             #     raise TypeError("Body of 'while' must not produce a value")
@@ -133,7 +172,7 @@ def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
 
         case ast.Module():
             for func in node.functions:
-                symtab.define_variable(func.name, func.body, typecheck(func,symtab))
+                symtab.define_variable(func.name, func.body, typecheck(func, symtab, node_types))
                 print(symtab.lookup_variable(func.name))
 
         case ast.FunctionDef():
@@ -144,7 +183,7 @@ def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
 
         case ast.Break(value):
             if value:
-                value_type = typecheck(value, symtab)
+                value_type = typecheck(value, symtab, node_types)
                 # Ensure that the value_type matches the expected return type of the loop
             return Unit()
 
@@ -152,11 +191,11 @@ def typecheck(node: ast.Expression, symtab: SymTab) -> Type:
             return Unit()
 
         case ast.AddressOf(expr):
-            expr_type = typecheck(expr, symtab)
-            return ast.PointerType(expr_type)
+            expr_type = typecheck(expr, symtab, node_types)
+            return types.PointerType(expr_type)
         case ast.Dereference(expr):
-            expr_type = typecheck(expr, symtab)
-            if isinstance(expr_type, ast.PointerType):
+            expr_type = typecheck(expr, symtab, node_types)
+            if isinstance(expr_type, types.PointerType):
                 return expr_type.base_type
             else:
                 raise TypeError("Dereference of a non-pointer type")
@@ -1,5 +1,7 @@
 
-from typing import Generic, TypeVar, Dict, Any, List
+import operator
+from types import MappingProxyType
+from typing import Generic, TypeVar, Dict, Any, List, Mapping
 
 from src.model import types, ast
 from src.model.types import Int, Bool, FunctionType, Unit, Type
@@ -7,46 +9,95 @@ from src.model.types import Int, Bool, FunctionType, Unit, Type
 # Create a type variable for the SymTab class
 T = TypeVar('T')
 
+class SlotRef:
+    """Stands in a scope for a variable whose value is kept in the scope's frame."""
+    __slots__ = ('slot', 'var_type')
+
+    def __init__(self, slot: int, var_type: Any) -> None:
+        self.slot = slot
+        self.var_type = var_type
+
+
 class SymTab(Generic[T]):
     def __init__(self, parent: 'SymTab[T]' = None):
         self.parent = parent
         self.symbols: Dict[str, T] = {}
-        self.scopes = [{}]
+        # The builtins are shared by all tables, not copied into them
+        self.scopes = [builtin_symbols, {}]
+        # One frame per scope, holding the values of the variables the resolver gave slots.
+        # A resolved access is `frames[-1 - depth][slot]`; the scopes are the fallback by name.
+        self.frames: List[List[Any]] = [[], []]
 
 
     def enter_scope(self):
         self.scopes.append({})
+        self.frames.append([])
 
     def leave_scope(self):
         self.scopes.pop()
+        self.frames.pop()
+
+    def merge_scopes(self, count: int) -> None:
+        """Replaces the `count` innermost scopes by one with the values of all their variables."""
+        merged = {}
+        for scope, frame in zip(self.scopes[-count:], self.frames[-count:]):
+            for name, entry in scope.items():
+                merged[name] = (frame[entry.slot], entry.var_type) if type(entry) is SlotRef else entry
+        del self.scopes[-count:]
+        del self.frames[-count:]
+        self.scopes.append(merged)
+        self.frames.append([])
 
     def lookup_variable(self, name, flag=False):
-        for scope in reversed(self.scopes):
+        for level in range(len(self.scopes) - 1, -1, -1):
+            scope = self.scopes[level]
             if name in scope:
                 value = scope[name]
-                if str(type(value)) == "<class 'tuple'>":
+                if type(value) is tuple:
                     if flag: return scope[name]
                     else:
                         return scope[name][0]
+                elif type(value) is SlotRef:
+                    return self.frames[level][value.slot]
                 else:
                     return scope[name]
         raise KeyError(f"Variable '{name}' not found.")
 
     def update_variable(self, name, value):
         # Update the value of a variable in an existing scope if the variable exists
-        for scope in reversed(self.scopes):
+        for level in range(len(self.scopes) - 1, -1, -1):
+            scope = self.scopes[level]
             if name in scope:
-                scope[name] = value
+                if type(scope[name]) is SlotRef:
+                    self.frames[level][scope[name].slot] = value
+                elif scope is builtin_symbols:
+                    # Only this table sees the new value
+                    self.scopes[1][name] = (value, scope[name][1])
+                elif type(scope[name]) is tuple:
+                    # Keep the type of the variable
+                    scope[name] = (value, scope[name][1])
+                else:
+                    scope[name] = value
                 return
         raise KeyError(f"Variable '{name}' not defined.")
 
     def define_variable(self, name, value, var_type):
         self.scopes[-1][name] = (value, var_type)
 
+    def define_slot(self, name, slot, value, var_type):
+        """Defines a variable in the innermost scope, keeping its value in the frame at `slot`."""
+        frame = self.frames[-1]
+        if slot >= len(frame):
+            frame.extend([None] * (slot + 1 - len(frame)))
+        frame[slot] = value
+        self.scopes[-1][name] = SlotRef(slot, var_type)
+
     def lookup_variable_type(self, name):
         for scope in reversed(self.scopes):
 
             if name in scope:
+                if type(scope[name]) is SlotRef:
+                    return scope[name].var_type
                 _, var_type = scope[name]
                 return var_type
         raise KeyError(f"Type for variable '{name}' not found.")
@@ -65,29 +116,48 @@ class SymTab(Generic[T]):
         func_type = FunctionType(params, return_type)
         self.define_variable(name, (func_type, body), func_type)
 
-def add_builtin_symbols(symtab: SymTab):
-
-    symtab.define_variable("Int", "Int", Int())
-    symtab.define_variable("Bool","Bool", Bool())
-
-    symtab.define_variable("true", True, types.Bool())
-    symtab.define_variable("false", False, types.Bool())
-
-    symtab.define_variable("+", lambda a, b: a + b, FunctionType([Int(), Int()], Int()))
-    symtab.define_variable("-", lambda a, b: a - b, FunctionType([Int(), Int()], Int()))
-    symtab.define_variable("*", lambda a, b: a * b, FunctionType([Int(), Int()], Int()))
-    symtab.define_variable("/", lambda a, b: a / b, FunctionType([Int(), Int()], Int()))
-    symtab.define_variable("%", lambda a, b: a % b, FunctionType([Int(), Int()], Int()))
-
-    symtab.define_variable("==", lambda a, b: a == b, FunctionType([Int(), Int()], Bool()))
-    symtab.define_variable("!=", lambda a, b: a != b, FunctionType([Int(), Int()], Bool()))
-    symtab.define_variable("<", lambda a, b: a < b, FunctionType([Int(), Int()], Bool()))
-    symtab.define_variable("<=", lambda a, b: a <= b, FunctionType([Int(), Int()], Bool()))
-    symtab.define_variable(">", lambda a, b: a > b, FunctionType([Int(), Int()], Bool()))
-    symtab.define_variable(">=", lambda a, b: a >= b, FunctionType([Int(), Int()], Bool()))
-
-    symtab.define_variable("and", lambda a, b: a and b, FunctionType([Bool(), Bool()], Bool()))
-    symtab.define_variable("or", lambda a, b: a or b, FunctionType([Bool(), Bool()], Bool()))
-    symtab.define_variable("unary_not", lambda a: not a, FunctionType([Bool()], Bool()))
-    symtab.define_variable("unary_-", lambda a: -a, FunctionType([Int()], Int()))
-    symtab.define_variable("print_int", print, FunctionType([Int()], Unit()))
+def _builtin_symbols() -> Mapping[str, tuple[Any, Type]]:
+    int_op = FunctionType([Int(), Int()], Int())
+    comparison = FunctionType([Int(), Int()], Bool())
+    bool_op = FunctionType([Bool(), Bool()], Bool())
+    return MappingProxyType({
+        "Int": ("Int", Int()),
+        "Bool": ("Bool", Bool()),
+
+        "true": (True, types.Bool()),
+        "false": (False, types.Bool()),
+
+        "+": (operator.add, int_op),
+        "-": (operator.sub, int_op),
+        "*": (operator.mul, int_op),
+        "/": (operator.truediv, int_op),
+        "%": (operator.mod, int_op),
+
+        "==": (operator.eq, comparison),
+        "!=": (operator.ne, comparison),
+        "<": (operator.lt, comparison),
+        "<=": (operator.le, comparison),
+        ">": (operator.gt, comparison),
+        ">=": (operator.ge, comparison),
+
+        # The interpreter short-circuits `and` and `or` itself, these only see Bools
+        "and": (operator.and_, bool_op),
+        "or": (operator.or_, bool_op),
+        "unary_not": (operator.not_, FunctionType([Bool()], Bool())),
+        "unary_-": (operator.neg, FunctionType([Int()], Int())),
+        "print_int": (print, FunctionType([Int()], Unit())),
+    })
+
+
+# The builtins, as (value, type) by name. Every SymTab has them as its outermost, read-only scope.
+builtin_symbols = _builtin_symbols()
+
+
+def add_builtin_symbols(symtab):
+    """
+    Defines the builtins in the current scope of `symtab`.
+
+    Not needed for a SymTab, which already sees `builtin_symbols`.
+    """
+    for name, (value, var_type) in builtin_symbols.items():
+        symtab.define_variable(name, value, var_type)
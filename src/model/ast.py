@@ -1,67 +1,76 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields, is_dataclass
 from typing import List, Optional, Tuple
 
 from src.model.types import Type
 
+# All nodes use slots=True: a large program builds millions of them, and
+# slots keep the fields in the instance instead of a per-instance __dict__.
 
-@dataclass
+@dataclass(slots=True)
 class Expression:
     "Base class for expression AST nodes"
+    # Offset of the node's first token from the start of its unit (see Module.unit_offsets), -1 if unknown
+    offset: int = field(default=-1, compare=False, repr=False, kw_only=True)
 
-@dataclass
+@dataclass(slots=True)
 class Identifier(Expression):
     name: str
+    # Set by the resolver: how many scopes up the variable is defined and its slot there, -1 if unresolved
+    depth: int = field(default=-1, compare=False, repr=False, kw_only=True)
+    slot: int = field(default=-1, compare=False, repr=False, kw_only=True)
 
-@dataclass
+@dataclass(slots=True)
 class Literal(Expression):
     value: int
 
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOp(Expression):
     operator: str
     operand: Expression
 
-@dataclass
+@dataclass(slots=True)
 class BinaryOp(Expression):
     left: Expression
     op: str
     right: Expression
 
-@dataclass
+@dataclass(slots=True)
 class IfExpression(Expression):
     cond: Expression
     then_clause: Expression
     else_clause: Expression | None
 
-@dataclass
+@dataclass(slots=True)
 class FunctionCall(Expression):
     name: Expression  # Normally is an Identifier
     arguments: list[Expression]
 
-@dataclass
+@dataclass(slots=True)
 class Block(Expression):
     expressions: List[Expression]
     result_expression: Expression = None
 
 
-@dataclass
+@dataclass(slots=True)
 class VarDecl(Expression):
     name: str
     value: Expression
     type_annotation: type | None
+    # Set by the resolver: the variable's slot in its scope, -1 if unresolved
+    slot: int = field(default=-1, compare=False, repr=False, kw_only=True)
 
-@dataclass
+@dataclass(slots=True)
 class WhileExpr(Expression):
     condition: Expression
     body: Expression
 
-@dataclass
+@dataclass(slots=True)
 class CaseClause:
     pattern: Expression
     expression: Expression
 
-@dataclass
+@dataclass(slots=True)
 class CaseExpr(Expression):
     value: Expression
     clauses: List[CaseClause]
@@ -69,36 +78,62 @@ class CaseExpr(Expression):
 
 
 # For customizable function
-@dataclass
+@dataclass(slots=True)
 class FunctionDef:
     name: str
     params: List[Tuple[str, Type]]
     return_type: Type
     body: List[Expression]
+    offset: int = field(default=-1, compare=False, repr=False, kw_only=True)
 
-@dataclass
+@dataclass(slots=True)
 class Module:
     functions: List[FunctionDef]
     expression: Optional[Expression] = None
+    # Source offset of each unit: the function definitions, then the top-level expression.
+    # The offsets of the nodes in a unit are relative to it; source_offset adds it back.
+    unit_offsets: List[int] = field(default_factory=list, compare=False, repr=False, kw_only=True)
+
+    def source_offset(self, node: 'Expression | FunctionDef') -> int:
+        """The offset of `node` in the source code, for tokenizer.LineIndex, or -1 if it has none."""
+        units: list = [*self.functions] + ([self.expression] if self.expression is not None else [])
+        for unit, unit_offset in zip(units, self.unit_offsets):
+            if node.offset >= 0 and _contains(unit, node):
+                return unit_offset + node.offset
+        return -1
+
+
+def _contains(root: object, node: object) -> bool:
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        if current is node:
+            return True
+        for child in (getattr(current, f.name) for f in fields(current)):
+            if isinstance(child, list):
+                stack.extend(item for item in child if is_dataclass(item))
+            elif is_dataclass(child) and not isinstance(child, type):
+                stack.append(child)
+    return False
 
 
 # For break and continue
-@dataclass
+@dataclass(slots=True)
 class Break(Expression):
     value: Optional[Expression] = None  # Optional return value
 
-@dataclass
+@dataclass(slots=True)
 class Continue(Expression):
     pass
 
-@dataclass
+@dataclass(slots=True)
 class PointerType(Expression):
     base_type: Expression  # basci type
 
-@dataclass
+@dataclass(slots=True)
 class AddressOf(Expression):
     expr: Expression
 
-@dataclass
+@dataclass(slots=True)
 class Dereference(Expression):
     expr: Expression
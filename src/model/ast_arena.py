@@ -0,0 +1,223 @@
+import sys
+from array import array
+from typing import Any
+
+from src.model import ast
+
+# A node is an int handle into the columns of an AstArena
+Node = int
+NO_NODE = -1
+
+# What the `values` column holds for a Literal, stored in its column `b`
+LITERAL_INT, LITERAL_BOOL, LITERAL_BOXED = 0, 1, 2
+_int64_min, _int64_max = -2 ** 63, 2 ** 63 - 1
+
+# How each field of a node class is stored, as (field name, column, encoding):
+#   node        the handle of a child node
+#   optional    the handle of a child node, NO_NODE for None
+#   string      an index into the arena's string table
+#   list        child handles in `items`: the column holds the start, the next column the count
+#   literal     the `values` column: column `b` tells an int (LITERAL_INT), a bool (LITERAL_BOOL),
+#               or an index into `objects` for an int that does not fit in 64 bits (LITERAL_BOXED)
+#   object      an index into the arena's `objects` list, for types, parameter lists and unit offsets
+#   var_value   a VarDecl value: a node in column `b`, or the raw literal value in `objects`
+node_layouts: dict[type, tuple[tuple[str, str, str], ...]] = {
+    ast.Literal: (('value', 'values', 'literal'),),
+    ast.Identifier: (('name', 'a', 'string'),),
+    ast.UnaryOp: (('operator', 'a', 'string'), ('operand', 'b', 'node')),
+    ast.BinaryOp: (('left', 'a', 'node'), ('op', 'b', 'string'), ('right', 'c', 'node')),
+    ast.IfExpression: (('cond', 'a', 'node'), ('then_clause', 'b', 'node'), ('else_clause', 'c', 'optional')),
+    ast.FunctionCall: (('name', 'a', 'string'), ('arguments', 'b', 'list')),
+    ast.Block: (('expressions', 'a', 'list'), ('result_expression', 'c', 'optional')),
+    ast.VarDecl: (('name', 'a', 'string'), ('value', 'b', 'var_value'), ('type_annotation', 'c', 'object')),
+    ast.WhileExpr: (('condition', 'a', 'node'), ('body', 'b', 'node')),
+    ast.FunctionDef: (('name', 'a', 'string'), ('params', 'b', 'object'), ('return_type', 'values', 'object'),
+                      ('body', 'c', 'node')),
+    ast.Module: (('functions', 'a', 'list'), ('expression', 'c', 'optional'), ('unit_offsets', 'values', 'object')),
+    ast.Break: (('value', 'a', 'optional'),),
+    ast.Continue: (),
+    ast.AddressOf: (('expr', 'a', 'node'),),
+    ast.Dereference: (('expr', 'a', 'node'),),
+}
+count_columns = {'a': 'b', 'b': 'c'}
+node_classes: tuple[type, ...] = tuple(node_layouts)
+node_class_ids: dict[type, int] = {node_class: kind for kind, node_class in enumerate(node_classes)}
+
+
+class AstArena:
+    """
+    Struct-of-arrays storage for an AST.
+
+    Each node is an int handle. Its kind, offset and up to three small int
+    fields (child handles, string ids, list bounds) live in parallel
+    `array('i')` columns, literal values in an `array('q')` column (or in
+    `objects` if they do not fit in it), and identifiers and operators in
+    an interned string table. See
+    `node_layouts` for what each column holds for each kind of node.
+
+    The factory methods are named and called like the `ast` classes, so
+    `parse(tokens, arena=arena)` emits nodes straight into the arena.
+    `materialize` builds the `ast` dataclasses for a subtree on demand.
+    """
+
+    def __init__(self) -> None:
+        self.kinds = array('i')
+        self.offsets = array('i')
+        self.a = array('i')
+        self.b = array('i')
+        self.c = array('i')
+        self.values = array('q')
+        # Child handles of Block expressions, call arguments and module functions
+        self.items = array('i')
+        self.strings: list[str] = []
+        self.string_ids: dict[str, int] = {}
+        # Values that are not nodes: type annotations, parameter lists, raw VarDecl values and large literals
+        self.objects: list[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def _add(self, node_class: type, offset: int, a: int = 0, b: int = 0, c: int = 0, value: int = 0) -> Node:
+        self.kinds.append(node_class_ids[node_class])
+        self.offsets.append(offset)
+        self.a.append(a)
+        self.b.append(b)
+        self.c.append(c)
+        self.values.append(value)
+        return len(self.kinds) - 1
+
+    def _string(self, text: str) -> int:
+        string_id = self.string_ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(sys.intern(text))
+            self.string_ids[text] = string_id
+        return string_id
+
+    def _list(self, nodes: list[Node]) -> int:
+        start = len(self.items)
+        self.items.extend(nodes)
+        return start
+
+    def _object(self, value: Any) -> int:
+        self.objects.append(value)
+        return len(self.objects) - 1
+
+    @staticmethod
+    def _optional(node: Node | None) -> Node:
+        return NO_NODE if node is None else node
+
+    # Factories, with the same fields as the ast classes
+
+    def Literal(self, value: int | bool, offset: int = -1) -> Node:
+        if isinstance(value, bool):
+            return self._add(ast.Literal, offset, b=LITERAL_BOOL, value=value)
+        if _int64_min <= value <= _int64_max:
+            return self._add(ast.Literal, offset, b=LITERAL_INT, value=value)
+        return self._add(ast.Literal, offset, b=LITERAL_BOXED, value=self._object(value))
+
+    def Identifier(self, name: str, offset: int = -1) -> Node:
+        return self._add(ast.Identifier, offset, a=self._string(name))
+
+    def UnaryOp(self, operator: str, operand: Node, offset: int = -1) -> Node:
+        return self._add(ast.UnaryOp, offset, a=self._string(operator), b=operand)
+
+    def BinaryOp(self, left: Node, op: str, right: Node, offset: int = -1) -> Node:
+        return self._add(ast.BinaryOp, offset, a=left, b=self._string(op), c=right)
+
+    def IfExpression(self, cond: Node, then_clause: Node, else_clause: Node | None, offset: int = -1) -> Node:
+        return self._add(ast.IfExpression, offset, a=cond, b=then_clause, c=self._optional(else_clause))
+
+    def FunctionCall(self, name: str, arguments: list[Node], offset: int = -1) -> Node:
+        return self._add(ast.FunctionCall, offset, a=self._string(name), b=self._list(arguments), c=len(arguments))
+
+    def Block(self, expressions: list[Node], result_expression: Node | None = None, offset: int = -1) -> Node:
+        return self._add(ast.Block, offset, a=self._list(expressions), b=len(expressions),
+                         c=self._optional(result_expression))
+
+    def VarDecl(self, name: str, value: Node | int | bool, type_annotation: Any, offset: int = -1,
+                raw_value: bool = False) -> Node:
+        """With `raw_value`, `value` is the value of a literal initializer instead of a node."""
+        if raw_value:
+            return self._add(ast.VarDecl, offset, a=self._string(name), b=NO_NODE,
+                             c=self._object(type_annotation), value=self._object(value))
+        return self._add(ast.VarDecl, offset, a=self._string(name), b=value, c=self._object(type_annotation))
+
+    def WhileExpr(self, condition: Node, body: Node, offset: int = -1) -> Node:
+        return self._add(ast.WhileExpr, offset, a=condition, b=body)
+
+    def FunctionDef(self, name: str, params: list, return_type: Any, body: Node, offset: int = -1) -> Node:
+        return self._add(ast.FunctionDef, offset, a=self._string(name), b=self._object(params),
+                         c=body, value=self._object(return_type))
+
+    def Module(self, functions: list[Node], expression: Node | None = None,
+               unit_offsets: list[int] | None = None) -> Node:
+        return self._add(ast.Module, -1, a=self._list(functions), b=len(functions), c=self._optional(expression),
+                         value=self._object(unit_offsets if unit_offsets is not None else []))
+
+    def Break(self, value: Node | None = None, offset: int = -1) -> Node:
+        return self._add(ast.Break, offset, a=self._optional(value))
+
+    def Continue(self, offset: int = -1) -> Node:
+        return self._add(ast.Continue, offset)
+
+    def AddressOf(self, expr: Node, offset: int = -1) -> Node:
+        return self._add(ast.AddressOf, offset, a=expr)
+
+    def Dereference(self, expr: Node, offset: int = -1) -> Node:
+        return self._add(ast.Dereference, offset, a=expr)
+
+    # Reading nodes
+
+    def kind(self, node: Node) -> type:
+        """The `ast` class of a node."""
+        return node_classes[self.kinds[node]]
+
+    def field(self, node: Node, name: str) -> Any:
+        """
+        A field of a node, as the `ast` class names it.
+
+        Child nodes are returned as handles (None for a missing child) and
+        lists of children as lists of handles.
+        """
+        node_class = self.kind(node)
+        for field_name, column, encoding in node_layouts[node_class]:
+            if field_name == name:
+                return self._decode(node, column, encoding)
+        raise AttributeError(f"'{node_class.__name__}' node has no field '{name}'")
+
+    def _decode(self, node: Node, column: str, encoding: str) -> Any:
+        stored = getattr(self, column)[node]
+        if encoding == 'node':
+            return stored
+        if encoding == 'optional':
+            return None if stored == NO_NODE else stored
+        if encoding == 'string':
+            return self.strings[stored]
+        if encoding == 'list':
+            return self.items[stored:stored + getattr(self, count_columns[column])[node]].tolist()
+        if encoding == 'literal':
+            kind = self.b[node]
+            if kind == LITERAL_BOOL:
+                return bool(stored)
+            return self.objects[stored] if kind == LITERAL_BOXED else stored
+        if encoding == 'var_value':
+            return self.objects[self.values[node]] if stored == NO_NODE else stored
+        return self.objects[stored]
+
+    def materialize(self, node: Node) -> Any:
+        """Builds the `ast` dataclass of a node and of everything below it."""
+        node_class = self.kind(node)
+        kwargs = {}
+        for field_name, column, encoding in node_layouts[node_class]:
+            value = self._decode(node, column, encoding)
+            if encoding == 'list':
+                value = [self.materialize(item) for item in value]
+            elif encoding in ('node', 'optional') and value is not None:
+                value = self.materialize(value)
+            elif encoding == 'var_value' and self.b[node] != NO_NODE:
+                value = self.materialize(value)
+            kwargs[field_name] = value
+        if node_class is not ast.Module:
+            kwargs['offset'] = self.offsets[node]
+        return node_class(**kwargs)
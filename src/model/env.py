@@ -0,0 +1,122 @@
+from typing import Any
+
+from src.model.SymTab import builtin_symbols
+
+
+class Binding:
+    """A variable: its value and type. Assigning to the variable changes the binding in place."""
+    __slots__ = ('value', 'var_type')
+
+    def __init__(self, value: Any, var_type: Any) -> None:
+        self.value = value
+        self.var_type = var_type
+
+
+class Env:
+    """
+    A persistent environment: bindings chained to an enclosing environment.
+
+    `define` returns a new Env in front of this one instead of changing it,
+    so holding on to an Env (for a scope to go back to, or for a function
+    body to start from) is O(1) and not affected by anything defined later.
+    The values of the bindings can change, though.
+
+    Each Env also remembers the bindings it found further up the chain, so
+    looking up a name again does not walk the chain again. This cache is the
+    only thing that is added to an Env after it is built, apart from the
+    builtins a `PersistentSymTab` hides at its outermost level.
+    """
+    __slots__ = ('parent', '_bindings')
+
+    def __init__(self, parent: 'Env | None' = None, bindings: dict[str, Binding] | None = None) -> None:
+        self.parent = parent
+        # The bindings defined here, followed by the ones found in parents by lookups
+        self._bindings: dict[str, Binding] = {} if bindings is None else bindings
+
+    def define(self, name: str, value: Any, var_type: Any) -> 'Env':
+        """A new environment with `name` bound, hiding any outer binding of the same name."""
+        return Env(self, {name: Binding(value, var_type)})
+
+    def binding(self, name: str) -> Binding:
+        binding = self._bindings.get(name)
+        if binding is None:
+            env = self.parent
+            while env is not None:
+                binding = env._bindings.get(name)
+                if binding is not None:
+                    break
+                env = env.parent
+            else:
+                raise KeyError(f"Variable '{name}' not found.")
+            self._bindings[name] = binding
+        return binding
+
+    def __contains__(self, name: str) -> bool:
+        try:
+            self.binding(name)
+        except KeyError:
+            return False
+        return True
+
+
+# The builtins, as the root of every PersistentSymTab's environment
+builtin_env = Env(None, {name: Binding(value, var_type) for name, (value, var_type) in builtin_symbols.items()})
+
+
+class PersistentSymTab:
+    """
+    A `SymTab` on top of an `Env`, for the type checker and the IR generator.
+
+    Entering a scope only remembers the current Env, and leaving it goes
+    back to it. `snapshot` returns the current Env, and a PersistentSymTab
+    can start from one, so e.g. each function of a module can be checked
+    from the same snapshot of the module's functions without copying it
+    and without the checks seeing each other's scopes.
+    """
+
+    def __init__(self, env: Env = builtin_env) -> None:
+        # The outermost level of this table, where assigning to a builtin binds the new value
+        self._root = Env(env)
+        self.env = self._root
+        self._outer: list[Env] = []
+
+    def snapshot(self) -> Env:
+        return self.env
+
+    def enter_scope(self) -> None:
+        self._outer.append(self.env)
+
+    def leave_scope(self) -> None:
+        self.env = self._outer.pop()
+
+    def define_variable(self, name: str, value: Any, var_type: Any) -> None:
+        self.env = self.env.define(name, value, var_type)
+
+    def lookup_variable(self, name: str, flag: bool = False) -> Any:
+        binding = self.env.binding(name)
+        if flag:
+            return binding.value, binding.var_type
+        return binding.value
+
+    def update_variable(self, name: str, value: Any) -> None:
+        try:
+            binding = self.env.binding(name)
+        except KeyError:
+            raise KeyError(f"Variable '{name}' not defined.") from None
+        if builtin_env._bindings.get(name) is binding:
+            # The builtins are shared, so assigning to one hides it at the outermost level
+            # instead, like SymTab does. The scopes in between forget the builtin they cached.
+            env: Env | None = self.env
+            while env is not None and env is not self._root:
+                if env._bindings.get(name) is binding:
+                    del env._bindings[name]
+                env = env.parent
+            self._root._bindings[name] = Binding(value, binding.var_type)
+        else:
+            binding.value = value
+
+    def lookup_variable_type(self, name: str) -> Any:
+        try:
+            return self.env.binding(name).var_type
+        except KeyError:
+            raise KeyError(f"Type for variable '{name}' not found.") from None
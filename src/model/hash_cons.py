@@ -0,0 +1,111 @@
+from typing import Any
+
+from src.model import ast
+
+
+class HashConsFactory:
+    """
+    Builds AST nodes so that structurally equal subtrees are shared.
+
+    The factory methods are named and called like the `ast` classes, so
+    `parse(tokens, factory=factory)` uses it instead of allocating every
+    node fresh. Asking twice for e.g. `x + 1` returns the same BinaryOp
+    object. A shared node keeps the offset of its first occurrence, and
+    shared trees must not be mutated.
+
+    Each shared node has a structural hash, cached here since the slotted
+    dataclass nodes are not hashable themselves. See `hash_of`.
+    """
+
+    def __init__(self) -> None:
+        self._nodes: dict[tuple, Any] = {}
+        # Structural hashes by id() of the node, filled in by hash_of.
+        # The nodes stay alive in _nodes, so their ids are not reused.
+        self._hashes: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        """The number of distinct shared nodes built so far."""
+        return len(self._nodes)
+
+    def hash_of(self, node: Any) -> int:
+        """
+        The structural hash of a node built by this factory.
+
+        Computed from the node's fields and its children's hashes the first
+        time it is asked for, then cached.
+        """
+        node_hash = self._hashes.get(id(node))
+        if node_hash is None:
+            parts = [self._hash_part(getattr(node, name)) for name in node.__match_args__]
+            node_hash = hash((type(node).__name__, *parts))
+            self._hashes[id(node)] = node_hash
+        return node_hash
+
+    def _hash_part(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return tuple(self._hash_part(item) for item in value)
+        if isinstance(value, (ast.Expression, ast.FunctionDef)):
+            return self.hash_of(value)
+        return type(value).__name__, value
+
+    @staticmethod
+    def _key_part(value: Any) -> Any:
+        if type(value) is list:
+            # Children are already shared, so their identity stands for their structure
+            return tuple(map(id, value))
+        if isinstance(value, (ast.Expression, ast.FunctionDef)):
+            return id(value)
+        if type(value) is bool:
+            return bool, value  # Keep True and 1 apart
+        return value
+
+    def _shared(self, node_class: type, offset: int, *fields: Any) -> Any:
+        key = (node_class, *map(self._key_part, fields))
+        node = self._nodes.get(key)
+        if node is None:
+            node = node_class(*fields, offset=offset)
+            self._nodes[key] = node
+        return node
+
+    def Literal(self, value: int | bool, offset: int = -1) -> ast.Literal:
+        return self._shared(ast.Literal, offset, value)
+
+    def Identifier(self, name: str, offset: int = -1) -> ast.Identifier:
+        return self._shared(ast.Identifier, offset, name)
+
+    def UnaryOp(self, operator: str, operand: ast.Expression, offset: int = -1) -> ast.UnaryOp:
+        return self._shared(ast.UnaryOp, offset, operator, operand)
+
+    def BinaryOp(self, left: ast.Expression, op: str, right: ast.Expression, offset: int = -1) -> ast.BinaryOp:
+        return self._shared(ast.BinaryOp, offset, left, op, right)
+
+    def IfExpression(self, cond: ast.Expression, then_clause: ast.Expression, else_clause: ast.Expression | None,
+                     offset: int = -1) -> ast.IfExpression:
+        return self._shared(ast.IfExpression, offset, cond, then_clause, else_clause)
+
+    def FunctionCall(self, name: str, arguments: list[ast.Expression], offset: int = -1) -> ast.FunctionCall:
+        return self._shared(ast.FunctionCall, offset, name, arguments)
+
+    def Block(self, expressions: list[ast.Expression], result_expression: ast.Expression | None = None,
+              offset: int = -1) -> ast.Block:
+        return self._shared(ast.Block, offset, expressions, result_expression)
+
+    def WhileExpr(self, condition: ast.Expression, body: ast.Expression, offset: int = -1) -> ast.WhileExpr:
+        return self._shared(ast.WhileExpr, offset, condition, body)
+
+    def AddressOf(self, expr: ast.Expression, offset: int = -1) -> ast.AddressOf:
+        return self._shared(ast.AddressOf, offset, expr)
+
+    def Dereference(self, expr: ast.Expression, offset: int = -1) -> ast.Dereference:
+        return self._shared(ast.Dereference, offset, expr)
+
+    # Declarations are not shared: they hold type objects that only compare by identity
+
+    def FunctionDef(self, name: str, params: list, return_type: Any, body: ast.Block,
+                    offset: int = -1) -> ast.FunctionDef:
+        return ast.FunctionDef(name=name, params=params, return_type=return_type, body=body, offset=offset)
+
+    def Module(self, functions: list[ast.FunctionDef], expression: ast.Expression | None = None,
+               unit_offsets: list[int] | None = None) -> ast.Module:
+        return ast.Module(functions=functions, expression=expression,
+                          unit_offsets=unit_offsets if unit_offsets is not None else [])
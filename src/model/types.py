@@ -1,34 +1,72 @@
 from dataclasses import dataclass
 from typing import List
+from weakref import WeakValueDictionary
+
+# Types are canonical: Int() always returns the same object, and so does
+# FunctionType(...) or PointerType(...) with the same components. Two types
+# are the same type exactly when they are the same object, so they are
+# compared with `is` and can be used as dict keys.
 
 
 class Type:
     pass
 
-class Int(Type):
+class PrimitiveType(Type):
+    """A type without components, of which there is only one instance."""
+
+    def __new__(cls):
+        instance = cls.__dict__.get('_instance')
+        if instance is None:
+            instance = super().__new__(cls)
+            cls._instance = instance
+        return instance
+
+class Int(PrimitiveType):
     def __repr__(self):
         return "Int"
 
-class Bool(Type):
+class Bool(PrimitiveType):
     def __repr__(self):
         return "Bool"
 
-class Unit(Type):
+class Unit(PrimitiveType):
     def __repr__(self):
         return "Unit"
 
 class FunctionType(Type):
-    def __init__(self, param_types: List[Type], return_type: Type):
-        self.param_types = param_types
-        self.return_type = return_type
+    # Keyed by the ids of the components, which the types keep alive
+    _interned: 'WeakValueDictionary[tuple, FunctionType]' = WeakValueDictionary()
+
+    def __new__(cls, param_types: List[Type], return_type: Type):
+        key = (tuple(map(id, param_types)), id(return_type))
+        function_type = cls._interned.get(key)
+        if function_type is None:
+            function_type = super().__new__(cls)
+            function_type.param_types = list(param_types)
+            function_type.return_type = return_type
+            cls._interned[key] = function_type
+        return function_type
+
+    def __reduce__(self):
+        return FunctionType, (self.param_types, self.return_type)
 
     def __repr__(self):
         param_types_str = ", ".join(repr(t) for t in self.param_types)
         return f"({param_types_str}) => {repr(self.return_type)}"
 
 class PointerType(Type):
-    def __init__(self, base_type: Type):
-        self.base_type = base_type
+    _interned: 'WeakValueDictionary[int, PointerType]' = WeakValueDictionary()
+
+    def __new__(cls, base_type: Type):
+        pointer_type = cls._interned.get(id(base_type))
+        if pointer_type is None:
+            pointer_type = super().__new__(cls)
+            pointer_type.base_type = base_type
+            cls._interned[id(base_type)] = pointer_type
+        return pointer_type
+
+    def __reduce__(self):
+        return PointerType, (self.base_type,)
 
     def __repr__(self):
         return f"{self.base_type}*"
@@ -1,7 +1,11 @@
 import unittest
 
-from src.compiler.ana_opt import split_into_basic_blocks, build_flowgraph
-from src.model.ir import CondJump
+from contextlib import redirect_stdout
+from io import StringIO
+
+from src.compiler.ana_opt import (split_into_basic_blocks, build_flowgraph,
+                                  perform_reaching_definitions_analysis, perform_liveness_analysis)
+from src.model.ir import Call, CondJump, IRvar, Jump, Label, LoadIntConst
 from src.compiler.ir_generator import generate_ir
 from src.compiler.parser import parse
 from src.compiler.tokenizer import tokenize
@@ -58,6 +62,42 @@ class MyTestCase(unittest.TestCase):
 
 
 class TestFlowGraph(unittest.TestCase):
+    def test_edges_both_ways(self):
+        flowgraph = build_flowgraph(split_into_basic_blocks(counting_loop()))
+        assert flowgraph.entry == 0
+        assert flowgraph.successors == [[1], [2, 3], [1], []]
+        assert flowgraph.predecessors == [[], [0, 2], [1], [1]]
+        assert flowgraph.block_ids == {'start': 1, 'body': 2, 'end': 3}
+
+    def test_reverse_postorder_and_dominators(self):
+        flowgraph = build_flowgraph(split_into_basic_blocks(counting_loop()))
+        order = flowgraph.reverse_postorder()
+        assert order == [0, 1, 2, 3]
+        assert flowgraph.reverse_postorder() is order
+        assert flowgraph.immediate_dominators() == [0, 0, 1, 1]
+        assert flowgraph.dominator_tree() == [[1], [2, 3], [], []]
+        assert flowgraph.dominates(1, 3) and flowgraph.dominates(0, 2) and flowgraph.dominates(2, 2)
+        assert not flowgraph.dominates(2, 3)
+
+    def test_diamond_and_unreachable_block(self):
+        c, x = IRvar('c'), IRvar('x')
+        then, other, dead, end = Label('then'), Label('else'), Label('dead'), Label('end')
+        flowgraph = build_flowgraph(split_into_basic_blocks([
+            LoadIntConst(1, c), CondJump(c, then, other),
+            then, Jump(end),
+            other, Jump(end),
+            dead, LoadIntConst(2, x), Jump(end),
+            end, Call(IRvar('print_int'), [c], x),
+        ]))
+        assert flowgraph.predecessors[4] == [1, 2, 3]
+        assert flowgraph.reverse_postorder()[-1] == 3
+        assert flowgraph.immediate_dominators() == [0, 0, 0, -1, 0]
+        assert not flowgraph.dominates(0, 3)
+        # Making the dead block reachable changes the orders
+        flowgraph.add_edge(2, 3)
+        assert flowgraph.reverse_postorder().index(3) < flowgraph.reverse_postorder().index(4)
+        assert flowgraph.immediate_dominators() == [0, 0, 0, 2, 0]
+
     class TestFlowGraphWithNewCase(unittest.TestCase):
         def test_flowgraph_with_conditional_expression(self):
             source_code = """
@@ -75,5 +115,77 @@ class TestFlowGraph(unittest.TestCase):
 
 
 
+def counting_loop() -> list:
+    """x = 0; while x < n do x = x + 1; print_int(x), in four blocks."""
+    x, n, one, c, r = (IRvar(name) for name in ['x', 'n', 'one', 'c', 'r'])
+    start, body, end = Label('start'), Label('body'), Label('end')
+    return [
+        LoadIntConst(0, x), LoadIntConst(10, n), LoadIntConst(1, one),
+        start,
+        Call(IRvar('<'), [x, n], c),
+        CondJump(c, body, end),
+        body,
+        Call(IRvar('+'), [x, one], x),
+        Jump(start),
+        end,
+        Call(IRvar('print_int'), [x], r),
+    ]
+
+
+class TestDataFlow(unittest.TestCase):
+    def test_reaching_definitions(self):
+        flowgraph = build_flowgraph(split_into_basic_blocks(counting_loop()))
+        analysis = perform_reaching_definitions_analysis(flowgraph)
+        # x from the first block and from the loop body, n, one, and c around the loop
+        assert analysis.reaching_in(1) == {(0, 0), (0, 1), (0, 2), (1, 0), (2, 0)}
+        assert analysis.reaching_in(0) == set()
+        # The body redefines x
+        assert analysis.reaching_out(2) == {(0, 1), (0, 2), (1, 0), (2, 0)}
+        assert analysis.reaching_in(3) == analysis.reaching_out(1)
+
+    def test_liveness(self):
+        x, n, one = IRvar('x'), IRvar('n'), IRvar('one')
+        flowgraph = build_flowgraph(split_into_basic_blocks(counting_loop()))
+        analysis = perform_liveness_analysis(flowgraph)
+        assert analysis.live_in(0) == set()
+        assert analysis.live_in(1) == analysis.live_out(0) == {x, n, one}
+        assert analysis.live_out(1) == {x, n, one}
+        assert analysis.live_in(3) == {x}
+        assert analysis.live_out(3) == set()
+        # Each block is visited once, and the loop once more
+        assert analysis.visits <= len(flowgraph.blocks) + 2
+
+    def test_consecutive_labels(self):
+        a, b = Label('a'), Label('b')
+        x = IRvar('x')
+        blocks = split_into_basic_blocks([Jump(b), a, b, LoadIntConst(1, x), Jump(a)])
+        assert [block.label for block in blocks] == [None, a, b]
+        analysis = perform_reaching_definitions_analysis(build_flowgraph(blocks))
+        # The definition loops back through the empty block
+        assert analysis.reaching_in(1) == analysis.reaching_in(2) == {(2, 0)}
+
+    def test_generated_ir(self):
+        with redirect_stdout(StringIO()):
+            instructions = generate_ir(parse(tokenize("{ var x: Int = 0; while x < 3 do x = x + 1; x }")))
+        blocks = split_into_basic_blocks(instructions)
+        flowgraph = build_flowgraph(blocks)
+        reaching = perform_reaching_definitions_analysis(flowgraph)
+        liveness = perform_liveness_analysis(flowgraph)
+        # The first block, the loop header with the condition, the body that jumps back to it, then the exits
+        header, body = 1, 2
+        assert blocks[body].instructions[-1] == Jump(blocks[header].label)
+        condition = blocks[header].instructions[1]
+        assert isinstance(condition, Call) and condition.fun == IRvar('<')
+        x = condition.args[0]
+        # The generator does not lower variables yet, so the x the condition reads is never
+        # defined: it is live through the whole loop, and nothing is live after it
+        assert liveness.live_in(header) == {x}
+        assert liveness.live_out(header) == set()
+        assert x in liveness.live_out(body)
+        # Each instruction of the body defines a variable that reaches the header. The first
+        # block's Copy does not, as its jump goes to the exits instead of the header
+        assert reaching.reaching_in(header) == {(body, index) for index in range(3)}
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from src.model import ast
+from src.model.ast_arena import AstArena
+from src.compiler.parser import parse
+from src.compiler.tokenizer import tokenize
+
+
+class TestAstArena(unittest.TestCase):
+    sources = [
+        "1 + 2 * 3 - x",
+        "{ var x: Int* = &y; var z = true; if not z then f(x, 1) else { 2 } }",
+        """
+        fun square(x: Int): Int { return x * x; }
+        while a < 10 do { a = a + square(a); }
+        """,
+    ]
+
+    def test_materialize_matches_parse(self):
+        for source_code in self.sources:
+            for pratt in [False, True]:
+                with self.subTest(source_code=source_code, pratt=pratt):
+                    tokens = tokenize(source_code)
+                    arena = AstArena()
+                    module = arena.materialize(parse(tokens, pratt=pratt, arena=arena))
+                    expected = parse(tokens)
+                    assert repr(module) == repr(expected)
+                    assert module.expression.offset == expected.expression.offset
+
+    def test_fields(self):
+        arena = AstArena()
+        module = parse(tokenize("f(x, 1) + x"), arena=arena)
+        expression = arena.field(module, 'expression')
+        assert arena.kind(expression) is ast.BinaryOp
+        assert arena.field(expression, 'op') == '+'
+        call = arena.field(expression, 'left')
+        assert arena.field(call, 'name') == 'f'
+        first, second = arena.field(call, 'arguments')
+        assert arena.field(first, 'name') == 'x'
+        assert arena.field(second, 'value') == 1
+        assert arena.offsets[arena.field(expression, 'right')] == 10
+        assert arena.field(module, 'functions') == []
+
+    def test_literals_beyond_64_bits(self):
+        for source_code in ["99999999999999999999 + 1", "{ var x = 2; x * 9223372036854775808 }"]:
+            with self.subTest(source_code=source_code):
+                tokens = tokenize(source_code)
+                arena = AstArena()
+                assert arena.materialize(parse(tokens, arena=arena)) == parse(tokens)
+        arena = AstArena()
+        assert arena.field(arena.Literal(-2 ** 63), 'value') == -2 ** 63
+        assert arena.field(arena.Literal(2 ** 63), 'value') == 2 ** 63
+        assert arena.field(arena.Literal(True), 'value') is True
+
+    def test_strings_are_interned(self):
+        arena = AstArena()
+        parse(tokenize("x + x * x"), arena=arena)
+        assert arena.strings.count('x') == 1
+
+    def test_bool_literals(self):
+        arena = AstArena()
+        assert arena.materialize(arena.Literal(True)) == ast.Literal(True)
+        assert type(arena.field(arena.Literal(1), 'value')) is int
+
+
+if __name__ == '__main__':
+    unittest.main()
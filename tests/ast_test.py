@@ -20,6 +20,20 @@ class TestASTNodes(unittest.TestCase):
         continue_node = Continue()
         self.assertIsInstance(continue_node, Continue)
 
+    def test_nodes_have_no_dict(self):
+        nodes = [ast.Literal(1), ast.Identifier('x'), ast.BinaryOp(ast.Literal(1), '+', ast.Literal(2)),
+                 ast.Block([], None), ast.FunctionDef('f', [], Int(), ast.Block([], None)), ast.Module([])]
+        for node in nodes:
+            with self.subTest(node=node):
+                assert not hasattr(node, '__dict__')
+
+    def test_pattern_matching(self):
+        match ast.BinaryOp(ast.Identifier('x'), '+', ast.Literal(2), offset=3):
+            case ast.BinaryOp(ast.Identifier(name), op, ast.Literal(value)) as node:
+                assert (name, op, value, node.offset) == ('x', '+', 2, 3)
+            case _:
+                self.fail("BinaryOp did not match")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,434 @@
+import dataclasses
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+import unittest
+
+from src.model import ast
+from src.model.ast_arena import AstArena
+from src.model.hash_cons import HashConsFactory
+from src.model.SymTab import SymTab, add_builtin_symbols
+from src.compiler.ana_opt import (build_flowgraph, split_into_basic_blocks,
+                                  perform_liveness_analysis, perform_reaching_definitions_analysis)
+from src.compiler.bytecode import compile_bytecode, run
+from src.compiler.closure_compiler import compile_closures
+from src.compiler.constant_folder import fold_constants
+from src.compiler.interpreter import interpret
+from src.compiler.ir_interpreter import run_ir
+from src.compiler.purity import memoize_pure_functions
+from src.model import ir
+from src.compiler.parser import parse, reparse, split_units
+from src.compiler.ir_generator import generate_ir
+from src.compiler.type_checker import typecheck
+from src.compiler.tokenizer import tokenize, tokenize_compact, TextEdit
+
+# Benchmarks run as part of the normal suite at a small scale.
+# Set BENCH_SCALE (e.g. BENCH_SCALE=20) to run them on larger inputs.
+SCALE = int(os.environ.get("BENCH_SCALE", "1"))
+
+
+def timed(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def traced_memory(f, *args, **kwargs):
+    """Returns the result of f and the bytes still allocated for it afterwards."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = f(*args, **kwargs)
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current
+
+
+def generated_source(functions: int) -> str:
+    chunks = []
+    for i in range(functions):
+        chunks.append(f"""
+        fun f{i}(a: Int, b: Int): Int {{
+            /* generated body */
+            var x = {i};
+            while a < b do a = a + 1; // count up
+            return a * b + x - {i} % 7;
+        }}""")
+    chunks.append("f0(1, 2)")
+    return "\n".join(chunks)
+
+
+class TokenizerBenchmark(unittest.TestCase):
+    def test_master_regex_vs_reference(self):
+        source_code = generated_source(200 * SCALE)
+        tokens, combined = timed(tokenize, source_code)
+        reference_tokens, reference = timed(tokenize, source_code, reference=True)
+        print(f"tokenize: {len(tokens)} tokens, combined {combined:.4f}s, reference {reference:.4f}s")
+        assert tokens == reference_tokens
+
+
+class TokenMemoryBenchmark(unittest.TestCase):
+    def test_compact_tokens_vs_token_list(self):
+        # About 20k tokens per scale unit; BENCH_SCALE=50 gives the 1M-token case
+        source_code = generated_source(500 * SCALE)
+        tokens, token_bytes = traced_memory(tokenize, source_code)
+        compact, compact_bytes = traced_memory(tokenize_compact, source_code)
+        print(f"{len(tokens)} tokens: List[Token] {token_bytes / len(tokens):.1f} B/token, "
+              f"compact {compact_bytes / len(compact):.1f} B/token")
+        assert len(tokens) == len(compact)
+        assert compact_bytes < token_bytes
+
+
+def generated_expression(terms: int, seed: int = 1) -> str:
+    operators = ['+', '-', '*', '/', '%', '<', '>=', '==', '!=', 'and', 'or']
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(terms - 1):
+        parts.append(f"{rng.randint(0, 99)} {rng.choice(operators)}")
+    parts.append("1")
+    return " ".join(parts)
+
+
+class ExpressionParserBenchmark(unittest.TestCase):
+    def test_pratt_vs_recursive_on_100k_terms(self):
+        tokens = tokenize(generated_expression(100_000 * SCALE))
+        _, recursive = timed(parse, tokens)
+        _, pratt = timed(parse, tokens, pratt=True)
+        print(f"parse {len(tokens)} tokens: recursive {recursive:.4f}s, pratt {pratt:.4f}s")
+
+
+class ParserThroughputBenchmark(unittest.TestCase):
+    def test_parse_tokens_per_second(self):
+        tokens = tokenize(generated_source(1000 * SCALE))
+        for pratt in [False, True]:
+            _, elapsed = timed(parse, tokens, pratt=pratt)
+            print(f"parse (pratt={pratt}): {len(tokens) / elapsed:,.0f} tokens/sec")
+
+
+class IncrementalParseBenchmark(unittest.TestCase):
+    def test_reparse_vs_full_parse(self):
+        source_code = generated_source(1000 * SCALE)
+        start = source_code.index("var x = 500;") + len("var x = ")
+        edit = TextEdit(start, start + 3, "4999")
+        new_source = edit.apply(source_code)
+        tokens = tokenize(source_code)
+        module = parse(tokens)
+        units = split_units(tokens, module)
+        (_, new_module), incremental = timed(reparse, new_source, units, module, edit)
+        expected, full = timed(lambda: parse(tokenize(new_source)))
+        print(f"one-token edit in {len(tokens)} tokens: reparse {incremental:.4f}s, full {full:.4f}s")
+        assert repr(new_module) == repr(expected)
+
+
+def ast_nodes(node) -> list:
+    nodes = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif dataclasses.is_dataclass(node):
+            nodes.append(node)
+            stack.extend(getattr(node, field.name) for field in dataclasses.fields(node))
+    return nodes
+
+
+def arena_memory(arena: AstArena) -> int:
+    """
+    The bytes of the arena's own columns and tables.
+
+    The strings are the identifier and operator texts of the tokens, which
+    the arena only refers to. Unlike `traced_memory`, this does not depend
+    on what else was allocated or freed in the process meanwhile.
+    """
+    columns = (arena.kinds, arena.offsets, arena.a, arena.b, arena.c, arena.values, arena.items)
+    tables = (arena.strings, arena.string_ids, arena.objects)
+    return (sum(sys.getsizeof(column) for column in columns) + sum(sys.getsizeof(table) for table in tables)
+            + sum(sys.getsizeof(value) for value in arena.objects))
+
+
+def with_dict(node, classes: dict[type, type]):
+    """Copies an AST into objects that keep their fields in a __dict__, like plain dataclasses."""
+    if isinstance(node, list):
+        return [with_dict(child, classes) for child in node]
+    if not dataclasses.is_dataclass(node):
+        return node
+    node_class = type(node)
+    if node_class not in classes:
+        classes[node_class] = type(node_class.__name__, (), {})
+    copy = classes[node_class]()
+    for field in dataclasses.fields(node):
+        setattr(copy, field.name, with_dict(getattr(node, field.name), classes))
+    return copy
+
+
+class AstMemoryBenchmark(unittest.TestCase):
+    def test_slotted_nodes_vs_dict_nodes(self):
+        tokens = tokenize(generated_source(500 * SCALE))
+        module, slotted_bytes = traced_memory(parse, tokens)
+        _, dict_bytes = traced_memory(with_dict, module, {})
+        count = len(ast_nodes(module))
+        print(f"{count} AST nodes: __dict__ {dict_bytes / count:.1f} B/node, "
+              f"slots {slotted_bytes / count:.1f} B/node")
+        assert isinstance(module, ast.Module)
+        assert slotted_bytes < dict_bytes
+
+    def test_arena_vs_slotted_nodes(self):
+        tokens = tokenize(generated_source(500 * SCALE))
+        module, slotted_bytes = traced_memory(parse, tokens)
+        arena = AstArena()
+        parse(tokens, arena=arena)
+        arena_bytes = arena_memory(arena)
+        count = len(ast_nodes(module))
+        # The arena also keeps the literal nodes of `var` initializers, which the dataclass tree drops
+        print(f"{count} AST nodes: slots {slotted_bytes / count:.1f} B/node, "
+              f"arena {arena_bytes / len(arena):.1f} B/node over {len(arena)} nodes")
+        assert arena_bytes < slotted_bytes
+
+    def test_hash_consed_vs_fresh_nodes(self):
+        tokens = tokenize(generated_source(500 * SCALE))
+        module, fresh_bytes = traced_memory(parse, tokens)
+        # The factory is dropped afterwards, so only the shared tree is counted
+        shared, shared_bytes = traced_memory(lambda: parse(tokens, factory=HashConsFactory()))
+        print(f"{len(ast_nodes(module))} AST nodes: fresh {fresh_bytes / 1024:.0f} KiB, "
+              f"{len({id(node) for node in ast_nodes(shared)})} shared nodes {shared_bytes / 1024:.0f} KiB")
+        assert shared_bytes < fresh_bytes
+
+
+class InterpreterBenchmark(unittest.TestCase):
+    loop = "{{ var i = 0; var s = 0; while i < {n} do {{ s = s + i; i = i + 1; }}; s }}"
+
+    def test_resolved_vs_unresolved_variables(self):
+        n = 20_000 * SCALE
+        tokens = tokenize(self.loop.format(n=n))
+        # Interpreting the module resolves it; its expression on its own is looked up by name
+        unresolved, by_name = timed(interpret, parse(tokens).expression, SymTab())
+        resolved, by_slot = timed(interpret, parse(tokens), SymTab())
+        print(f"while loop of {n} iterations: by name {by_name:.4f}s, resolved {by_slot:.4f}s")
+        assert resolved == unresolved == n * (n - 1) // 2
+
+    def test_closures_vs_interpret(self):
+        # BENCH_SCALE=20 sums 1..10^6
+        n = 50_000 * SCALE
+        module = parse(tokenize(self.loop.format(n=n + 1)))
+        interpreted, interpret_time = timed(interpret, module, SymTab())
+        code, compile_time = timed(compile_closures, module)
+        compiled, run_time = timed(code, SymTab())
+        print(f"sum of 1..{n}: interpret {interpret_time:.4f}s, "
+              f"closures {run_time:.4f}s (+ {compile_time:.4f}s to compile)")
+        assert compiled == interpreted == n * (n + 1) // 2
+
+    def test_loop_signals_vs_exceptions(self):
+        # Sums the odd numbers below n, with a continue on each even one and a break at the end
+        n = 50_000 * SCALE
+        i, s = ast.Identifier('i'), ast.Identifier('s')
+        loop = ast.Block([
+            ast.VarDecl('i', 0, None),
+            ast.VarDecl('s', 0, None),
+            ast.WhileExpr(ast.Literal(True), ast.Block([
+                ast.BinaryOp(i, '=', ast.BinaryOp(i, '+', ast.Literal(1))),
+                ast.IfExpression(ast.BinaryOp(i, '>=', ast.Literal(n)), ast.Break(), None),
+                ast.IfExpression(ast.BinaryOp(ast.BinaryOp(i, '%', ast.Literal(2)), '==', ast.Literal(0)),
+                                 ast.Continue(), None),
+                ast.BinaryOp(s, '=', ast.BinaryOp(s, '+', i)),
+            ])),
+        ], s)
+        # The closures still raise an exception per continue
+        raised, exception_time = timed(compile_closures(loop), SymTab())
+        returned, signal_time = timed(interpret, loop, SymTab())
+        print(f"while loop of {n} iterations with {n // 2} continues: "
+              f"interpret {signal_time:.4f}s, closures with exceptions {exception_time:.4f}s")
+        assert returned == raised == (n // 2) ** 2
+
+    # Programs from interpreter_test.py
+    small_programs = [
+        "3 + 4 * 2 - 1",
+        "10 + if 2 < 1 then 3 else 4",
+        "{var x = 10; {var x = 20;} x}",
+        "{var x = 0; while x < 5 do  x = x + 1;  x}",
+        "{ var e = false; true or { e = true; true }; e }",
+        "{ var x = 10; if x > 5 then { x = 2; } else { x = 3; } x }",
+        "fun square(x: Int): Int { return x * x; } fun add(a: Int, b: Int): Int { return a + b; } square(add(2, 3))",
+        "fun square(x: Int): Int { return x * x; } "
+        "fun square_sum(a: Int, b: Int): Int { return square(a) + square(b); } square_sum(2,3)",
+    ]
+
+    def test_vm_vs_interpret(self):
+        modules = [parse(tokenize(source_code)) for source_code in self.small_programs]
+        programs = [compile_bytecode(module) for module in modules]
+        repeats = 200 * SCALE
+        _, interpret_time = timed(lambda: [interpret(module, SymTab()) for _ in range(repeats) for module in modules])
+        _, vm_time = timed(lambda: [run(program) for _ in range(repeats) for program in programs])
+        print(f"{len(modules)} interpreter_test programs x {repeats}: "
+              f"interpret {interpret_time:.4f}s, vm {vm_time:.4f}s")
+        assert [run(program) for program in programs] == [interpret(module, SymTab()) for module in modules]
+
+        n = 50_000 * SCALE
+        module = parse(tokenize(self.loop.format(n=n + 1)))
+        interpreted, interpret_time = timed(interpret, module, SymTab())
+        program, compile_time = timed(compile_bytecode, module)
+        result, vm_time = timed(run, program)
+        print(f"sum of 1..{n}: interpret {interpret_time:.4f}s, "
+              f"vm {vm_time:.4f}s (+ {compile_time:.4f}s to compile)")
+        assert result == interpreted
+
+    def test_vm_deep_recursion(self):
+        # BENCH_SCALE=10 sums 1..10^6, far beyond what `interpret` can recurse
+        n = 100_000 * SCALE
+        recursive = compile_bytecode(parse(tokenize(
+            f"fun sum(n: Int): Int {{ if n == 0 then 0 else n + sum(n - 1) }} sum({n})")))
+        tail_recursive = compile_bytecode(parse(tokenize(
+            f"fun sum(n: Int, acc: Int): Int {{ if n == 0 then acc else sum(n - 1, acc + n) }} sum({n}, 0)")))
+        result, recursive_time = timed(run, recursive)
+        tail_result, tail_time = timed(run, tail_recursive)
+        print(f"recursive sum of 1..{n} in the vm: {recursive_time:.4f}s, tail recursive {tail_time:.4f}s")
+        assert result == tail_result == n * (n + 1) // 2
+
+    def test_memoized_fibonacci(self):
+        n = 18 + SCALE
+        module = parse(tokenize(f"fun fib(n: Int): Int {{ if n < 2 then n else fib(n - 1) + fib(n - 2) }} fib({n})"))
+        plain, plain_time = timed(interpret, module, SymTab())
+        caches = memoize_pure_functions(module)
+        memoized, memoized_time = timed(interpret, module, SymTab(), caches)
+        cache = caches['fib']
+        print(f"fib({n}): interpret {plain_time:.4f}s, memoized {memoized_time:.4f}s "
+              f"({cache.hits} hits, {cache.misses} misses)")
+        assert memoized == plain
+
+    def test_ir_interpreter_vs_interpret(self):
+        # The IR generator does not lower variables yet, so the loop's IR is written out here
+        n = 50_000 * SCALE
+        i, s, limit, one, cond = (ir.IRvar(name) for name in ['i', 's', 'limit', 'one', 'cond'])
+        start, body, end = ir.Label('start'), ir.Label('body'), ir.Label('end')
+        instructions = [
+            ir.LoadIntConst(0, i), ir.LoadIntConst(0, s), ir.LoadIntConst(n + 1, limit), ir.LoadIntConst(1, one),
+            start,
+            ir.Call(ir.IRvar('<'), [i, limit], cond),
+            ir.CondJump(cond, body, end),
+            body,
+            ir.Call(ir.IRvar('+'), [s, i], s),
+            ir.Call(ir.IRvar('+'), [i, one], i),
+            ir.Jump(start),
+            end,
+        ]
+        values, ir_time = timed(run_ir, instructions)
+        interpreted, interpret_time = timed(interpret, parse(tokenize(self.loop.format(n=n + 1))), SymTab())
+        print(f"sum of 1..{n}: interpret {interpret_time:.4f}s, IR interpreter {ir_time:.4f}s")
+        assert values[s] == interpreted
+
+
+
+class ConstantFoldingBenchmark(unittest.TestCase):
+    def test_folded_loop_body(self):
+        n = 20_000 * SCALE
+        source_code = (f"{{ var i = 0; var s = 0; while i < {n} do {{ "
+                       f"s = s + (2 * 3 + 4) * 1; i = i + (10 - 9) + 0; "
+                       f"if 1 > 2 or not true then s = 0; }}; s }}")
+        module = parse(tokenize(source_code))
+        folded, fold_time = timed(fold_constants, module)
+        plain, plain_time = timed(interpret, module, SymTab())
+        result, folded_time = timed(interpret, folded, SymTab())
+        print(f"while loop of {n} iterations: interpret {plain_time:.4f}s, "
+              f"folded {folded_time:.4f}s (+ {fold_time:.4f}s to fold)")
+        assert result == plain == 10 * n
+
+
+def loops_ir(loops: int) -> list[ir.Instruction]:
+    """IR for `loops` counting loops one after another, all adding to the same sum: 3 blocks each."""
+    s, n, one, cond = (ir.IRvar(name) for name in ['s', 'n', 'one', 'cond'])
+    instructions: list[ir.Instruction] = [ir.LoadIntConst(0, s), ir.LoadIntConst(10, n), ir.LoadIntConst(1, one)]
+    for index in range(loops):
+        i = ir.IRvar(f'i{index}')
+        start, body, end = ir.Label(f'start{index}'), ir.Label(f'body{index}'), ir.Label(f'end{index}')
+        instructions += [
+            ir.LoadIntConst(0, i),
+            start,
+            ir.Call(ir.IRvar('<'), [i, n], cond),
+            ir.CondJump(cond, body, end),
+            body,
+            ir.Call(ir.IRvar('+'), [s, i], s),
+            ir.Call(ir.IRvar('+'), [i, one], i),
+            ir.Jump(start),
+            end,
+        ]
+    instructions.append(ir.Call(ir.IRvar('print_int'), [s], ir.IRvar('result')))
+    return instructions
+
+
+class DataFlowBenchmark(unittest.TestCase):
+    def test_analyses_on_thousands_of_blocks(self):
+        loops = 1000 * SCALE
+        flowgraph = build_flowgraph(split_into_basic_blocks(loops_ir(loops)))
+        blocks = len(flowgraph.blocks)
+        reaching, reaching_time = timed(perform_reaching_definitions_analysis, flowgraph)
+        liveness, liveness_time = timed(perform_liveness_analysis, flowgraph)
+        print(f"{blocks} blocks: reaching definitions {reaching_time:.4f}s ({reaching.visits} visits), "
+              f"liveness {liveness_time:.4f}s ({liveness.visits} visits)")
+        # Those of s, n, one and each counter, and the last one of cond
+        assert len(reaching.reaching_in(blocks - 1)) == 3 * loops + 4
+        assert liveness.live_in(blocks - 1) == {ir.IRvar('s')}
+
+    def test_flowgraph_on_many_blocks(self):
+        instructions = loops_ir(10_000 * SCALE)
+        basic_blocks = split_into_basic_blocks(instructions)
+        flowgraph, build_time = timed(build_flowgraph, basic_blocks)
+        order, order_time = timed(flowgraph.reverse_postorder)
+        idom, dominator_time = timed(flowgraph.immediate_dominators)
+        print(f"{len(basic_blocks)} blocks: build {build_time:.4f}s, reverse postorder {order_time:.4f}s, "
+              f"dominators {dominator_time:.4f}s")
+        assert len(order) == len(basic_blocks)
+        # Each loop's end is dominated by its condition, which comes right before it
+        assert idom[-1] == len(basic_blocks) - 3
+
+
+class SymTabBenchmark(unittest.TestCase):
+    def test_construction_and_first_lookup(self):
+        def shared_builtins():
+            return SymTab().lookup_variable("+")
+
+        def copied_builtins():
+            symtab = SymTab()
+            add_builtin_symbols(symtab)
+            return symtab.lookup_variable("+")
+
+        n = 20_000 * SCALE
+        _, shared = timed(lambda: [shared_builtins() for _ in range(n)])
+        _, copied = timed(lambda: [copied_builtins() for _ in range(n)])
+        print(f"{n} SymTabs + first lookup: shared builtins {shared:.4f}s, copied builtins {copied:.4f}s")
+        assert shared_builtins()(2, 3) == copied_builtins()(2, 3) == 5
+
+
+
+class TypeCheckBenchmark(unittest.TestCase):
+    def test_operator_heavy_block(self):
+        statements = 2000 * SCALE
+        body = "".join(f"x = x * {i} + (x - {i}) % 7; b = x < {i} and b or x >= {i}; " for i in range(statements))
+        block = parse(tokenize(f"{{ var x: Int = 1; var b: Bool = true; {body} x }}")).expression
+        _, elapsed = timed(typecheck, block, SymTab())
+        print(f"typecheck {2 * statements} statements: {2 * statements / elapsed:,.0f} statements/sec")
+
+
+
+def nested_blocks(depth: int) -> str:
+    return "".join(f"{{ var x{i}: Int = {i}; x{i} + " for i in range(depth)) + "0" + " }" * depth
+
+
+class IrGeneratorBenchmark(unittest.TestCase):
+    def test_deeply_nested_blocks(self):
+        # Each node is typechecked once, so twice as deep should take about twice as long
+        timings = []
+        for depth in [50, 100]:
+            module = parse(tokenize(nested_blocks(depth)), pratt=True)
+            instructions, elapsed = timed(generate_ir, module)
+            timings.append(f"depth {depth}: {elapsed:.4f}s")
+            assert len(instructions) == 3 * depth + 2
+        print(f"generate_ir on nested blocks: {', '.join(timings)}")
+
+
+if __name__ == '__main__':
+    unittest.main()
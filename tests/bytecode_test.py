@@ -0,0 +1,108 @@
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+from src.model import ast
+from src.model.SymTab import SymTab
+from src.compiler import __main__
+from src.compiler.bytecode import compile_bytecode, run, CALL, CONST, STORE, TAIL_CALL
+from src.compiler.interpreter import interpret
+from src.compiler.parser import parse
+from src.compiler.tokenizer import tokenize
+from tests import closure_compiler_test
+
+
+class TestBytecode(unittest.TestCase):
+    def test_same_result_as_interpret(self):
+        for source_code in closure_compiler_test.TestClosureCompiler.programs:
+            with self.subTest(source_code=source_code):
+                expected = interpret(parse(tokenize(source_code)), SymTab())
+                assert run(compile_bytecode(parse(tokenize(source_code)))) == expected
+
+    def test_code_buffer(self):
+        program = compile_bytecode(parse(tokenize("{ var x = 41; x + 1 }")))
+        main = program.functions[program.main]
+        assert main.code.typecode == 'i'
+        assert list(main.code[:2]) == [CONST, program.constants.index(41)]
+        assert STORE in main.code[::2]
+        assert main.local_count == 1
+        assert "BINARY" in program.disassemble()
+
+    def test_deep_recursion(self):
+        # Calls do not recurse in Python
+        source_code = "fun count(n: Int): Int { if n == 0 then 0 else 1 + count(n - 1) } count(5000)"
+        assert run(compile_bytecode(parse(tokenize(source_code)))) == 5000
+
+    def test_tail_calls(self):
+        source_code = "fun sum(n: Int, acc: Int): Int { if n == 0 then acc else { sum(n - 1, acc + n) } } sum(100000, 0)"
+        program = compile_bytecode(parse(tokenize(source_code)))
+        ops = program.functions[0].code[::2]
+        assert TAIL_CALL in ops and CALL not in ops
+        assert run(program) == 100000 * 100001 // 2
+        # Neither a call whose value is used nor one in a loop is a tail call
+        source_code = ("fun f(n: Int): Int { if n == 0 then 0 else 1 + f(n - 1) } "
+                       "fun g(n: Int): Int { while n > 0 do n = f(n) - n } g(3)")
+        program = compile_bytecode(parse(tokenize(source_code)))
+        for function in program.functions[:2]:
+            ops = function.code[::2]
+            assert CALL in ops and TAIL_CALL not in ops
+        assert run(program) == interpret(parse(tokenize(source_code)), SymTab())
+
+    def test_break_and_continue(self):
+        i = ast.Identifier('i')
+        s = ast.Identifier('s')
+        loop = ast.Block([
+            ast.VarDecl('i', 0, None),
+            ast.VarDecl('s', 0, None),
+            ast.WhileExpr(ast.Literal(True), ast.Block([
+                ast.BinaryOp(i, '=', ast.BinaryOp(i, '+', ast.Literal(1))),
+                ast.IfExpression(ast.BinaryOp(i, '>', ast.Literal(5)), ast.Break(), None),
+                # A continue in the middle of an expression leaves nothing on the stack
+                ast.BinaryOp(ast.Literal(1), '+', ast.IfExpression(
+                    ast.BinaryOp(i, '==', ast.Literal(2)), ast.Continue(), ast.Literal(0))),
+                ast.BinaryOp(s, '=', ast.BinaryOp(s, '+', i)),
+            ])),
+        ], s)
+        assert run(compile_bytecode(loop)) == 13
+        assert run(compile_bytecode(ast.WhileExpr(ast.Literal(True), ast.Break(ast.Literal(7))))) == 7
+
+    def test_expression_initializer(self):
+        x = ast.Identifier('x')
+        block = ast.Block([ast.VarDecl('x', ast.BinaryOp(ast.Literal(2), '*', ast.Literal(3)), None)],
+                          ast.BinaryOp(x, '+', ast.Literal(1)))
+        assert run(compile_bytecode(block)) == 7
+        # The initializer is compiled before the variable it declares exists
+        inner = ast.Block([ast.VarDecl('x', ast.BinaryOp(x, '+', ast.Literal(1)), None)], x)
+        assert run(compile_bytecode(ast.Block([ast.VarDecl('x', 1, None)], ast.BinaryOp(inner, '*', x)))) == 2
+
+    def test_errors(self):
+        with self.assertRaises(KeyError):
+            run(compile_bytecode(parse(tokenize("x + 1"))))
+        with self.assertRaises(KeyError):
+            run(compile_bytecode(parse(tokenize("f(1)"))))
+        with self.assertRaises(TypeError):
+            run(compile_bytecode(ast.BinaryOp(ast.Literal(1), '=', ast.Literal(2))))
+
+    def test_rejects_caller_variables(self):
+        # `interpret` gives 5 for this, as `get` sees the variables of `f`
+        source_code = "fun get(): Int { y } fun f(): Int { { var y: Int = 5; get() } } f()"
+        with self.assertRaises(Exception) as cm:
+            compile_bytecode(parse(tokenize(source_code)))
+        assert str(cm.exception).startswith("Function 'get' uses 'y'")
+        with self.assertRaises(Exception):
+            compile_bytecode(parse(tokenize("fun set(): Int { y = 1 } { var y: Int = 0; set() }")))
+        # Builtins are not variables of the caller
+        assert run(compile_bytecode(parse(tokenize("fun t(): Bool { true } t()")))) is True
+
+    def test_vm_command(self):
+        source_code = "fun f(n: Int): Int { if n <= 1 then 1 else n * f(n - 1) } f(5)"
+        output = StringIO()
+        with patch('sys.argv', ['compiler', 'vm']), patch('sys.stdin', StringIO(source_code)), \
+                redirect_stdout(output):
+            assert __main__.main() == 0
+        assert output.getvalue().splitlines()[-1] == "120"
+
+
+if __name__ == '__main__':
+    unittest.main()
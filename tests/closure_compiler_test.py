@@ -0,0 +1,64 @@
+import unittest
+
+from src.model import ast
+from src.model.SymTab import SymTab
+from src.compiler.closure_compiler import compile_closures
+from src.compiler.interpreter import interpret
+from src.compiler.parser import parse
+from src.compiler.tokenizer import tokenize
+
+
+class TestClosureCompiler(unittest.TestCase):
+    programs = [
+        "1 + 2 * 3 - 8 / 2 % 3",
+        "if 1 < 2 and not false then 3 else 4",
+        "true or 1 / 0 == 1",
+        "{ var x = 5; x * 2 }",
+        "{ var x = 1; { x = x + 1; var x = 10; x = x + 1; }; x }",
+        "{ var i = 0; var s = 0; while i < 100 do { s = s + i; i = i + 1; }; s }",
+        "{ var x = 1; if x > 0 then { x = 2 } ; x }",
+        "fun f(n: Int): Int { if n <= 1 then 1 else n * f(n - 1) } f(10)",
+        """
+        fun add(x: Int, y: Int): Int { return x + y; }
+        fun twice(x: Int): Int { var two = 2; return add(x, x) * two / 2; }
+        { var a = 3; twice(add(a, 1)) }
+        """,
+    ]
+
+    def test_same_result_as_interpret(self):
+        for source_code in self.programs:
+            with self.subTest(source_code=source_code):
+                expected = interpret(parse(tokenize(source_code)), SymTab())
+                code = compile_closures(parse(tokenize(source_code)))
+                assert code(SymTab()) == expected
+                # The compiled program can be run again
+                assert code(SymTab()) == expected
+
+    def test_break_and_continue(self):
+        i = ast.Identifier('i')
+        s = ast.Identifier('s')
+        loop = ast.Block([
+            ast.VarDecl('i', 0, None),
+            ast.VarDecl('s', 0, None),
+            ast.WhileExpr(ast.Literal(True), ast.Block([
+                ast.BinaryOp(i, '=', ast.BinaryOp(i, '+', ast.Literal(1))),
+                ast.IfExpression(ast.BinaryOp(i, '>', ast.Literal(5)), ast.Break(), None),
+                ast.IfExpression(ast.BinaryOp(i, '==', ast.Literal(2)), ast.Continue(), None),
+                ast.BinaryOp(s, '=', ast.BinaryOp(s, '+', i)),
+            ])),
+        ], s)
+        assert compile_closures(loop)(SymTab()) == interpret(loop, SymTab()) == 13
+        with_value = ast.WhileExpr(ast.Literal(True), ast.Break(ast.Literal(7)))
+        assert compile_closures(with_value)(SymTab()) == 7
+
+    def test_errors(self):
+        code = compile_closures(ast.BinaryOp(ast.Literal(1), '=', ast.Literal(2)))
+        with self.assertRaises(TypeError):
+            code(SymTab())
+        code = compile_closures(parse(tokenize("{ var x = 1; x(2) }")))
+        with self.assertRaises(TypeError):
+            code(SymTab())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+from src.model import ast
+from src.model.SymTab import SymTab
+from src.compiler import __main__
+from src.compiler.constant_folder import fold_constants, fold_typechecked
+from src.compiler.interpreter import interpret
+from src.compiler.ir_generator import generate_ir
+from src.compiler.parser import parse
+from src.compiler.tokenizer import tokenize
+from tests import closure_compiler_test
+
+
+def folded(source_code: str) -> ast.Expression:
+    return fold_constants(parse(tokenize(source_code))).expression
+
+
+class TestConstantFolder(unittest.TestCase):
+    def test_fold_operators(self):
+        assert folded("1 + 2 * 3") == ast.Literal(7)
+        assert folded("(1 + 2) * 3 == 9") == ast.Literal(True)
+        assert folded("not (1 != 2)") == ast.Literal(False)
+        assert folded("7 % 3") == ast.Literal(1)
+        assert folded("1 + 2 * 3").offset == 0
+
+    def test_unfoldable_operators(self):
+        # The interpreter and the generated code do not agree on these
+        assert folded("7 / 2") == ast.BinaryOp(ast.Literal(7), '/', ast.Literal(2))
+        # `%` binds looser than `-`
+        assert folded("0 - 7 % 2") == ast.BinaryOp(ast.Literal(-7), '%', ast.Literal(2))
+        big = ast.BinaryOp(ast.Literal(2 ** 62), '*', ast.Literal(2))
+        assert fold_constants(big) is big
+
+    def test_identities(self):
+        x = ast.Identifier('x')
+        assert folded("{ var x: Int = 3; x * 1 + 0 }").result_expression == x
+        assert folded("{ var x: Int = 3; 0 + 1 * (x - 0) }").result_expression == x
+        assert folded("{ var b: Bool = true; not not b }").result_expression == ast.Identifier('b')
+        assert folded("{ var b: Bool = true; true and b }").result_expression == ast.Identifier('b')
+        assert folded("{ var b: Bool = true; true or b }").result_expression == ast.Literal(True)
+        assert folded("{ var b: Bool = true; false or b }").result_expression == ast.Identifier('b')
+
+    def test_prune_branches(self):
+        assert folded("if 1 < 2 then 3 else 4") == ast.Literal(3)
+        assert folded("if false then 3 else 4 + 1") == ast.Literal(5)
+        assert folded("if false then 3") == ast.Block([], None)
+        assert folded("{ while 2 < 1 do 3; 4 }") == ast.Block([ast.Block([], None)], ast.Literal(4))
+
+    def test_unchanged_tree_is_kept(self):
+        module = parse(tokenize("fun f(n: Int): Int { n * 2 } { var x = 1; while x < 3 do x = f(x); x }"))
+        assert fold_constants(module) is module
+
+    def test_same_result_as_interpret(self):
+        for source_code in closure_compiler_test.TestClosureCompiler.programs:
+            with self.subTest(source_code=source_code):
+                expected = interpret(parse(tokenize(source_code)), SymTab())
+                assert interpret(fold_constants(parse(tokenize(source_code))), SymTab()) == expected
+
+    def test_fewer_instructions(self):
+        with redirect_stdout(StringIO()):
+            unfolded = generate_ir(parse(tokenize("1 + 2 * 3 - 4")))
+            folded_ir = generate_ir(fold_constants(parse(tokenize("1 + 2 * 3 - 4"))))
+        assert len(folded_ir) < len(unfolded)
+
+    def test_no_fold_option(self):
+        source_code = "{ var x = 2; x * (3 - 2) + 0 * 5 }"
+        outputs = []
+        for args in [['vm'], ['vm', '--no-fold']]:
+            output = StringIO()
+            with patch('sys.argv', ['compiler', *args]), patch('sys.stdin', StringIO(source_code)), \
+                    redirect_stdout(output):
+                assert __main__.main() == 0
+            outputs.append(output.getvalue().splitlines()[-1])
+        assert outputs == ["2", "2"]
+
+    def test_ill_typed_program_is_not_folded(self):
+        source_code = "{ var b: Bool = true; b + 0 }"
+        module = parse(tokenize(source_code))
+        with redirect_stdout(StringIO()):
+            assert fold_typechecked(module) is module
+        # The typechecker only accepts == and != between Ints
+        assert folded("true != false") == ast.BinaryOp(ast.Literal(True), '!=', ast.Literal(False))
+
+    def test_ill_typed_program_is_rejected(self):
+        for source_code in ["{ var b: Bool = true; b + 0 }", "if true then 1 else false",
+                            "true and 5", "true != false"]:
+            for args in [['ir'], ['ir', '--no-fold']]:
+                with self.subTest(source_code=source_code, args=args):
+                    with patch('sys.argv', ['compiler', *args]), patch('sys.stdin', StringIO(source_code)), \
+                            redirect_stdout(StringIO()), self.assertRaises(TypeError):
+                        __main__.main()
+
+    def test_well_typed_program_is_folded(self):
+        module = parse(tokenize("fun f(n: Int): Int { n * 1 + (2 - 2) } f(1 + 2)"))
+        with redirect_stdout(StringIO()):
+            folded_module = fold_typechecked(module)
+        assert folded_module.functions[0].body.result_expression == ast.Identifier('n')
+        assert folded_module.expression.arguments == [ast.Literal(3)]
+
+
+if __name__ == '__main__':
+    unittest.main()
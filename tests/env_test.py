@@ -0,0 +1,100 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.model.env import Env, PersistentSymTab
+from src.model.types import Int, Bool, FunctionType
+from src.compiler.ir_generator import generate_ir, module_env
+from src.compiler.parser import parse
+from src.compiler.tokenizer import tokenize
+from src.compiler.type_checker import typecheck
+
+
+class TestEnv(unittest.TestCase):
+    def test_define_is_persistent(self):
+        outer = Env().define('x', 1, Int())
+        inner = outer.define('x', 2, Int()).define('y', 3, Int())
+        assert inner.binding('x').value == 2
+        assert inner.binding('y').value == 3
+        assert outer.binding('x').value == 1
+        assert 'y' not in outer
+        with self.assertRaises(KeyError):
+            outer.binding('y')
+
+    def test_lookups_are_cached(self):
+        env = Env().define('x', 1, Int())
+        for i in range(100):
+            env = env.define(f'v{i}', i, Int())
+        binding = env.binding('x')
+        assert env._bindings['x'] is binding
+        # Bindings are shared, so an assignment is seen through every environment that has it
+        binding.value = 5
+        assert env.parent.binding('x').value == 5
+
+
+class TestPersistentSymTab(unittest.TestCase):
+    def test_scopes(self):
+        symtab = PersistentSymTab()
+        assert symtab.lookup_variable('true') is True
+        assert isinstance(symtab.lookup_variable_type('+'), FunctionType)
+        symtab.define_variable('x', 1, Int())
+        symtab.enter_scope()
+        symtab.define_variable('x', True, Bool())
+        symtab.update_variable('x', False)
+        assert symtab.lookup_variable('x', True)[0] is False
+        symtab.leave_scope()
+        assert symtab.lookup_variable('x') == 1
+        assert isinstance(symtab.lookup_variable_type('x'), Int)
+        with self.assertRaises(KeyError):
+            symtab.update_variable('y', 1)
+
+    def test_update_builtin(self):
+        symtab = PersistentSymTab()
+        symtab.enter_scope()
+        symtab.define_variable('x', 1, Int())
+        assert symtab.lookup_variable('true') is True
+        symtab.update_variable('true', False)
+        assert symtab.lookup_variable('true') is False
+        symtab.leave_scope()
+        assert symtab.lookup_variable('true') is False
+        symtab.enter_scope()
+        symtab.update_variable('true', 0)
+        symtab.leave_scope()
+        assert symtab.lookup_variable('true') == 0
+        assert isinstance(symtab.lookup_variable_type('true'), Bool)
+        # Other tables still see the builtin
+        assert PersistentSymTab().lookup_variable('true') is True
+
+    def test_snapshot(self):
+        symtab = PersistentSymTab()
+        symtab.define_variable('x', 1, Int())
+        snapshot = symtab.snapshot()
+        symtab.define_variable('y', 2, Int())
+        other = PersistentSymTab(snapshot)
+        assert other.lookup_variable('x') == 1
+        with self.assertRaises(KeyError):
+            other.lookup_variable('y')
+
+    def test_typecheck_functions_concurrently(self):
+        module = parse(tokenize("""
+        fun f(a: Int): Int { var x: Int = 1; return a + x; }
+        fun g(b: Bool): Bool { var x: Bool = true; return b and x; }
+        f(1)
+        """))
+        env = module_env(module.functions)
+
+        def check_body(func):
+            symtab = PersistentSymTab(env)
+            symtab.enter_scope()
+            for name, param_type in func.params:
+                symtab.define_variable(name, None, param_type)
+            return typecheck(func.body, symtab)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            body_types = list(executor.map(check_body, module.functions * 50))
+        assert {type(body_type) for body_type in body_types[0::2]} == {Int}
+        assert {type(body_type) for body_type in body_types[1::2]} == {Bool}
+        assert generate_ir(module.functions[0], env=env) == generate_ir(module.functions[0], module.functions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from src.model import ast
+from src.model.hash_cons import HashConsFactory
+from src.compiler.parser import parse
+from src.compiler.tokenizer import tokenize
+
+
+class TestHashConsFactory(unittest.TestCase):
+    def test_parse_matches_unshared(self):
+        source_code = """
+        fun f(a: Int, b: Int): Int { if a < b then a + 1 else b + 1 }
+        { var x = 1; while x < 10 do x = x + 1; if x < 10 then f(x, x + 1) else x + 1 }
+        """
+        tokens = tokenize(source_code)
+        for pratt in [False, True]:
+            with self.subTest(pratt=pratt):
+                assert repr(parse(tokens, pratt=pratt, factory=HashConsFactory())) == repr(parse(tokens))
+
+    def test_equal_subtrees_are_shared(self):
+        factory = HashConsFactory()
+        expr = parse(tokenize("(x + 1) * (x + 1) - (y + 1)"), factory=factory).expression
+        assert expr.left.left is expr.left.right
+        assert expr.right is not expr.left.left
+        assert expr.right.right is expr.left.left.right
+        # x, 1, x + 1, product, y, y + 1, difference
+        assert len(factory) == 7
+
+    def test_bool_and_int_literals_are_not_shared(self):
+        factory = HashConsFactory()
+        assert factory.Literal(True) is not factory.Literal(1)
+        assert factory.Literal(1) is factory.Literal(1)
+
+    def test_hash_of(self):
+        factory = HashConsFactory()
+        other = HashConsFactory()
+        first = parse(tokenize("a < b and c"), factory=factory).expression
+        second = parse(tokenize("a < b and c"), factory=other).expression
+        assert factory.hash_of(first) == other.hash_of(second)
+        assert factory.hash_of(first) != factory.hash_of(first.left)
+
+
+if __name__ == '__main__':
+    unittest.main()
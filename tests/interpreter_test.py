@@ -2,7 +2,7 @@ import unittest
 
 from src.model import ast
 from src.model.SymTab import SymTab, add_builtin_symbols
-from src.compiler.interpreter import interpret, BreakException
+from src.compiler.interpreter import interpret, BreakException, ContinueException
 from src.compiler.parser import parse
 from src.compiler.tokenizer import tokenize
 
@@ -210,6 +210,14 @@ class TestInterpreterFunctions(unittest.TestCase):
         result = interpret(parse(tokenize(source_code)), self.symtab)
         self.assertEqual(result, 13)
 
+    def test_tail_calls(self):
+        source_code = "fun sum(n: Int, acc: Int): Int { if n == 0 then acc else { sum(n - 1, acc + n) } } sum(100000, 0)"
+        self.assertEqual(interpret(parse(tokenize(source_code)), self.symtab), 100000 * 100001 // 2)
+        self.assertEqual(len(self.symtab.scopes), 2)
+        # The callee still sees the variables of the blocks its caller was in
+        source_code = "fun get(): Int { y } fun f(): Int { { var y: Int = 5; get() } } f()"
+        self.assertEqual(interpret(parse(tokenize(source_code)), self.symtab), 5)
+
 class TestInterpreter(unittest.TestCase):
     def setUp(self):
         self.symtab = SymTab()
@@ -225,6 +233,36 @@ class TestInterpreter(unittest.TestCase):
         except BreakException:
             self.fail("BreakException should not escape the loop.")
 
+    def test_break_and_continue(self):
+        i = ast.Identifier('i')
+        s = ast.Identifier('s')
+        loop = ast.Block([
+            ast.VarDecl('i', 0, None),
+            ast.VarDecl('s', 0, None),
+            ast.WhileExpr(ast.Literal(True), ast.Block([
+                ast.BinaryOp(i, '=', ast.BinaryOp(i, '+', ast.Literal(1))),
+                ast.IfExpression(ast.BinaryOp(i, '>', ast.Literal(5)), ast.Break(), None),
+                ast.IfExpression(ast.BinaryOp(i, '==', ast.Literal(2)), ast.Continue(), None),
+                ast.BinaryOp(s, '=', ast.BinaryOp(s, '+', i)),
+            ])),
+        ], s)
+        self.assertEqual(interpret(loop, self.symtab), 13)
+        # The scopes the break left are gone
+        self.assertEqual(len(self.symtab.scopes), 2)
+
+    def test_break_with_value(self):
+        loop = ast.WhileExpr(ast.Literal(True), ast.Block([ast.Break(ast.Literal(7))], None))
+        self.assertEqual(interpret(loop, self.symtab), 7)
+        # A break leaves only the innermost loop
+        outer = ast.WhileExpr(ast.Literal(True), ast.Break(ast.BinaryOp(loop, '+', ast.Literal(1))))
+        self.assertEqual(interpret(outer, self.symtab), 8)
+
+    def test_break_outside_loop(self):
+        with self.assertRaises(BreakException):
+            interpret(ast.Block([ast.Break(ast.Literal(1))], None), self.symtab)
+        with self.assertRaises(ContinueException):
+            interpret(ast.Continue(), self.symtab)
+
 
 if __name__ == '__main__':
     unittest.main()
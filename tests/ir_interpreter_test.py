@@ -0,0 +1,81 @@
+import unittest
+
+from src.model import ir
+from src.model.ir import IRvar
+from src.compiler.intrinsics import all_intrinsics
+from src.compiler.ir_generator import generate_ir
+from src.compiler.ir_interpreter import ir_intrinsics, prepare_ir, run_ir, JUMP
+from src.compiler.parser import parse
+from src.compiler.tokenizer import tokenize
+
+
+def output_of(source_code: str) -> list[str]:
+    lines: list[str] = []
+    run_ir(generate_ir(parse(tokenize(source_code))), lines.append)
+    return lines
+
+
+class TestIrInterpreter(unittest.TestCase):
+    def test_intrinsics_table_matches(self):
+        assert set(ir_intrinsics) == set(all_intrinsics)
+
+    def test_generated_ir(self):
+        tests = [
+            ("1 + 2 * 3", ["7"]),
+            ("if 1 < 2 then 3 else 4", ["3"]),
+            ("if 2 <= 1 then 3 else 4 * 5 - 1", ["19"]),
+            ("(7 / 2) + (7 % 2)", ["4"]),
+            ("1 < 2", ["true"]),
+        ]
+        for source_code, expected in tests:
+            with self.subTest(source_code=source_code):
+                assert output_of(source_code) == expected
+
+    def test_division_rounds_towards_zero(self):
+        x, y, q, r = IRvar('x'), IRvar('y'), IRvar('q'), IRvar('r')
+        values = run_ir([ir.LoadIntConst(-7, x), ir.LoadIntConst(2, y),
+                         ir.Call(IRvar('/'), [x, y], q), ir.Call(IRvar('%'), [x, y], r)])
+        assert (values[q], values[r]) == (-3, -1)
+
+    def test_overflow_wraps_around(self):
+        int_max, int_min = 2 ** 63 - 1, -2 ** 63
+        assert ir_intrinsics['+'](int_max, 1) == int_min
+        assert ir_intrinsics['-'](int_min, 1) == int_max
+        assert ir_intrinsics['*'](2 ** 62, 4) == 0
+        assert ir_intrinsics['*'](int_max, int_max) == 1
+        assert ir_intrinsics['unary_-'](int_min) == int_min
+        assert ir_intrinsics['/'](int_min, -1) == int_min
+        assert ir_intrinsics['%'](int_min, -1) == 0
+        x, y = IRvar('x'), IRvar('y')
+        values = run_ir([ir.LoadIntConst(int_max, x), ir.Call(IRvar('+'), [x, x], y)])
+        assert values[y] == -2
+
+    def test_loop(self):
+        i, n, one, cond, total = IRvar('i'), IRvar('n'), IRvar('one'), IRvar('cond'), IRvar('total')
+        start, body, end = ir.Label('start'), ir.Label('body'), ir.Label('end')
+        instructions = [
+            ir.LoadIntConst(0, i), ir.LoadIntConst(0, total), ir.LoadIntConst(10, n), ir.LoadIntConst(1, one),
+            start,
+            ir.Call(IRvar('<'), [i, n], cond),
+            ir.CondJump(cond, body, end),
+            body,
+            ir.Call(IRvar('+'), [total, i], total),
+            ir.Call(IRvar('+'), [i, one], i),
+            ir.Jump(start),
+            end,
+            ir.Call(IRvar('print_int'), [total], IRvar('unit')),
+        ]
+        prepared = prepare_ir(instructions)
+        assert (JUMP, 4) in prepared.code
+        lines: list[str] = []
+        values = run_ir(prepared, lines.append)
+        assert lines == ["45"]
+        assert values[i] == 10
+
+    def test_unsupported_function(self):
+        with self.assertRaises(Exception):
+            prepare_ir([ir.Call(IRvar('f'), [], IRvar('x'))])
+
+
+if __name__ == '__main__':
+    unittest.main()
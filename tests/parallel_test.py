@@ -0,0 +1,58 @@
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+from src.compiler import __main__
+from src.compiler.ir_generator import generate_module_ir, top_level_name
+from src.compiler.parallel import split_functions, parse_parallel, generate_module_ir_parallel
+from src.compiler.parser import parse
+from src.compiler.tokenizer import tokenize
+
+
+class TestParallelFrontEnd(unittest.TestCase):
+    source_code = """
+    fun square(x: Int): Int { return x * x; }
+    fun one(): Int { return 1; }
+    fun add(a: Int, b: Int): Int { if a < b then { a + b } else b }
+    one() + 2
+    """
+
+    def test_split_functions(self):
+        pieces = split_functions(tokenize(self.source_code))
+        assert [piece[1].text for piece in pieces] == ['square', 'one', 'add']
+        assert [token.text for token in pieces[2][-5:]] == ['one', '(', ')', '+', '2']
+        assert split_functions([]) == [[]]
+
+    def test_parse_parallel_matches_parse(self):
+        tokens = tokenize(self.source_code)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            module = parse_parallel(tokens, executor)
+            assert repr(module) == repr(parse(tokens))
+            assert module.unit_offsets == parse(tokens).unit_offsets
+            with self.assertRaises(Exception):
+                parse_parallel(tokenize("1 fun f(): Int { 1 }"), executor)
+
+    def test_ir_matches_sequential(self):
+        tokens = tokenize(self.source_code)
+        module, ir_map = generate_module_ir_parallel(tokens, jobs=2)
+        expected = generate_module_ir(parse(tokens))
+        assert repr(module) == repr(parse(tokens))
+        assert list(ir_map) == ['square', 'one', 'add', top_level_name]
+        assert ir_map == expected
+
+    def test_ir_command(self):
+        source_code = "fun sq(x: Int): Int { x * x }\nsq(3)"
+        for argv in (['compiler', 'ir'], ['compiler', 'ir', '--jobs', '2']):
+            with self.subTest(argv=argv):
+                output = StringIO()
+                with patch('sys.argv', argv), patch('sys.stdin', StringIO(source_code)), redirect_stdout(output):
+                    assert __main__.main() == 0
+                listing = output.getvalue().splitlines()
+                main_listing = listing[listing.index(f"{top_level_name}:"):]
+                assert "    Call(fun=sq, args=[x1], dest=x2)" in main_listing
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,10 @@
+import io
 import unittest
 
 
 from src.model import ast
-from src.compiler.parser import parse
-from src.compiler.tokenizer import tokenize
+from src.compiler.parser import parse, reparse, split_units, join_units
+from src.compiler.tokenizer import tokenize, tokenize_stream, tokenize_compact, LineIndex, Location, TextEdit
 from src.model.types import Int
 
 
@@ -212,6 +213,189 @@ class test_parser_funcdel(unittest.TestCase):
         parsed_module = parse(tokens)
         print(parsed_module)
 
+class TestParseTokenStream(unittest.TestCase):
+    def test_parse_from_stream(self):
+        source_code = """
+        fun square(x: Int): Int {
+            return x * x;
+        }
+        { var y = 3; if y < 4 then square(y) else *p }
+        """
+        streamed = parse(tokenize_stream(io.StringIO(source_code), chunk_size=7))
+        assert repr(streamed) == repr(parse(tokenize(source_code)))
+
+
+class TestPrattParser(unittest.TestCase):
+    sources = [
+        "1 + 2 * 3 - 4 / 5 % 6",
+        "a = b = c + 1",
+        "a or b and c == d < e + f * g",
+        "not not a and not b",
+        "x < 1 == y >= 2 != z",
+        "{ var x = 1; x = x + 1; if x < 2 then f(x * 2, y) else *p }",
+        "1 * ( 2 + 3 ) / 4",
+        """
+        fun square(x: Int): Int {
+            return x * x;
+        }
+        while a < 10 do { a = a + square(a) }
+        """,
+    ]
+
+    def test_pratt_matches_recursive(self):
+        for source_code in self.sources:
+            with self.subTest(source_code=source_code):
+                tokens = tokenize(source_code)
+                assert repr(parse(tokens, pratt=True)) == repr(parse(tokens))
+
+    def test_pratt_handles_long_assignment_chains(self):
+        source_code = " = ".join(["x"] * 5000) + " = 1"
+        expr = parse(tokenize(source_code), pratt=True).expression
+        depth = 0
+        while isinstance(expr, ast.BinaryOp):
+            expr = expr.right
+            depth += 1
+        assert depth == 5000
+
+
+class TestParseCompactTokens(unittest.TestCase):
+    def test_parse_compact_tokens(self):
+        source_code = "{ var x = 1; while x < 10 do x = x * 2; if x > 3 then f(x, 1) else 0 }"
+        assert parse(tokenize_compact(source_code)) == parse(tokenize(source_code))
+
+
+class TestParseLocations(unittest.TestCase):
+    def test_node_offsets(self):
+        source_code = "{\n  var x = 1;\n  if x < 2 then f(x) else x\n}"
+        block = parse(tokenize(source_code)).expression
+        index = LineIndex(source_code)
+        if_expr = block.result_expression
+        assert index.location(block.expressions[0].offset).line == 2
+        assert (index.location(if_expr.offset).line, index.location(if_expr.offset).column) == (3, 3)
+        assert index.location(if_expr.then_clause.offset).column == 17
+
+    def test_unit_offsets(self):
+        source_code = "fun f(x: Int): Int { x }\n(f(1) + 2)"
+        module = parse(tokenize(source_code))
+        assert module.unit_offsets == [0, 25]
+        # Node offsets are relative to the start of their unit
+        assert module.functions[0].body.result_expression.offset == 21
+        assert module.expression.offset == 1
+        assert module.expression.right.offset == 8
+        assert module.source_offset(module.expression.right) == 33
+        assert module.source_offset(module.functions[0].body.result_expression) == 21
+        assert module.source_offset(ast.Literal(2)) == -1
+
+    def test_node_location(self):
+        source_code = "fun f(x: Int): Int {\n  x\n}\nfun g(y: Int): Int {\n  y + 1\n}\n{\n  g(2)\n}"
+        module = parse(tokenize(source_code))
+        index = LineIndex(source_code)
+        g_body = module.functions[1].body.result_expression
+        call = module.expression.result_expression
+        assert index.location(module.source_offset(g_body)) == Location("<input>", 5, 3)
+        assert index.location(module.source_offset(g_body.right)) == Location("<input>", 5, 7)
+        assert index.location(module.source_offset(call)) == Location("<input>", 8, 3)
+
+    def test_error_location(self):
+        source_code = "{\n  1 +\n  2 3 }"
+        with self.assertRaises(Exception) as cm:
+            parse(tokenize(source_code), line_index=LineIndex(source_code, file="prog.src"))
+        assert str(cm.exception).startswith('prog.src:3:5: "3"')
+
+
+class TestReparse(unittest.TestCase):
+    source_code = """
+    fun inc(x: Int): Int { return x + 1; }
+    fun twice(x: Int): Int { return x * 2; }
+    fun square(x: Int): Int { return x * x; }
+    { var a = 1; while a < 10 do a = twice(a); (square(a)) }
+    """
+
+    def edit(self, old: str, new: str) -> TextEdit:
+        start = self.source_code.index(old)
+        return TextEdit(start, start + len(old), new)
+
+    def test_reparse_matches_parse(self):
+        edits = [
+            self.edit("x * 2", "x * 2 + 1"),
+            self.edit("twice", "double"),
+            self.edit("fun twice(x: Int): Int { return x * 2; }", ""),
+            self.edit("fun inc", "fun dec(x: Int): Int { x - 1 }\n    fun inc"),
+            self.edit(" }\n    fun twice(x: Int): Int {", ""),  # merges two functions
+            self.edit("a < 10", "a < 100"),
+            self.edit("(square(a))", "square(a) + 1"),
+            self.edit("fun square", "// fun square"),  # comments out a unit
+        ]
+        tokens = tokenize(self.source_code)
+        for edit in edits:
+            with self.subTest(edit=edit):
+                new_source = edit.apply(self.source_code)
+                module = parse(tokens)
+                new_units, new_module = reparse(new_source, split_units(tokens, module), module, edit)
+                expected_tokens = tokenize(new_source)
+                expected = parse(expected_tokens)
+                assert join_units(new_units, new_module) == expected_tokens
+                assert [t.offset for t in join_units(new_units, new_module)] == [t.offset for t in expected_tokens]
+                assert repr(new_module) == repr(expected)
+                assert new_module.unit_offsets == expected.unit_offsets
+                assert new_module.expression.offset == expected.expression.offset
+                assert new_module.expression.result_expression.offset == expected.expression.result_expression.offset
+
+    def test_reparse_closes_comment(self):
+        cases = [
+            ("fun f(x: Int): Int { return x; }\nf(1) /* y", " */"),
+            ("fun f(x: Int): Int { return x; }\nf(1) /* f(2)", " */ + 1"),
+        ]
+        for source_code, appended in cases:
+            with self.subTest(source_code=source_code):
+                tokens = tokenize(source_code)
+                module = parse(tokens)
+                edit = TextEdit(len(source_code), len(source_code), appended)
+                new_source = edit.apply(source_code)
+                new_units, new_module = reparse(new_source, split_units(tokens, module), module, edit)
+                expected_tokens = tokenize(new_source)
+                expected = parse(expected_tokens)
+                assert join_units(new_units, new_module) == expected_tokens
+                assert repr(new_module) == repr(expected)
+                assert new_module.unit_offsets == expected.unit_offsets
+
+    def test_reparse_reuses_unchanged_units(self):
+        tokens = tokenize(self.source_code)
+        module = parse(tokens)
+        units = split_units(tokens, module)
+        inc, twice, square = module.functions
+        block = module.expression
+        edit = self.edit("x * 2", "x * 3")
+        new_units, new_module = reparse(edit.apply(self.source_code), units, module, edit)
+        assert new_module.functions[0] is inc
+        assert new_module.functions[1] is not twice
+        assert new_module.functions[2] is square
+        assert new_module.expression is block
+        assert [new_units[i] is units[i] for i in range(4)] == [True, False, True, True]
+
+    def test_reparse_does_not_rewrite_later_units(self):
+        tokens = tokenize(self.source_code)
+        module = parse(tokens)
+        units = split_units(tokens, module)
+        block = module.expression
+        offsets = [block.offset, block.expressions[1].offset, block.result_expression.offset]
+        edit = self.edit("fun inc", "fun increment")
+        new_units, new_module = reparse(edit.apply(self.source_code), units, module, edit)
+        assert new_module.expression is block and new_units[3] is units[3]
+        # Only the start of the units moved, not the nodes or tokens in them
+        assert [block.offset, block.expressions[1].offset, block.result_expression.offset] == offsets
+        assert new_module.unit_offsets[1:] == [offset + 6 for offset in module.unit_offsets[1:]]
+        # The old module is left as it was
+        assert module.functions[0].name == 'inc'
+
+    def test_reparse_reports_errors(self):
+        tokens = tokenize(self.source_code)
+        module = parse(tokens)
+        edit = self.edit("return x * 2;", "return x * ;")
+        with self.assertRaises(Exception):
+            reparse(edit.apply(self.source_code), split_units(tokens, module), module, edit)
+
+
 class TestPointerFeatures_parse(unittest.TestCase):
     def test_token_dereference(self):
         tokens = tokenize("{ var x: Int* = &y; }")
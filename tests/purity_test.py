@@ -0,0 +1,64 @@
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from src.model import ast
+from src.model.SymTab import SymTab
+from src.model.types import Int
+from src.compiler.interpreter import interpret
+from src.compiler.parser import parse
+from src.compiler.purity import ResultCache, memoize_pure_functions, pure_functions
+from src.compiler.tokenizer import tokenize
+
+
+def parse_quietly(source_code: str) -> ast.Module:
+    with redirect_stdout(StringIO()):
+        return parse(tokenize(source_code))
+
+
+class TestPurity(unittest.TestCase):
+    def test_pure_functions(self):
+        module = parse_quietly("""
+            fun fib(n: Int): Int { if n < 2 then n else fib(n - 1) + fib(n - 2) }
+            fun local(n: Int): Int { var x: Int = 1; while n > 0 do { x = x * 2; n = n - 1; } x }
+            fun even(n: Int): Bool { if n == 0 then true else odd(n - 1) }
+            fun odd(n: Int): Bool { if n == 0 then false else even(n - 1) }
+            fun reads_caller(n: Int): Int { n + y }
+            fun writes_outer(n: Int): Int { y = n }
+            fun prints(n: Int): Int { print_int(n) }
+            fun calls_impure(n: Int): Int { fib(n) + prints(n) }
+            fib(3)
+        """)
+        assert pure_functions(module.functions) == {'fib', 'local', 'even', 'odd'}
+
+    def test_pointer_write(self):
+        p = ast.Identifier('p')
+        body = ast.Block([ast.BinaryOp(ast.Dereference(p), '=', ast.Literal(1))], ast.Literal(0))
+        assert pure_functions([ast.FunctionDef('store', [('p', Int())], Int(), body)]) == set()
+        body = ast.Block([], ast.Dereference(p))
+        assert pure_functions([ast.FunctionDef('load', [('p', Int())], Int(), body)]) == {'load'}
+
+    def test_result_cache(self):
+        cache = ResultCache(maxsize=2)
+        cache.put((1,), 10)
+        cache.put((2,), None)
+        assert cache.get((2,), 'none') is None
+        assert cache.get((1,)) == 10
+        cache.put((3,), 30)
+        # (2,) was used least recently
+        assert cache.get((2,), 'none') == 'none'
+        assert len(cache) == 2
+        assert (cache.hits, cache.misses) == (2, 1)
+
+    def test_memoized_calls(self):
+        module = parse_quietly("fun fib(n: Int): Int { if n < 2 then n else fib(n - 1) + fib(n - 2) } fib(15)")
+        caches = memoize_pure_functions(module, maxsize=4)
+        with redirect_stdout(StringIO()):
+            assert interpret(module, SymTab(), caches) == interpret(module, SymTab()) == 610
+        assert caches['fib'].misses == 16
+        assert caches['fib'].hits == 13
+        assert len(caches['fib']) == 4
+
+
+if __name__ == '__main__':
+    unittest.main()
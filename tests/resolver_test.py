@@ -0,0 +1,92 @@
+import unittest
+
+from src.model import ast
+from src.model.SymTab import SymTab
+from src.model.hash_cons import HashConsFactory
+from src.compiler.interpreter import interpret
+from src.compiler.parser import parse
+from src.compiler.resolver import resolve
+from src.compiler.tokenizer import tokenize
+
+
+def identifiers(node, name: str) -> list[ast.Identifier]:
+    found = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, ast.Identifier):
+            if node.name == name:
+                found.append(node)
+        elif isinstance(node, (ast.Expression, ast.FunctionDef, ast.Module)):
+            stack.extend(reversed([getattr(node, name) for name in node.__match_args__]))
+    return found
+
+
+def places(node, name: str) -> list[tuple[int, int]]:
+    return [(identifier.depth, identifier.slot) for identifier in identifiers(node, name)]
+
+
+class TestResolver(unittest.TestCase):
+    def interpret(self, source_code: str):
+        return interpret(parse(tokenize(source_code)), SymTab())
+
+    def test_block_variables(self):
+        module = parse(tokenize("{ var x = 1; var y = 2; { x = y; var x = 3; x } }"))
+        resolve(module)
+        block = module.expression
+        assert [decl.slot for decl in block.expressions] == [0, 1]
+        assert places(module, 'y') == [(1, 1)]
+        # The assignment is to the outer x, the result is the inner one
+        assert places(module, 'x') == [(1, 0), (0, 0)]
+        assert block.result_expression.expressions[1].slot == 0
+
+    def test_redeclaration_reuses_slot(self):
+        module = parse(tokenize("{ var x = 1; var y = 2; var x = 3; x }"))
+        resolve(module)
+        assert [decl.slot for decl in module.expression.expressions] == [0, 1, 0]
+        assert places(module, 'x') == [(0, 0)]
+
+    def test_function_parameters(self):
+        module = parse(tokenize("""
+        fun f(a: Int, b: Int): Int { var c = 3; return a + b + c + g; }
+        { var g = 1; f(g, 2) }
+        """))
+        resolve(module)
+        assert places(module.functions[0], 'a') == [(1, 0)]
+        assert places(module.functions[0], 'b') == [(1, 1)]
+        assert places(module.functions[0], 'c') == [(0, 0)]
+        # Not declared in the function, so it is looked up by name
+        assert places(module.functions[0], 'g') == [(-1, -1)]
+        assert places(module.expression, 'g') == [(0, 0)]
+
+    def test_unresolved_names(self):
+        module = parse(tokenize("x + 1"))
+        resolve(module)
+        assert places(module, 'x') == [(-1, -1)]
+
+    def test_shared_nodes_with_different_places(self):
+        module = parse(tokenize("{ var x = 1; var y = 2; { var z = 0; var x = 3; x + y } + (x + y) }"), factory=HashConsFactory())
+        resolve(module)
+        x_nodes = {id(node): node for node in identifiers(module, 'x')}
+        y_nodes = {id(node): node for node in identifiers(module, 'y')}
+        assert len(x_nodes) == len(y_nodes) == 1
+        # Both uses of x (and y) share one node but are in different places
+        assert places(module, 'x') == places(module, 'y') == [(-1, -1), (-1, -1)]
+        assert interpret(module, SymTab()) == 8
+
+    def test_interpret_resolved(self):
+        tests = [
+            ("{ var x = 1; { x = x + 1; var x = 10; x = x + 1; }; x }", 2),
+            ("{ var i = 0; var s = 0; while i < 10 do { s = s + i; i = i + 1; }; s }", 45),
+            ("fun f(n: Int): Int { if n <= 1 then 1 else n * f(n - 1) } f(5)", 120),
+            ("fun add(a: Int, b: Int): Int { var c = 1; return a + b + c; } { var a = 1; add(a, a + 1) }", 4),
+        ]
+        for source_code, expected in tests:
+            with self.subTest(source_code=source_code):
+                assert self.interpret(source_code) == expected
+
+
+if __name__ == '__main__':
+    unittest.main()
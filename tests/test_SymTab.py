@@ -1,6 +1,6 @@
 import unittest
-from src.model.SymTab import SymTab
-from src.model.types import Int, FunctionType
+from src.model.SymTab import SymTab, builtin_symbols
+from src.model.types import Int, Bool, FunctionType
 
 class TestSymTab(unittest.TestCase):
     def test_define_and_lookup_function(self):
@@ -16,5 +16,30 @@ class TestSymTab(unittest.TestCase):
         self.assertEqual(func_type.param_types, params)
         self.assertEqual(func_type.return_type, return_type)
 
+    def test_slots(self):
+        symtab = SymTab()
+        symtab.define_variable("x", 1, Int())
+        symtab.enter_scope()
+        symtab.define_slot("y", 1, 2, Int())
+        self.assertEqual(symtab.frames[-1], [None, 2])
+        self.assertEqual(symtab.lookup_variable("y"), 2)
+        self.assertIsInstance(symtab.lookup_variable_type("y"), Int)
+        symtab.update_variable("y", 3)
+        self.assertEqual(symtab.frames[-1][1], 3)
+        self.assertEqual(symtab.lookup_variable("x"), 1)
+        symtab.leave_scope()
+        self.assertEqual(len(symtab.frames), len(symtab.scopes))
+
+    def test_builtins_are_shared(self):
+        first, second = SymTab(), SymTab()
+        self.assertIs(first.scopes[0], second.scopes[0])
+        self.assertEqual(first.lookup_variable("*")(6, 7), 42)
+        self.assertIsInstance(first.lookup_variable_type("<").return_type, Bool)
+        first.update_variable("true", False)
+        self.assertIs(first.lookup_variable("true"), False)
+        self.assertIs(second.lookup_variable("true"), True)
+        with self.assertRaises(TypeError):
+            builtin_symbols["true"] = (False, Bool())
+
 if __name__ == "__main__":
     unittest.main()
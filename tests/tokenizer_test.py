@@ -1,6 +1,7 @@
+import io
 import unittest
 
-from src.compiler.tokenizer import tokenize, Token
+from src.compiler.tokenizer import tokenize, tokenize_stream, tokenize_compact, retokenize, shift_tokens, Token, CompactToken, LineIndex, Location, TextEdit
 
 
 class test_tokenizer(unittest.TestCase):
@@ -105,6 +106,142 @@ class test_tokenizer(unittest.TestCase):
             Token(type='parenthesis', text=';')
         ]
 
+class TestTokenizerEngines(unittest.TestCase):
+    def test_combined_matches_reference(self):
+        sources = [
+            "fun square(x: Int): Int { return x * x; } square(2)",
+            "{ var x = 0; while x < 5 do x = x + 1; x }",
+            "/* multi\nline */ a == b // tail comment\n c != d # alt\n",
+            "true False 12 + -3 <= >= << >> ++ -- += -= *= /= && || &y *p",
+            "if a then { b } else [c, d]; //no newline at end",
+        ]
+        for source_code in sources:
+            with self.subTest(source_code=source_code):
+                assert tokenize(source_code) == tokenize(source_code, reference=True)
+
+    def test_combined_reports_failure(self):
+        with self.assertRaises(Exception):
+            tokenize("a = 1 $ 2")
+        with self.assertRaises(Exception):
+            tokenize("a = 1 $ 2", reference=True)
+
+
+class TestTokenizeStream(unittest.TestCase):
+    def test_stream_matches_tokenize_for_every_chunk_size(self):
+        source_code = ("/* a comment\nacross lines */ var abc = 12345; // done\n"
+                       "if abc >= 10 then abc != 3 # alt comment\n else true")
+        expected = tokenize(source_code)
+        for chunk_size in range(1, 20):
+            with self.subTest(chunk_size=chunk_size):
+                assert list(tokenize_stream(io.StringIO(source_code), chunk_size)) == expected
+
+    def test_chunk_boundary_inside_a_word(self):
+        for source_code in ["falsetrue", "xxxxxxxxxx falsetrue", "a!=b truefalse 12 x1"]:
+            expected = tokenize(source_code)
+            for chunk_size in range(1, len(source_code) + 1):
+                with self.subTest(source_code=source_code, chunk_size=chunk_size):
+                    assert list(tokenize_stream(io.StringIO(source_code), chunk_size)) == expected
+
+    def test_stream_is_lazy(self):
+        tokens = tokenize_stream(io.StringIO("a b c $"), chunk_size=2)
+        assert next(tokens) == Token(type='identifier', text='a')
+        with self.assertRaises(Exception):
+            list(tokens)
+
+
+class TestTokenLocations(unittest.TestCase):
+    def test_offsets(self):
+        source_code = "a = 1;\n  // comment\n  bb + 22"
+        tokens = tokenize(source_code)
+        assert [t.offset for t in tokens] == [0, 2, 4, 5, 22, 25, 27]
+        assert [t.offset for t in tokenize(source_code, reference=True)] == [t.offset for t in tokens]
+        streamed = tokenize_stream(io.StringIO(source_code), chunk_size=3)
+        assert [t.offset for t in streamed] == [t.offset for t in tokens]
+
+    def test_line_index(self):
+        source_code = "a = 1;\n  // comment\n  bb + 22"
+        index = LineIndex(source_code, file="test.src")
+        tokens = tokenize(source_code)
+        assert index.location(tokens[0].offset) == Location("test.src", 1, 1)
+        assert index.location(tokens[4].offset) == Location("test.src", 3, 3)
+        assert str(index.location(tokens[6].offset)) == "test.src:3:8"
+
+
+class TestCompactTokens(unittest.TestCase):
+    def test_compact_matches_tokens(self):
+        source_code = "{ var abc = 1; abc = abc + 2; &abc }"
+        compact = tokenize_compact(source_code)
+        assert compact == tokenize(source_code)
+        assert [t.offset for t in compact] == [t.offset for t in tokenize(source_code)]
+        assert compact[2].type == 'identifier'
+        assert isinstance(compact[2].kind, int)
+
+    def test_text_is_interned(self):
+        compact = tokenize_compact("abc + abc")
+        assert compact[0].text is compact[2].text
+
+    def test_compact_token_has_no_dict(self):
+        assert not hasattr(CompactToken(0, ""), '__dict__')
+
+
+def retokenized(tokens: list[Token], source_code: str, edit: TextEdit) -> list[Token]:
+    changed, first, last = retokenize(tokens, source_code, edit)
+    return tokens[:first] + changed + shift_tokens(tokens[last:], edit.delta)
+
+
+class TestRetokenize(unittest.TestCase):
+    source_code = "var abc = 12; /* note */ abc = abc + 3;\nwhile abc < 10 do abc = abc * 2 // twice\n"
+
+    def test_retokenize_matches_tokenize(self):
+        edits = [
+            TextEdit(4, 7, "abcd"),  # rename
+            TextEdit(10, 12, "1"),  # shorter literal
+            TextEdit(8, 8, "="),  # '=' becomes '=='
+            TextEdit(14, 14, "/*"),  # opens a comment that swallows the next tokens
+            TextEdit(21, 24, ""),  # removes the end of a comment
+            TextEdit(len(self.source_code), len(self.source_code), "+ 1"),
+            TextEdit(0, 0, "x "),
+        ]
+        tokens = tokenize(self.source_code)
+        for edit in edits:
+            with self.subTest(edit=edit):
+                new_source = edit.apply(self.source_code)
+                new_tokens = retokenized(tokens, new_source, edit)
+                expected = tokenize(new_source)
+                assert new_tokens == expected
+                assert [t.offset for t in new_tokens] == [t.offset for t in expected]
+
+    def test_retokenize_closes_comment(self):
+        # Before the edit, what follows the opener is scanned as tokens
+        for source_code, new_text in [("x /* y", " */"), ("a = 1 // c", "\nb"), ("a /* b */ c /* d", "*/")]:
+            with self.subTest(source_code=source_code, new_text=new_text):
+                tokens = tokenize(source_code)
+                edit = TextEdit(len(source_code), len(source_code), new_text)
+                new_source = edit.apply(source_code)
+                expected = tokenize(new_source)
+                new_tokens = retokenized(tokens, new_source, edit)
+                assert new_tokens == expected
+                assert [t.offset for t in new_tokens] == [t.offset for t in expected]
+
+    def test_retokenize_stops_after_edit(self):
+        tokens = tokenize(self.source_code)
+        edit = TextEdit(4, 7, "x")
+        changed, first, last = retokenize(tokens, edit.apply(self.source_code), edit)
+        assert (changed, first, last) == ([Token(type='identifier', text='x')], 1, 2)
+
+    def test_retokenize_window(self):
+        source_code = "f(x); g(y) /* b */"
+        # Only the tokens of "f(x);", up to where "g" starts
+        window, end = tokenize(source_code)[:5], source_code.index("g")
+        edit = TextEdit(2, 3, "xyz")
+        changed, first, last = retokenize(window, edit.apply(source_code), edit, end=end)
+        assert window[:first] + changed + window[last:] == tokenize("f(xyz);")
+        assert (first, last) == (1, 4)
+        # The comment now starts before "g" and ends after it
+        edit = TextEdit(5, 5, " /*")
+        assert retokenize(window, edit.apply(source_code), edit, end=end) is None
+
+
 class TestPointerFeatures_token(unittest.TestCase):
     def test_token_dereference(self):
         tokens = tokenize("var x: Int* = &y;")
@@ -4,7 +4,8 @@ from src.model import types, ast
 from src.model.SymTab import SymTab, add_builtin_symbols
 from src.compiler.parser import parse
 from src.compiler.tokenizer import tokenize
-from src.compiler.type_checker import typecheck
+from src.compiler.type_checker import typecheck, recheck
+from src.model.hash_cons import HashConsFactory
 from src.model.types import Int, Bool, Unit
 
 
@@ -213,5 +214,29 @@ class test_type_check_funcdel(unittest.TestCase):
     #     result_type = typecheck(parse(tokenize(source_code)), self.symtab)
     #     self.assertEqual(result_type, Int())
 
+
+class TestRecordedTypes(unittest.TestCase):
+    def test_records_every_checked_node(self):
+        block = parse(tokenize("{ var b: Bool = true; if b then 1 + 2 else 3 }")).expression
+        node_types = {}
+        self.assertIs(typecheck(block, SymTab(), node_types), Int())
+        if_expression = block.result_expression
+        self.assertIs(node_types[id(block)], Int())
+        self.assertIs(node_types[id(if_expression.cond)], Bool())
+        self.assertIs(node_types[id(if_expression.then_clause)], Int())
+        self.assertIs(node_types[id(if_expression.then_clause.left)], Int())
+        self.assertIs(node_types[id(block.expressions[0])], Unit())
+
+    def test_shared_node_with_different_types(self):
+        block = parse(tokenize("{ { var x: Int = 1; x }; { var x: Bool = true; x } }"),
+                      factory=HashConsFactory()).expression
+        node_types = {}
+        typecheck(block, SymTab(), node_types)
+        first, second = block.expressions[0], block.result_expression
+        self.assertIs(first.result_expression, second.result_expression)
+        self.assertIs(node_types[id(first.result_expression)], recheck)
+        self.assertIs(node_types[id(second)], Bool())
+
+
 if __name__ == '__main__':
     unittest.main()
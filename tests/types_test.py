@@ -0,0 +1,33 @@
+import pickle
+import unittest
+
+from src.model.types import Int, Bool, Unit, FunctionType, PointerType
+
+
+class TestCanonicalTypes(unittest.TestCase):
+    def test_primitives_are_singletons(self):
+        assert Int() is Int()
+        assert Bool() is Bool()
+        assert Unit() is Unit()
+        assert Int() is not Bool()
+
+    def test_compound_types_are_interned(self):
+        assert FunctionType([Int(), Int()], Bool()) is FunctionType([Int(), Int()], Bool())
+        assert FunctionType([Int()], Bool()) is not FunctionType([Bool()], Bool())
+        assert FunctionType([], Unit()) is not FunctionType([Unit()], Unit())
+        assert PointerType(PointerType(Int())) is PointerType(PointerType(Int()))
+        assert PointerType(Int()) is not PointerType(Bool())
+
+    def test_types_as_dict_keys(self):
+        names = {Int(): 'int', FunctionType([Int()], Int()): 'int -> int'}
+        assert names[Int()] == 'int'
+        assert names[FunctionType([Int()], Int())] == 'int -> int'
+
+    def test_pickle_keeps_identity(self):
+        for value in [Int(), FunctionType([Int(), Bool()], Unit()), PointerType(Int())]:
+            with self.subTest(value=value):
+                assert pickle.loads(pickle.dumps(value)) is value
+
+
+if __name__ == '__main__':
+    unittest.main()